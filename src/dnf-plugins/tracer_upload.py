@@ -2,18 +2,27 @@ import dnf.cli
 
 from dnfpluginscore import logger
 
-from katello.tracer import query_affected_apps, upload_tracer_profile
+from katello.tracer import TracerCache, query_affected_apps, trigger_upload, upload_tracer_profile
 
 
 class TracerUploadCommand(dnf.cli.Command):
     aliases = ['katello-tracer-upload']
     summary = 'Upload Tracer data to Katello'
 
+    @staticmethod
+    def set_argparser(parser):
+        parser.add_argument('--force', action='store_true',
+                            help='Force tracer upload even if it does not seem out of date.')
+
     def configure(self):
         self.cli.demands.root_user = True
 
     def run(self):
-        upload_tracer_profile(query_affected_apps, None)
+        if trigger_upload(None, self.opts.force):
+            return
+        if self.opts.force:
+            TracerCache.remove_cache()
+        upload_tracer_profile(query_affected_apps, None, force=self.opts.force)
 
 
 class TracerUpload(dnf.Plugin):
@@ -41,7 +50,8 @@ class TracerUpload(dnf.Plugin):
                 by this point so we don't need to do any work to give Tracer
                 a list of affected apps.
                 """
-                upload_tracer_profile(query_affected_apps, self)
+                if not trigger_upload(self):
+                    upload_tracer_profile(query_affected_apps, self, incremental=True, background=True)
             except Exception:
                 if (conf.has_option('main', 'supress_errors') and not
                    conf.getboolean('main', 'supress_errors')):
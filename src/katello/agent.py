@@ -0,0 +1,296 @@
+"""
+The katello-host-tools agent.
+
+A long running process which keeps subscription-manager, the consumer
+identity and the system bus loaded, and runs the uploads triggered by the
+package manager plugins and scripts. Triggers are sent as a line of JSON
+over a Unix socket and queued; triggers of the same kind arriving while one
+is queued are merged into it. A trigger is held back for the debounce
+window of its plugin configuration, so a burst of transactions results in
+one trailing upload. When the agent is not running, the callers do the work
+in process.
+"""
+import json
+import optparse
+import os
+import signal
+import socket
+import sys
+import threading
+import time
+import traceback
+
+try:
+    import socketserver
+except ImportError:
+    import SocketServer as socketserver
+
+from katello.constants import (AGENT_SOCKET, DISABLE_ENABLE_REPOS_VAR, DISABLE_PACKAGE_PROFILE_VAR,
+        ENABLED_REPOS_PLUGIN_CONF, PACKAGE_PROFILE_PLUGIN_CONF, TRACER_UPLOAD_PLUGIN_CONF)
+from katello.utils import compress_threshold, debounce_window, environment_disabled
+
+PACKAGES = 'packages'
+REPOS = 'repos'
+TRACER = 'tracer'
+
+# seconds a client waits for the agent to queue a trigger
+AGENT_TIMEOUT = 2
+
+# triggers which are disabled by the environment of the caller
+DISABLE_VARS = {
+    PACKAGES: DISABLE_PACKAGE_PROFILE_VAR,
+    REPOS: DISABLE_ENABLE_REPOS_VAR,
+}
+
+# the plugin configuration of each trigger, holding its debounce window and compression threshold
+PLUGIN_CONFS = {
+    PACKAGES: PACKAGE_PROFILE_PLUGIN_CONF,
+    REPOS: ENABLED_REPOS_PLUGIN_CONF,
+    TRACER: TRACER_UPLOAD_PLUGIN_CONF,
+}
+
+
+def trigger_window(kind):
+    """
+    Returns the debounce window of a trigger in seconds
+    """
+    return debounce_window(PLUGIN_CONFS[kind])
+
+
+def upload_threshold(kind):
+    """
+    Returns the size in bytes above which the uploads of a trigger are
+    compressed, 0 when they aren't
+    """
+    return compress_threshold(PLUGIN_CONFS[kind])
+
+
+def running(path=AGENT_SOCKET):
+    return os.path.exists(path)
+
+
+def trigger(kind, force=False, transaction=None, path=AGENT_SOCKET):
+    """
+    Hands a trigger to the running agent
+    :param kind: one of PACKAGES, REPOS or TRACER
+    :type kind: str
+    :param force: upload even if the report does not seem out of date
+    :type force: bool
+    :param transaction: the changes of the transaction for incremental tracing
+    :type transaction: katello.tracer.incremental.Transaction
+    :return: False when the trigger has to be handled in process
+    :rtype: bool
+    """
+    if not force and environment_disabled(DISABLE_VARS.get(kind)):
+        return True
+    if not running(path):
+        return False
+
+    request = {'trigger': kind, 'force': bool(force)}
+    if transaction is not None:
+        request['transaction'] = {'packages': sorted(transaction.packages), 'files': sorted(transaction.files)}
+
+    connection = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    connection.settimeout(AGENT_TIMEOUT)
+    try:
+        connection.connect(path)
+        connection.sendall((json.dumps(request) + '\n').encode('utf-8'))
+        reply = json.loads(connection.makefile('rb').readline().decode('utf-8'))
+        return reply.get('queued') is True
+    except (socket.error, IOError, ValueError, AttributeError):
+        return False
+    finally:
+        connection.close()
+
+
+def merge(queued, request):
+    """
+    Merges a trigger into the one of the same kind already queued
+    """
+    force = bool(request.get('force'))
+    transaction = request.get('transaction')
+    if queued is None:
+        return {'trigger': request['trigger'], 'force': force, 'transaction': transaction}
+
+    if queued['transaction'] is None or transaction is None:
+        # one of the triggers needs a full scan
+        transaction = None
+    else:
+        transaction = {
+            'packages': sorted(set(queued['transaction']['packages']).union(transaction['packages'])),
+            'files': sorted(set(queued['transaction']['files']).union(transaction['files'])),
+        }
+    return {'trigger': queued['trigger'], 'force': queued['force'] or force, 'transaction': transaction}
+
+
+def upload_packages(request):
+    from katello.packages import purge_package_cache, upload_package_profile
+    if request['force']:
+        purge_package_cache()
+    upload_package_profile(request['force'])
+
+
+def upload_repos(request):
+    from katello.repos import EnabledRepoCache, enabled_repos_report, upload_enabled_repos_report
+    if request['force']:
+        EnabledRepoCache.remove_cache()
+    upload_enabled_repos_report(enabled_repos_report(), request['force'])
+
+
+def upload_tracer(request):
+    from katello import tracer
+    from katello.tracer.incremental import Transaction
+    if request['force']:
+        tracer.TracerCache.remove_cache()
+    transaction = request['transaction']
+    if transaction is not None:
+        transaction = Transaction(transaction['packages'], transaction['files'])
+    tracer.upload_tracer_profile(tracer.query_affected_apps, None, incremental=transaction is not None,
+                                 force=request['force'], transaction=transaction)
+
+
+JOBS = {
+    PACKAGES: upload_packages,
+    REPOS: upload_repos,
+    TRACER: upload_tracer,
+}
+
+
+class TriggerHandler(socketserver.StreamRequestHandler):
+    timeout = AGENT_TIMEOUT
+
+    def handle(self):
+        try:
+            self.server.agent.submit(json.loads(self.rfile.readline().decode('utf-8')))
+            reply = {'queued': True}
+        except (ValueError, KeyError, TypeError, AttributeError):
+            reply = {'queued': False, 'error': str(sys.exc_info()[1])}
+        self.wfile.write((json.dumps(reply) + '\n').encode('utf-8'))
+
+
+class Agent(object):
+    def __init__(self, path=AGENT_SOCKET, jobs=None, windows=trigger_window):
+        """
+        :param path: the path of the Unix socket
+        :type path: str
+        :param jobs: the function run for each kind of trigger
+        :type jobs: dict
+        :param windows: returns the debounce window of a kind of trigger
+        """
+        self.path = path
+        self.jobs = JOBS if jobs is None else jobs
+        self.windows = windows
+        self.queued = {}
+        self.due = {}
+        self.stopped = False
+        self.condition = threading.Condition()
+        self.server = None
+
+    def submit(self, request):
+        kind = request['trigger']
+        if kind not in self.jobs:
+            raise ValueError('Unknown trigger: %s' % kind)
+        delay = self.windows(kind)
+        with self.condition:
+            self.queued[kind] = merge(self.queued.get(kind), request)
+            if self.queued[kind]['force']:
+                delay = 0
+            # every trigger restarts the window
+            self.due[kind] = time.time() + delay
+            self.condition.notify()
+
+    def ready(self):
+        """
+        Returns the kinds of the queued triggers whose window has passed, and
+        the seconds until the next one is due
+        """
+        now = time.time()
+        ready = sorted(kind for kind in self.queued if self.due[kind] <= now)
+        if ready or not self.queued:
+            return ready, None
+        return ready, min(self.due[kind] for kind in self.queued) - now
+
+    def run(self, kind, request):
+        try:
+            self.jobs[kind](request)
+        except Exception:
+            sys.stderr.write("Unable to run the %s trigger\n%s" % (kind, traceback.format_exc()))
+
+    def work(self):
+        while True:
+            with self.condition:
+                ready, timeout = self.ready()
+                while not ready and not self.stopped:
+                    self.condition.wait(timeout)
+                    ready, timeout = self.ready()
+                if self.stopped:
+                    return
+                queued = [(kind, self.queued.pop(kind)) for kind in ready]
+            for kind, request in queued:
+                self.run(kind, request)
+
+    def stop(self):
+        with self.condition:
+            self.stopped = True
+            self.condition.notify()
+
+    def bind(self):
+        directory = os.path.dirname(self.path)
+        if not os.path.isdir(directory):
+            os.makedirs(directory, 0o700)
+        try:
+            # left behind by an agent which was killed
+            os.remove(self.path)
+        except OSError:
+            pass
+        self.server = socketserver.UnixStreamServer(self.path, TriggerHandler)
+        self.server.agent = self
+        os.chmod(self.path, 0o600)
+
+    def serve(self):
+        self.bind()
+        worker = threading.Thread(target=self.work)
+        worker.daemon = True
+        worker.start()
+        try:
+            self.server.serve_forever()
+        finally:
+            self.stop()
+            self.server.server_close()
+            try:
+                os.remove(self.path)
+            except OSError:
+                pass
+
+    def shutdown(self):
+        self.server.shutdown()
+
+
+def warm_up():
+    """
+    Loads subscription-manager, the consumer identity and the tracer backend
+    once, ahead of the first trigger
+    """
+    from katello import tracer, uep
+    uep.load_subscription_manager()
+    uep.consumer_identity()
+    tracer.backend()
+
+
+def main():
+    parser = optparse.OptionParser(
+        description='Runs the uploads triggered by the package manager plugins and scripts.')
+    parser.add_option('-s', '--socket', default=AGENT_SOCKET,
+            help="Path of the Unix socket to listen on [%default]")
+    (options, args) = parser.parse_args()
+
+    warm_up()
+    signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
+    try:
+        Agent(options.socket).serve()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == '__main__':
+    main()
@@ -1,23 +1,39 @@
+from katello.utils import module_available
+
 ENABLED_REPOS_CACHE_FILE = '/var/cache/katello-agent/enabled_repos.json'
+ENABLED_REPOS_FINGERPRINT_FILE = '/var/cache/katello-agent/enabled_repos_fingerprint.json'
+TRACER_CACHE_FILE = '/var/cache/katello-agent/tracer.json'
 PACKAGE_CACHE_FILE = '/var/lib/rhsm/packages/packages.json'
+PACKAGE_PROFILE_FILE = '/var/cache/katello-agent/package_profile.json'
+PACKAGE_DELTA_FILE = '/var/cache/katello-agent/package_delta.json'
 REPOSITORY_PATH = '/etc/yum.repos.d/redhat.repo'
 ZYPPER_REPOSITORY_PATH = '/etc/rhsm/zypper.repos.d/redhat.repo'
+AGENT_SOCKET = '/run/katello-host-tools/agent.sock'
+SPOOL_DIR = '/var/spool/katello-host-tools'
+DRAINER_LOG_FILE = '/var/log/katello-host-tools-drainer.log'
+YUMVARS_CACHE_FILE = '/var/cache/katello-agent/yumvars.json'
+YUM_CONF = '/etc/yum.conf'
+YUM_VARS_DIRS = ['/etc/yum/vars', '/etc/dnf/vars', '/etc/zypp/vars.d']
+# the sqlite rpmdb is written to its write-ahead log first
+RPMDB_PATHS = ['/var/lib/rpm/Packages', '/var/lib/rpm/rpmdb.sqlite', '/var/lib/rpm/rpmdb.sqlite-wal',
+               '/usr/lib/sysimage/rpm/rpmdb.sqlite', '/usr/lib/sysimage/rpm/rpmdb.sqlite-wal']
+RPMDB_SQLITE_PATHS = ['/var/lib/rpm/rpmdb.sqlite', '/usr/lib/sysimage/rpm/rpmdb.sqlite']
+# the bdb and ndb rpmdbs, relative to the rpmdb directory
+RPMDB_LEGACY_PATHS = ['Packages', 'Packages.db']
+PACKAGE_DB_PATHS = RPMDB_PATHS + ['/var/lib/dpkg/status', '/var/cache/zypp/solv/@System/cookie']
+PACKAGE_DB_FINGERPRINT_FILE = '/var/cache/katello-agent/package_db_%s.json'
+RHSM_CONF = '/etc/rhsm/rhsm.conf'
+CONSUMER_CERT_DIR = '/etc/pki/consumer'
+BOOT_ID_FILE = '/proc/sys/kernel/random/boot_id'
 
 PACKAGE_PROFILE_PLUGIN_CONF = '/etc/yum/pluginconf.d/package_upload.conf'
 ENABLED_REPOS_PLUGIN_CONF = '/etc/yum/pluginconf.d/enabled_repos_upload.conf'
+TRACER_UPLOAD_PLUGIN_CONF = '/etc/yum/pluginconf.d/tracer_upload.conf'
 
 DISABLE_PACKAGE_PROFILE_VAR = 'DISABLE_KATELLO_PACKAGE_PROFILE'
 DISABLE_ENABLE_REPOS_VAR = 'DISABLE_KATELLO_ENABLED_REPOS'
 PROFILE_CACHE_FILE = '/var/lib/rhsm/cache/profile.json'
 
-try:
-    import zypp_plugin
-    ZYPPER = True
-except ImportError:
-    ZYPPER = False
-
-try:
-    import yum
-    YUM = True
-except ImportError:
-    YUM = False
+# detected without importing the package managers
+ZYPPER = module_available('zypp_plugin')
+YUM = module_available('yum')
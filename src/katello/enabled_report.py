@@ -1,35 +1,74 @@
 import os.path
+from katello import repofile, yumvars
 from katello.utils import ConfigParser
 from katello.constants import REPOSITORY_PATH, YUM, ZYPPER
-
-if YUM:
-    import yum
+from katello.yumvars import substitute, yum_variables
 
 class EnabledReport(object):
     def __generate(self):
         if not os.path.exists(self.repofile):
             return {"enabled_repos": {"repos": []}}
 
+        try:
+            enabled_repos = [{"repositoryid": section, "baseurl": [self._format_str(baseurl)]}
+                             for section, baseurl in repofile.enabled_repos(self.repofile)]
+        except repofile.UnsupportedRepoFile:
+            enabled_repos = self.__parse_config()
+        return {"enabled_repos": {"repos": enabled_repos}}
+
+    def __parse_config(self):
         config = ConfigParser()
         config.read(self.repofile)
         enabled_sections = [section for section in config.sections() if config.getboolean(section, "enabled")]
-        enabled_repos = [{"repositoryid": section, "baseurl": [self._format_str(config.get(section, "baseurl"))]} for section in enabled_sections]
-        return {"enabled_repos": {"repos": enabled_repos}}
+        return [{"repositoryid": section, "baseurl": [self._format_str(config.get(section, "baseurl"))]} for section in enabled_sections]
 
     def __init__(self, repo_file=REPOSITORY_PATH):
         """
         :param path: A .repo file path used to filter the report.
         :type path: str
         """
-        if YUM:
-            self.yb = yum.YumBase()
-            self.yb.preconf.debuglevel = 0
+        self.yumvars = None
         self.repofile = repo_file
-        self.content = self.__generate()
+        self._content = None
+        self._fingerprints = {}
+
+    @property
+    def content(self):
+        """
+        the report, generated on first use
+        """
+        if self._content is None:
+            self._content = self.__generate()
+        return self._content
 
     def __str__(self):
         return str(self.content)
 
+    def fingerprint(self, consumer_id):
+        """
+        returns what the report is generated from, without parsing the repo
+        file; None when the file doesn't exist. It's taken once per consumer,
+        like the content is generated once.
+
+        :param consumer_id: the consumer the report is uploaded for
+        :type consumer_id: str
+        """
+        if consumer_id not in self._fingerprints:
+            self._fingerprints[consumer_id] = self.__fingerprint(consumer_id)
+        return self._fingerprints[consumer_id]
+
+    def __fingerprint(self, consumer_id):
+        try:
+            stat = os.stat(self.repofile)
+        except OSError:
+            return None
+        variables = yum_variables()
+        fingerprint = [self.repofile, stat.st_ino, stat.st_size, stat.st_mtime, consumer_id, variables]
+        if 'releasever' not in variables:
+            # resolved by YumBase from the files the variables depend on
+            fingerprint.append(yumvars.signature())
+        return fingerprint
+
     def _format_str(self, repo_url):
         """
         returns a formatted string
@@ -38,12 +77,9 @@ class EnabledReport(object):
         :type path: str
         """
 
-        if YUM:
-            return self._replace_vars(repo_url)
-        elif ZYPPER:
-            return self._cut_question_mark(repo_url)
-        else:
-            return repo_url;
+        if ZYPPER and not YUM:
+            return self._replace_vars(self._cut_question_mark(repo_url))
+        return self._replace_vars(repo_url)
 
     def _cut_question_mark(self, repo_url):
         """
@@ -54,14 +90,29 @@ class EnabledReport(object):
         """
         return repo_url[:repo_url.find('?')]
 
+    def _variables(self):
+        """
+        returns the variables of the repo URLs, resolved without yum; yum is only
+        imported and YumBase only loaded when they can't be resolved otherwise.
+        """
+        if self.yumvars is None:
+            variables = yum_variables()
+            if YUM and ('releasever' not in variables or 'basearch' not in variables):
+                import yum
+                yb = yum.YumBase()
+                yb.preconf.debuglevel = 0
+                variables = dict(variables, releasever=yb.conf.yumvar['releasever'],
+                                 basearch=yb.conf.yumvar['basearch'])
+            self.yumvars = variables
+        return self.yumvars
+
     def _replace_vars(self, repo_url):
         """
-        returns a string with "$basearch" and "$releasever" replaced.
+        returns a string with "$basearch", "$releasever" and the other known variables replaced.
 
-        :param repo_url: a repo URL that you want to replace $basearch and $releasever in.
+        :param repo_url: a repo URL that you want to replace the variables in.
         :type path: str
         """
-
-        mappings = {'releasever': self.yb.conf.yumvar['releasever'], 'basearch': self.yb.conf.yumvar['basearch']}
-
-        return repo_url.replace('$releasever', mappings['releasever']).replace('$basearch', mappings['basearch'])
+        if '$' not in repo_url:
+            return repo_url
+        return substitute(repo_url, self._variables())
@@ -0,0 +1,111 @@
+"""
+Fingerprints of the files a report is collected from.
+
+The package manager hooks also run for transactions which change nothing,
+like dry runs, failed transactions or `apt update`. The fingerprint of the
+package database, the repo files and the consumer cert is recorded after a
+successful upload; as long as it's unchanged, collecting the report again
+would result in the same report, which costs a few stat calls to tell.
+"""
+import json
+import os
+import tempfile
+
+from katello.agent import PACKAGES, REPOS, TRACER
+from katello.constants import (BOOT_ID_FILE, CONSUMER_CERT_DIR, PACKAGE_DB_FINGERPRINT_FILE, PACKAGE_DB_PATHS,
+        REPOSITORY_PATH, RHSM_CONF, YUM_CONF, YUM_VARS_DIRS, ZYPPER_REPOSITORY_PATH)
+from katello.utils import ConfigParser
+
+REPO_FILES = [REPOSITORY_PATH, ZYPPER_REPOSITORY_PATH]
+
+# the files each report depends on besides the package database
+REPORT_PATHS = {
+    # the enabled repos are part of the profile when it's combined
+    PACKAGES: REPO_FILES,
+    # the repo URL variables are resolved from the configuration
+    REPOS: REPO_FILES + [YUM_CONF] + YUM_VARS_DIRS,
+    TRACER: [],
+}
+
+
+def consumer_cert(rhsm_conf=None):
+    """
+    Returns the path of the consumer cert, without loading subscription-manager
+    """
+    try:
+        parser = ConfigParser()
+        parser.read(rhsm_conf or RHSM_CONF)
+        directory = parser.get('rhsm', 'consumerCertDir')
+    except Exception:
+        directory = CONSUMER_CERT_DIR
+    return os.path.join(directory, 'cert.pem')
+
+
+def boot_id():
+    try:
+        with open(BOOT_ID_FILE, 'r') as boot_id_file:
+            return boot_id_file.read().strip()
+    except IOError:
+        return None
+
+
+def stats(paths):
+    fingerprint = []
+    for path in paths:
+        try:
+            stat = os.stat(path)
+            fingerprint.append([path, stat.st_ino, stat.st_size, stat.st_mtime])
+        except OSError:
+            pass
+    return fingerprint
+
+
+def take(kind):
+    """
+    Returns the fingerprint of the files a report is collected from; it's
+    taken before collecting, so a change made meanwhile isn't missed
+    :param kind: one of PACKAGES, REPOS or TRACER
+    :type kind: str
+    """
+    fingerprint = stats(PACKAGE_DB_PATHS + REPORT_PATHS[kind] + [consumer_cert()])
+    if kind == TRACER:
+        # the processes needing a restart are gone after a reboot
+        fingerprint.append(boot_id())
+    return fingerprint
+
+
+def fingerprint_file(kind):
+    return PACKAGE_DB_FINGERPRINT_FILE % kind
+
+
+def unchanged(kind):
+    """
+    Returns whether the files a report is collected from are unchanged since
+    its last successful upload
+    """
+    try:
+        with open(fingerprint_file(kind), 'r') as recorded:
+            return json.loads(recorded.read()) == take(kind)
+    except (IOError, ValueError):
+        return False
+
+
+def record(kind, fingerprint):
+    """
+    Records the fingerprint taken before collecting a report which was
+    uploaded successfully
+    """
+    if fingerprint is None:
+        return
+    path = fingerprint_file(kind)
+    try:
+        directory = os.path.dirname(path)
+        if not os.path.isdir(directory):
+            os.makedirs(directory)
+        descriptor, temporary = tempfile.mkstemp(prefix='.', suffix='.tmp', dir=directory)
+        with os.fdopen(descriptor, 'w') as recorded:
+            recorded.write(json.dumps(fingerprint))
+        os.rename(temporary, path)
+    except (IOError, OSError):
+        # the report is collected again next time
+        pass
@@ -1,21 +1,383 @@
+"""
+The package profile.
+
+subscription-manager builds the profile from the whole rpmdb. After a
+transaction, the profile is built incrementally instead: the packages the
+transaction changed are looked up in the rpmdb and replace their entries in
+the last built profile, as long as that profile was built from the rpmdb as
+it was right before the transaction.
+
+A sqlite rpmdb is read directly by katello.rpmdb, the rpm bindings are only
+used for the other backends. With subscription-manager's combined profile,
+the profile read here replaces the rpm part of it, and subscription-manager's
+profile manager uploads and caches the combined profile.
+
+When delta_upload is set in the plugin configuration, a profile built here
+is uploaded as a delta against the last acknowledged one, the profile in
+PACKAGE_CACHE_FILE:
+
+    {"base": <digest of the acknowledged profile>,
+     "added": [<package>, ...], "removed": [<package>, ...], "changed": [<package>, ...]}
+
+A changed package replaces the only package of the same name and arch. When
+the server rejects the delta, e.g. because its profile doesn't match the
+base digest, the full profile is uploaded instead.
+"""
 import errno
+import hashlib
+import json
 import os
 import sys
+import time
 
-from katello.constants import DISABLE_PACKAGE_PROFILE_VAR, PACKAGE_CACHE_FILE, PACKAGE_PROFILE_PLUGIN_CONF, PROFILE_CACHE_FILE
-from katello.uep import get_manager, lookup_consumer_id
-from katello.utils import combined_profiles_enabled, plugin_enabled
+from katello import fingerprint, rpmdb
+from katello.agent import PACKAGES, upload_threshold
+from katello.constants import (DISABLE_PACKAGE_PROFILE_VAR, PACKAGE_CACHE_FILE, PACKAGE_PROFILE_FILE,
+        PACKAGE_DELTA_FILE, PACKAGE_PROFILE_PLUGIN_CONF, PROFILE_CACHE_FILE, RHSM_CONF, RPMDB_PATHS)
+from katello.spool import spool_and_drain
+from katello.transfer import request_put
+from katello.uep import get_manager, get_profile_manager, get_uep, lookup_consumer_id
+from katello.utils import (combined_profiles_enabled, delta_upload_enabled, plugin_enabled, profile_reporting_enabled,
+        to_str)
 
+# not part of the profile
+IGNORED_PACKAGES = ['gpg-pubkey']
 
-def upload_package_profile(force=False):
+# the seconds before trying a delta again, once the server didn't support one
+DELTA_RETRY_INTERVAL = 24 * 60 * 60
+
+# rejections meaning the server doesn't support deltas at all; a 404 may as
+# well be about the consumer, so it only falls back to the full profile
+DELTA_UNSUPPORTED = (405, 501)
+# the server's profile doesn't match the base of the delta
+CONFLICT = 409
+# rejections meaning the upload failed, not that the server won't take the delta
+NOT_REJECTED = (401, 403, 410)
+
+
+def upload_package_profile(force=False, background=False, changed=None, rpmdb_before=None):
+    """
+    Upload the package profile, unless the package database didn't change
+    since the last upload; when background is set, it's spooled and uploaded
+    by a detached drainer
+    :param changed: the names of the packages installed, updated or removed
+        by the transaction which triggered the upload
+    :type changed: list
+    :param rpmdb_before: the rpmdb fingerprint taken right before that transaction
+    :type rpmdb_before: list
+    """
     if not plugin_enabled(PACKAGE_PROFILE_PLUGIN_CONF, DISABLE_PACKAGE_PROFILE_VAR, force):
         return
+    if not force and fingerprint.unchanged(PACKAGES):
+        return
 
+    taken = fingerprint.take(PACKAGES)
     consumer_id = lookup_consumer_id()
     if consumer_id is None:
         sys.stderr.write("Cannot upload package profile. Is this client registered?\n")
+        return
+
+    profile = None
+    if changed is not None:
+        profile = incremental_profile(changed, rpmdb_before)
+    if background:
+        if profile is None:
+            spool_and_drain(PACKAGES, consumer_id, taken=taken)
+        else:
+            spool_and_drain(PACKAGES, consumer_id, {'packages': profile}, taken=taken)
     else:
+        if profile is None:
+            update_package_profile(consumer_id)
+        else:
+            send_package_profile(consumer_id, profile)
+        fingerprint.record(PACKAGES, taken)
+
+
+def rpmdb_fingerprint():
+    """
+    Returns the fingerprint of the rpmdb alone
+    """
+    return fingerprint.stats(RPMDB_PATHS)
+
+
+def package_info(header):
+    """
+    Returns the profile entry of an rpm header, as subscription-manager
+    builds it
+    """
+    return {
+        'name': to_str(header['name']),
+        'version': to_str(header['version']),
+        'release': to_str(header['release']),
+        'epoch': header['epoch'] or 0,
+        'arch': to_str(header['arch']) or 'noarch',
+        'vendor': to_str(header['vendor']),
+    }
+
+
+def installed_packages(names):
+    """
+    Returns the profile entries of the installed packages of the given names
+    """
+    names = sorted(set(names).difference(IGNORED_PACKAGES))
+    try:
+        return rpmdb.installed_packages(names)
+    except rpmdb.UnsupportedRpmdb:
+        pass
+    import rpm
+    transaction_set = rpm.TransactionSet()
+    packages = []
+    for name in names:
+        for header in transaction_set.dbMatch('name', name):
+            packages.append(package_info(header))
+    return packages
+
+
+def collect_package_profile():
+    """
+    Returns the profile of all the installed packages from a sqlite rpmdb,
+    None when the rpmdb has another backend
+    """
+    try:
+        packages = rpmdb.installed_packages()
+    except rpmdb.UnsupportedRpmdb:
+        return None
+    return sort_profile([package for package in packages if package['name'] not in IGNORED_PACKAGES])
+
+
+def sort_profile(packages):
+    return sorted(packages, key=lambda package: (package['name'], package['arch'], str(package['epoch']),
+                                                 package['version'], package['release']))
+
+
+def load_profile():
+    """
+    Returns the last built profile and the rpmdb fingerprint it was built
+    at, None without one
+    """
+    try:
+        with open(PACKAGE_PROFILE_FILE, 'r') as profile_file:
+            data = json.loads(profile_file.read())
+        return data['fingerprint'], data['packages']
+    except (IOError, ValueError, KeyError, TypeError):
+        return None
+
+
+def save_profile(state, packages):
+    try:
+        cache_dir = os.path.dirname(PACKAGE_PROFILE_FILE)
+        if not os.path.isdir(cache_dir):
+            os.makedirs(cache_dir)
+        with open(PACKAGE_PROFILE_FILE, 'w') as profile_file:
+            profile_file.write(json.dumps({'fingerprint': state, 'packages': packages}))
+    except (IOError, OSError):
+        sys.stderr.write("Unable to write the package profile\n")
+
+
+def incremental_profile(changed, rpmdb_before):
+    """
+    Returns the profile built from the last built one and the packages changed
+    by a transaction, None when a full scan is needed
+    """
+    last = load_profile()
+    if last is None or rpmdb_before is None or last[0] != rpmdb_before:
+        # missing, or something else changed the rpmdb
+        return None
+    after = rpmdb_fingerprint()
+    try:
+        installed = installed_packages(changed)
+    except ImportError:
+        return None
+    changed = set(changed)
+    packages = sort_profile([package for package in last[1] if package['name'] not in changed] + installed)
+    save_profile(after, packages)
+    return packages
+
+
+def send_package_profile(consumer_id, packages):
+    """
+    Uploads a profile built by katello-host-tools, as a delta when possible,
+    and caches it like subscription-manager does, unless rhsm.conf disables
+    the package profile
+    """
+    if not profile_reporting_enabled(RHSM_CONF):
+        sys.stderr.write("Skipping package profile upload due to report_package_profile setting\n")
+        return
+    if combined_profiles_enabled():
+        send_combined_profile(consumer_id, packages)
+        return
+    base = read_package_cache()
+    if base is None or not send_package_delta(consumer_id, base, packages):
+        uep = get_uep()
+        threshold = upload_threshold(PACKAGES)
+        if threshold:
+            request_put(uep, '/consumers/%s/packages' % uep.sanitize(consumer_id), packages, threshold)
+        else:
+            uep.updatePackageProfile(consumer_id, packages)
+    write_package_cache(packages)
+
+
+def send_combined_profile(consumer_id, packages):
+    """
+    Has subscription-manager's profile manager upload the combined profile,
+    with the packages read here in place of its scan of the rpmdb; it's only
+    uploaded when it changed, and cached by the manager
+    """
+    from rhsm.profile import get_profile
+    manager = get_profile_manager()
+    manager._current_profile = {
+        'rpm': packages,
+        'enabled_repos': get_profile('enabled_repos').collect(),
+        'modulemd': get_profile('modulemd').collect(),
+    }
+    manager.update_check(get_uep(), consumer_id)
+
+
+def profile_digest(packages):
+    """
+    Returns the digest of a profile, regardless of the order of its packages
+    """
+    return hashlib.sha256(json.dumps(sort_profile(packages), sort_keys=True).encode('utf-8')).hexdigest()
+
+
+def package_entry(package):
+    return tuple(sorted(package.items()))
+
+
+def name_arch(package):
+    return package['name'], package['arch']
+
+
+def count_name_arch(packages):
+    counts = {}
+    for package in packages:
+        counts[name_arch(package)] = counts.get(name_arch(package), 0) + 1
+    return counts
+
+
+def profile_delta(base, packages):
+    """
+    Returns the delta turning the base profile into the given one
+    :rtype: dict
+    """
+    base_entries = set(package_entry(package) for package in base)
+    entries = set(package_entry(package) for package in packages)
+    removed = [package for package in base if package_entry(package) not in entries]
+    added = [package for package in packages if package_entry(package) not in base_entries]
+
+    # a package is changed when it replaces the only package of its name and arch
+    before, after = count_name_arch(base), count_name_arch(packages)
+    changed = set(name_arch(package) for package in added
+                  if before.get(name_arch(package)) == 1 and after[name_arch(package)] == 1)
+    return {
+        'base': profile_digest(base),
+        'added': [package for package in added if name_arch(package) not in changed],
+        'removed': [package for package in removed if name_arch(package) not in changed],
+        'changed': [package for package in added if name_arch(package) in changed],
+    }
+
+
+def delta_supported():
+    try:
+        with open(PACKAGE_DELTA_FILE, 'r') as delta_file:
+            rejected = json.loads(delta_file.read())['rejected']
+        return not 0 <= time.time() - rejected < DELTA_RETRY_INTERVAL
+    except (IOError, ValueError, KeyError, TypeError):
+        return True
+
+
+def record_delta_rejected():
+    try:
+        cache_dir = os.path.dirname(PACKAGE_DELTA_FILE)
+        if not os.path.isdir(cache_dir):
+            os.makedirs(cache_dir)
+        with open(PACKAGE_DELTA_FILE, 'w') as delta_file:
+            delta_file.write(json.dumps({'rejected': time.time()}))
+    except (IOError, OSError):
+        pass
+
+
+def rejection(error):
+    """
+    Returns the HTTP status of an error rejecting a request, None for any
+    other error
+    """
+    try:
+        code = int(getattr(error, 'code', None))
+    except (TypeError, ValueError):
+        return None
+    if code in DELTA_UNSUPPORTED or (400 <= code < 500 and code not in NOT_REJECTED):
+        return code
+    return None
+
+
+def send_package_delta(consumer_id, base, packages):
+    """
+    Uploads the delta between the last acknowledged profile and a new one
+    :return: whether the server took it; the full profile has to be uploaded otherwise
+    :rtype: bool
+    """
+    if not delta_upload_enabled(PACKAGE_PROFILE_PLUGIN_CONF) or not delta_supported():
+        return False
+    delta = profile_delta(base, packages)
+    if len(delta['added']) + len(delta['removed']) + len(delta['changed']) > len(packages) // 2:
+        # not worth it
+        return False
+    uep = get_uep()
+    try:
+        request_put(uep, '/consumers/%s/packages/delta' % uep.sanitize(consumer_id), delta, upload_threshold(PACKAGES))
+        return True
+    except Exception:
+        error = sys.exc_info()[1]
+        code = rejection(error)
+        if code is None:
+            raise
+        if code in DELTA_UNSUPPORTED:
+            record_delta_rejected()
+        elif code != CONFLICT:
+            sys.stderr.write("The package profile delta was rejected, uploading the full profile: %s\n" % error)
+        return False
+
+
+def write_package_cache(packages):
+    cache_dir = os.path.dirname(PACKAGE_CACHE_FILE)
+    if not os.path.isdir(cache_dir):
+        os.makedirs(cache_dir)
+    with open(PACKAGE_CACHE_FILE, 'w') as cache_file:
+        cache_file.write(json.dumps(packages))
+
+
+def read_package_cache():
+    """
+    Returns the packages of the last uploaded profile, the rpm part of it
+    when it's combined
+    """
+    try:
+        if combined_profiles_enabled():
+            with open(PROFILE_CACHE_FILE, 'r') as cache_file:
+                return sort_profile(json.loads(cache_file.read())['rpm'])
+        with open(PACKAGE_CACHE_FILE, 'r') as cache_file:
+            return sort_profile(json.loads(cache_file.read()))
+    except (IOError, ValueError, KeyError, TypeError):
+        return None
+
+
+def update_package_profile(consumer_id=None):
+    """
+    Uploads the profile from a full scan, unless it's the cached one; it's
+    the base of the next incremental profile. The scan is left to
+    subscription-manager, unless the rpmdb can be read directly.
+    """
+    before = rpmdb_fingerprint()
+    packages = collect_package_profile()
+    if packages is None:
         get_manager().profilelib._do_update()
+        packages = read_package_cache()
+    elif combined_profiles_enabled() or packages != read_package_cache():
+        # a combined profile is compared with the cache by the profile manager
+        send_package_profile(consumer_id or lookup_consumer_id(), packages)
+    if packages is not None and rpmdb_fingerprint() == before:
+        save_profile(before, packages)
 
 
 def purge_package_cache():
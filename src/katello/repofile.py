@@ -0,0 +1,127 @@
+"""
+A single pass parser of .repo files which only keeps what the enabled repos
+report needs.
+
+It reads the common layout written by subscription-manager. Anything
+ConfigParser would interpret in a particular way, or reject (a DEFAULT
+section, duplicates, interpolation, malformed lines, ...) raises
+UnsupportedRepoFile, so the caller can parse the file with ConfigParser and
+get exactly the same result, or error, as before.
+"""
+import re
+import sys
+
+BOOLEANS = {
+    '1': True, 'yes': True, 'true': True, 'on': True,
+    '0': False, 'no': False, 'false': False, 'off': False,
+}
+
+SECTION = re.compile(r'\[([^\]]+)\]')
+DELIMITER = re.compile(r'[=:]')
+
+PY2 = sys.version_info[0] == 2
+
+
+class UnsupportedRepoFile(Exception):
+    pass
+
+
+class Section(object):
+    def __init__(self, name):
+        self.name = name
+        self.keys = set()
+        self.enabled = None
+        self.baseurl = None
+
+    def enabled_repo(self):
+        """
+        Returns the id and baseurl of the repo, None when it's disabled
+        """
+        if self.enabled is None or self.enabled.lower() not in BOOLEANS:
+            raise UnsupportedRepoFile('%s: enabled is missing or not a boolean' % self.name)
+        if not BOOLEANS[self.enabled.lower()]:
+            return None
+        if self.baseurl is None:
+            raise UnsupportedRepoFile('%s: baseurl is missing' % self.name)
+        return self.name, self.baseurl
+
+
+def parse_value(value):
+    value = value.strip()
+    if PY2 and (';' in value or '%' in value or value == '""'):
+        # inline comments, interpolation and quotes are handled by ConfigParser on Python 2
+        raise UnsupportedRepoFile('value handled by ConfigParser: %s' % value)
+    return value
+
+
+def enabled_repos(repo_file):
+    """
+    Yields the id and baseurl of each enabled repo of a .repo file, while
+    reading it
+    :param repo_file: the path of the .repo file
+    :type repo_file: str
+    :raises UnsupportedRepoFile: when the file has to be read by ConfigParser
+    """
+    try:
+        source = open(repo_file, 'r')
+    except IOError:
+        raise UnsupportedRepoFile('unable to read %s' % repo_file)
+
+    with source:
+        seen = set()
+        section = None
+        option = None
+        blank = False
+        for line in source:
+            stripped = line.strip()
+            if not stripped:
+                blank = True
+                continue
+            indented = line[0].isspace()
+
+            if stripped[0] in '#;':
+                if indented:
+                    raise UnsupportedRepoFile('indented comment: %s' % stripped)
+                # ends a value like a blank line
+                blank = True
+                continue
+            if PY2 and stripped.split(None, 1)[0].lower() == 'rem':
+                raise UnsupportedRepoFile('rem comment: %s' % stripped)
+
+            if indented:
+                if option is None or blank:
+                    raise UnsupportedRepoFile('unexpected continuation: %s' % stripped)
+                if option in ('enabled', 'baseurl'):
+                    setattr(section, option, '%s\n%s' % (getattr(section, option), parse_value(stripped)))
+                continue
+            blank = False
+
+            if stripped[0] == '[':
+                match = SECTION.match(stripped)
+                if match is None or ']' in stripped[match.end():] or match.group(1) == 'DEFAULT':
+                    raise UnsupportedRepoFile('section header: %s' % stripped)
+                if match.group(1) in seen:
+                    raise UnsupportedRepoFile('duplicate section: %s' % match.group(1))
+                if section is not None:
+                    repo = section.enabled_repo()
+                    if repo is not None:
+                        yield repo
+                section = Section(match.group(1))
+                seen.add(section.name)
+                option = None
+                continue
+
+            delimiter = DELIMITER.search(stripped)
+            if section is None or delimiter is None:
+                raise UnsupportedRepoFile('not an option of a section: %s' % stripped)
+            option = stripped[:delimiter.start()].strip().lower()
+            if not option or option in section.keys:
+                raise UnsupportedRepoFile('empty or duplicate option: %s' % stripped)
+            section.keys.add(option)
+            if option in ('enabled', 'baseurl'):
+                setattr(section, option, parse_value(stripped[delimiter.end():]))
+
+        if section is not None:
+            repo = section.enabled_repo()
+            if repo is not None:
+                yield repo
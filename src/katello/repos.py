@@ -1,14 +1,19 @@
 import errno
+import hashlib
 import os
 import os.path
 import sys
 
-from katello.constants import DISABLE_ENABLE_REPOS_VAR, ENABLED_REPOS_CACHE_FILE, ENABLED_REPOS_PLUGIN_CONF, PROFILE_CACHE_FILE
+from katello.constants import (DISABLE_ENABLE_REPOS_VAR, ENABLED_REPOS_CACHE_FILE, ENABLED_REPOS_FINGERPRINT_FILE,
+        ENABLED_REPOS_PLUGIN_CONF, PROFILE_CACHE_FILE, REPOSITORY_PATH, YUM, ZYPPER, ZYPPER_REPOSITORY_PATH)
+from katello import fingerprint
+from katello.agent import PACKAGES, REPOS, upload_threshold
+from katello.enabled_report import EnabledReport
+from katello.spool import spool_and_drain
+from katello.transfer import request_put
 from katello.uep import get_manager, get_uep, lookup_consumer_id
 from katello.utils import combined_profiles_enabled, plugin_enabled
 
-from rhsm.connection import GoneException, RemoteServerException
-
 import json
 
 
@@ -24,29 +29,102 @@ def report_enabled_repos(consumer_id, report):
     :param report: The report to send.
     :type report: dict
     """
+    from rhsm.connection import GoneException, RemoteServerException
     uep = get_uep()
     method = '/systems/%s/enabled_repos' % uep.sanitize(consumer_id)
     try:
-        uep.conn.request_put(method, report)
+        request_put(uep, method, report, upload_threshold(REPOS))
         return True
     except (RemoteServerException, GoneException):
         error = sys.exc_info()[1]  # backward and forward compatible way to get the exception
         error_message(str(error))
 
 
-def upload_enabled_repos_report(report, force=False):
+def enabled_repos_report():
+    """
+    Returns the report of the enabled repositories, or None when
+    subscription-manager uploads them with the package profile.
+    """
+    if combined_profiles_enabled():
+        return None
+    if YUM:
+        repo_path = REPOSITORY_PATH
+    elif ZYPPER:
+        repo_path = ZYPPER_REPOSITORY_PATH
+    else:
+        raise IOError('Neither yum nor zypper can be used')
+    return EnabledReport(repo_path)
+
+
+def upload_enabled_repos_report(report, force=False, background=False):
+    """
+    Upload the report unless it didn't change; when background is set, it's
+    spooled and uploaded by a detached drainer
+    """
     if not plugin_enabled(ENABLED_REPOS_PLUGIN_CONF, DISABLE_ENABLE_REPOS_VAR, force):
         return
+    # the enabled repositories are part of subscription-manager's profile without a report
+    kind = PACKAGES if report is None else REPOS
+    if not force and fingerprint.unchanged(kind):
+        return
+
+    taken = fingerprint.take(kind)
     consumer_id = lookup_consumer_id()
     if consumer_id is None:
         error_message('Cannot upload enabled repos report, is this client registered?')
     elif report is None:
-        get_manager().profilelib._do_update()
+        if background:
+            spool_and_drain(PACKAGES, consumer_id, taken=taken)
+        else:
+            get_manager().profilelib._do_update()
+            fingerprint.record(PACKAGES, taken)
     else:
+        report_fingerprint = None
+        if isinstance(report, EnabledReport):
+            report_fingerprint = report.fingerprint(consumer_id)
+        if report_fingerprint is not None and fingerprint_matches(report_fingerprint):
+            # generated from the same files as the uploaded report
+            fingerprint.record(REPOS, taken)
+            return
         content = report.content
         cache = EnabledRepoCache(consumer_id, content)
-        if not cache.is_valid() and report_enabled_repos(consumer_id, content):
+        if report_fingerprint is not None:
+            save_fingerprint(report_fingerprint, cache.digest())
+        if cache.is_valid():
+            fingerprint.record(REPOS, taken)
+            return
+        if background:
+            spool_and_drain(REPOS, consumer_id, content, taken=taken)
+        elif report_enabled_repos(consumer_id, content):
             cache.save()
+            fingerprint.record(REPOS, taken)
+
+
+def fingerprint_matches(fingerprint):
+    """
+    Returns whether the report generated from the fingerprinted files is the
+    one last uploaded, without generating it
+    """
+    try:
+        with open(ENABLED_REPOS_FINGERPRINT_FILE, 'r') as fingerprint_file:
+            data = json.loads(fingerprint_file.read())
+        return data['fingerprint'] == fingerprint and data['digest'] == EnabledRepoCache.cached_digest()
+    except (ValueError, IOError, KeyError, TypeError):
+        return False
+
+
+def save_fingerprint(fingerprint, digest):
+    """
+    Records the digest of the report generated from the fingerprinted files
+    """
+    try:
+        cache_dir = os.path.dirname(ENABLED_REPOS_FINGERPRINT_FILE)
+        if not os.path.isdir(cache_dir):
+            os.makedirs(cache_dir)
+        with open(ENABLED_REPOS_FINGERPRINT_FILE, 'w') as fingerprint_file:
+            fingerprint_file.write(json.dumps({'fingerprint': fingerprint, 'digest': digest}))
+    except (IOError, OSError):
+        error_message('Unable to write the enabled repos fingerprint')
 
 
 class EnabledRepoCache:
@@ -64,20 +142,33 @@ class EnabledRepoCache:
         except OSError:
             pass
 
-    def is_valid(self):
+    @staticmethod
+    def cached_digest():
+        """
+        Returns the digest of the last uploaded report, None without one
+        """
         try:
-            with open(ENABLED_REPOS_CACHE_FILE, 'r') as cache_file:
-                return self.data() == json.loads(cache_file.read())
-        except (ValueError, IOError):
-            return False
+            with open(ENABLED_REPOS_CACHE_FILE, 'rb') as cache_file:
+                return hashlib.sha256(cache_file.read()).hexdigest()
+        except IOError:
+            return None
+
+    def is_valid(self):
+        return self.cached_digest() == self.digest()
 
     def data(self):
         return {self.consumer_id: self.content}
 
+    def serialized(self):
+        return json.dumps(self.data(), sort_keys=True)
+
+    def digest(self):
+        return hashlib.sha256(self.serialized().encode('utf-8')).hexdigest()
+
     def save(self):
         cache_dir = os.path.dirname(ENABLED_REPOS_CACHE_FILE)
         if not os.path.isdir(cache_dir):
             os.makedirs(cache_dir)
 
         with open(ENABLED_REPOS_CACHE_FILE, 'w') as cache_file:
-            cache_file.write(json.dumps(self.data()))
+            cache_file.write(self.serialized())
@@ -0,0 +1,164 @@
+"""
+Reads the package profile straight from a sqlite rpmdb (EL9 and later).
+
+The rpm bindings load and verify every header of the rpmdb to build the
+profile. A header is stored in the Packages table as a blob: an index of
+(tag, type, offset, count) entries followed by the data. Only the entries
+of the tags the profile needs are decoded, the rest of the header (files,
+dependencies, changelog, ...) is skipped.
+
+bdb and ndb rpmdbs are not supported; UnsupportedRpmdb is raised so the
+caller can use the rpm bindings instead.
+"""
+import os
+import struct
+import sys
+
+from katello.constants import RPMDB_LEGACY_PATHS, RPMDB_SQLITE_PATHS
+
+NAME = 1000
+VERSION = 1001
+RELEASE = 1002
+EPOCH = 1003
+VENDOR = 1011
+ARCH = 1022
+
+PROFILE_TAGS = {
+    NAME: 'name',
+    VERSION: 'version',
+    RELEASE: 'release',
+    EPOCH: 'epoch',
+    VENDOR: 'vendor',
+    ARCH: 'arch',
+}
+
+INT32_TYPE = 4
+STRING_TYPES = (6, 8, 9)  # STRING, STRING_ARRAY and I18NSTRING; the first string is used
+
+ENTRY_SIZE = 16
+
+
+class UnsupportedRpmdb(Exception):
+    pass
+
+
+def sqlite_path(paths=None, legacy_paths=None):
+    """
+    Returns the path of the sqlite rpmdb, None when rpm may use another backend
+    """
+    for path in paths or RPMDB_SQLITE_PATHS:
+        if not os.path.isfile(path):
+            continue
+        directory = os.path.dirname(path)
+        # a bdb or ndb rpmdb next to it may be the one rpm is configured for
+        for legacy in legacy_paths or RPMDB_LEGACY_PATHS:
+            if os.path.exists(os.path.join(directory, legacy)):
+                return None
+        return path
+    return None
+
+
+def connect(path):
+    """
+    Opens the rpmdb read-only, so it's never locked, created or migrated
+    """
+    import sqlite3
+    try:
+        return sqlite3.connect('file:%s?mode=ro' % path, uri=True)
+    except TypeError:
+        # the uri argument is not supported before Python 3.4
+        raise UnsupportedRpmdb('unable to open %s read-only' % path)
+
+
+def decode(value):
+    """
+    Returns the text of a string entry; rpm doesn't enforce UTF-8, so the
+    invalid bytes, e.g. of a Latin-1 vendor, are replaced
+    """
+    if sys.version_info[0] == 3:
+        return value.decode('utf-8', 'replace')
+    return value
+
+
+def read_header(blob, tags=PROFILE_TAGS):
+    """
+    Returns the values of the given tags of a header blob
+    :param tags: the names of the tags to read, by tag
+    :type tags: dict
+    :rtype: dict
+    """
+    blob = bytes(blob)
+    index_length, data_length = struct.unpack('>ii', blob[:8])
+    data_start = 8 + index_length * ENTRY_SIZE
+    if index_length < 0 or data_length < 0 or data_start + data_length > len(blob):
+        raise UnsupportedRpmdb('malformed header')
+
+    # decoding the whole index at once is much faster than entry by entry
+    index = struct.unpack('>%di' % (index_length * 4), blob[8:data_start])
+    header = {}
+    for position in range(0, len(index), 4):
+        tag = index[position]
+        if tag not in tags:
+            continue
+        entry_type, offset = index[position + 1], data_start + index[position + 2]
+        if offset < data_start or offset >= data_start + data_length:
+            raise UnsupportedRpmdb('malformed header entry of tag %d' % tag)
+        if entry_type == INT32_TYPE:
+            header[tags[tag]] = struct.unpack('>i', blob[offset:offset + 4])[0]
+        elif entry_type in STRING_TYPES:
+            end = blob.find(b'\0', offset)
+            if end < 0:
+                raise UnsupportedRpmdb('unterminated string of tag %d' % tag)
+            header[tags[tag]] = decode(blob[offset:end])
+    return header
+
+
+def package_info(header):
+    """
+    Returns the profile entry of a header, as subscription-manager builds it
+    """
+    return {
+        'name': header.get('name'),
+        'version': header.get('version'),
+        'release': header.get('release'),
+        'epoch': header.get('epoch') or 0,
+        'arch': header.get('arch') or 'noarch',
+        'vendor': header.get('vendor'),
+    }
+
+
+def installed_packages(names=None, path=None):
+    """
+    Returns the profile entries of the installed packages
+    :param names: only the packages of these names, all of them when None
+    :type names: list
+    :param path: the path of the sqlite rpmdb
+    :type path: str
+    :raises UnsupportedRpmdb: when the rpmdb is not a readable sqlite rpmdb
+    """
+    path = path or sqlite_path()
+    if path is None:
+        raise UnsupportedRpmdb('no sqlite rpmdb')
+
+    try:
+        import sqlite3
+    except ImportError:
+        raise UnsupportedRpmdb('sqlite3 is not available')
+    if names is not None and not names:
+        return []
+
+    try:
+        connection = connect(path)
+        try:
+            if names is None:
+                rows = connection.execute('SELECT blob FROM Packages ORDER BY hnum')
+            else:
+                names = sorted(set(names))
+                rows = connection.execute(
+                    'SELECT blob FROM Packages WHERE hnum IN (SELECT hnum FROM Name WHERE key IN (%s)) '
+                    'ORDER BY hnum' % ', '.join('?' * len(names)), names)
+            return [package_info(read_header(row[0])) for row in rows]
+        finally:
+            connection.close()
+    except (sqlite3.Error, struct.error):
+        raise UnsupportedRpmdb('unable to read %s' % path)
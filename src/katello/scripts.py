@@ -1,12 +1,44 @@
+import hashlib
 import optparse
+import sys
+import threading
+import time
 
+from katello import agent
 from katello.constants import (DISABLE_ENABLE_REPOS_VAR, DISABLE_PACKAGE_PROFILE_VAR,
-        ENABLED_REPOS_PLUGIN_CONF, PACKAGE_PROFILE_PLUGIN_CONF, REPOSITORY_PATH, YUM, ZYPPER,
-        ZYPPER_REPOSITORY_PATH)
+        ENABLED_REPOS_PLUGIN_CONF, PACKAGE_PROFILE_PLUGIN_CONF)
 from katello.enabled_report import EnabledReport
 from katello.packages import purge_package_cache, upload_package_profile
-from katello.repos import EnabledRepoCache, upload_enabled_repos_report
-from katello.utils import combined_profiles_enabled
+from katello.repos import EnabledRepoCache, enabled_repos_report, fingerprint_matches, upload_enabled_repos_report
+from katello.uep import lookup_consumer_id
+
+
+def splay_delay(consumer_id, seconds):
+    """
+    Returns the delay of a consumer within the splay; it's always the same
+    one, and the delays of many consumers are spread evenly
+    """
+    milliseconds = int(seconds * 1000)
+    if not consumer_id or milliseconds <= 0:
+        return 0
+    digest = hashlib.sha256(consumer_id.encode('utf-8')).hexdigest()
+    return int(digest[:16], 16) % milliseconds / 1000.0
+
+
+def splay(seconds, sleep=time.sleep):
+    """
+    Waits for the delay of this host within the splay
+    """
+    if seconds > 0:
+        delay = splay_delay(lookup_consumer_id(), seconds)
+        if delay:
+            sleep(delay)
+
+
+def add_splay_option(parser):
+    parser.add_option('--splay', type='float', default=0, metavar='SECONDS',
+            help="Wait before uploading, up to SECONDS as derived from the consumer ID, "
+                 "so hosts started together don't upload at once")
 
 
 def enabled_repos_upload():
@@ -15,21 +47,15 @@ def enabled_repos_upload():
     parser = optparse.OptionParser(description=description)
     parser.add_option('-f', '--force', action='store_true',
             help="Force enabled repository upload even if it does not seem out of date, or is otherwise disabled..")
+    add_splay_option(parser)
     (options, args) = parser.parse_args()
+    splay(options.splay)
+    if agent.trigger(agent.REPOS, options.force):
+        return
     if options.force:
         EnabledRepoCache.remove_cache()
 
-    report = None
-    if not combined_profiles_enabled():
-        if YUM:
-            repo_path = REPOSITORY_PATH
-        elif ZYPPER:
-            repo_path = ZYPPER_REPOSITORY_PATH
-        else:
-            raise IOError('Neither yum nor zypper can be used')
-        report = EnabledReport(repo_path)
-
-    upload_enabled_repos_report(report, options.force)
+    upload_enabled_repos_report(enabled_repos_report(), options.force)
 
 
 def package_upload():
@@ -38,17 +64,173 @@ def package_upload():
     parser = optparse.OptionParser(description=description)
     parser.add_option('-f', '--force', action='store_true',
             help="Force package upload even if it does not seem out of date.")
+    add_splay_option(parser)
 
     (options, args) = parser.parse_args()
+    splay(options.splay)
+    if agent.trigger(agent.PACKAGES, options.force):
+        return
     if options.force:
         purge_package_cache()
     upload_package_profile(options.force)
 
 
 def tracer_upload():
-    try:
-        from katello import tracer
-    except ImportError:
+    parser = optparse.OptionParser()
+    parser.add_option('-f', '--force', action='store_true',
+            help="Force tracer upload even if it does not seem out of date.")
+    parser.add_option('-b', '--background', action='store_true',
+            help="Upload in the background, merging uploads triggered within the debounce window.")
+    add_splay_option(parser)
+    (options, args) = parser.parse_args()
+
+    from katello import tracer
+    if not tracer.supported():
         raise SystemExit('Tracer is not supported on your platform')
+    splay(options.splay)
+    if tracer.trigger_upload(None, options.force):
+        return
+    if options.force:
+        tracer.TracerCache.remove_cache()
+    tracer.upload_tracer_profile(tracer.query_affected_apps, None, force=options.force,
+                                 background=options.background)
+
+
+SYNC_REPORTS = [agent.PACKAGES, agent.REPOS, agent.TRACER]
+
+
+class Collector(threading.Thread):
+    """
+    Runs a collector in the background, keeping its result or error
+    """
+    def __init__(self, function):
+        threading.Thread.__init__(self)
+        self.daemon = True
+        self.function = function
+        self.result = None
+        self.error = None
+
+    def run(self):
+        try:
+            self.result = self.function()
+        except Exception:
+            self.error = sys.exc_info()[1]
+
+    def get(self):
+        self.join()
+        if self.error is not None:
+            raise self.error
+        return self.result
+
+
+def collect_repos():
+    """
+    Returns the report of the enabled repositories, with the repo file
+    already parsed unless the report is the one last uploaded
+    """
+    report = enabled_repos_report()
+    if isinstance(report, EnabledReport):
+        report_fingerprint = report.fingerprint(lookup_consumer_id())
+        if report_fingerprint is None or not fingerprint_matches(report_fingerprint):
+            report.content
+    return report
+
+
+def collect_traces():
+    from katello import tracer
+    if not tracer.supported():
+        return None
+    return tracer.query_affected_apps(None)
+
+
+def sync_report(name, collector, force, selected):
+    """
+    Uploads one report of a sync; returns its status
+    """
+    if name == agent.PACKAGES:
+        if force:
+            purge_package_cache()
+        upload_package_profile(force)
+    elif name == agent.REPOS:
+        report = collector.get()
+        if report is None and agent.PACKAGES in selected:
+            return 'included in the package profile'
+        if force:
+            EnabledRepoCache.remove_cache()
+        upload_enabled_repos_report(report, force)
     else:
-        tracer.upload_tracer_profile(tracer.query_affected_apps, None)
+        apps = collector.get()
+        if apps is None:
+            return 'not supported on your platform'
+        from katello import tracer
+        if force:
+            tracer.TracerCache.remove_cache()
+        tracer.upload_tracer_profile(lambda plugin: apps, None, force=force)
+    return 'done'
+
+
+def sync_reports(selected, forced, output=sys.stdout):
+    """
+    Collects the enabled repositories and the traces concurrently, then
+    uploads the reports one after another over the shared connection
+
+    :param selected: the names of the reports to upload
+    :type selected: set
+    :param forced: the names of the reports to upload even if they don't seem out of date
+    :type forced: set
+    :return: the names of the reports which failed
+    :rtype: list
+    """
+    collectors = {}
+    if agent.REPOS in selected:
+        collectors[agent.REPOS] = Collector(collect_repos)
+    if agent.TRACER in selected:
+        collectors[agent.TRACER] = Collector(collect_traces)
+    for collector in collectors.values():
+        collector.start()
+
+    failed = []
+    for name in SYNC_REPORTS:
+        if name not in selected:
+            continue
+        start = time.time()
+        try:
+            status = sync_report(name, collectors.get(name), name in forced, selected)
+        except Exception:
+            status = 'failed: %s' % sys.exc_info()[1]
+            failed.append(name)
+        output.write('%-9s %-40s %6.2fs\n' % (name, status, time.time() - start))
+    return failed
+
+
+def parse_reports(parser, values):
+    names = set()
+    for value in values or []:
+        for name in value.split(','):
+            name = name.strip()
+            if name == 'all':
+                names.update(SYNC_REPORTS)
+            elif name in SYNC_REPORTS:
+                names.add(name)
+            else:
+                parser.error('unknown report: %s' % name)
+    return names
+
+
+def host_tools():
+    parser = optparse.OptionParser(usage='%prog sync [options]',
+            description='Uploads the package profile, the enabled repositories and the traces in one process.')
+    parser.add_option('-o', '--only', action='append', metavar='REPORTS',
+            help="Comma separated reports to upload: packages, repos, tracer [all]")
+    parser.add_option('-f', '--force', action='append', metavar='REPORTS',
+            help="Comma separated reports to upload even if they do not seem out of date, or all")
+    add_splay_option(parser)
+    (options, args) = parser.parse_args()
+    if args != ['sync']:
+        parser.error('expected the sync command')
+
+    selected = parse_reports(parser, options.only) or set(SYNC_REPORTS)
+    forced = parse_reports(parser, options.force)
+    splay(options.splay)
+    if sync_reports(selected, forced):
+        sys.exit(1)
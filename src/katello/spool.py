@@ -0,0 +1,294 @@
+"""
+Spool of the reports waiting for an upload.
+
+The package manager hooks write their report here and start a detached
+drainer instead of waiting for the server. Only the newest report of each
+kind and consumer is kept: a report replaces the pending one atomically.
+The drainer claims a report by renaming it, and puts it back when the upload
+fails, unless a newer report was spooled in the meantime.
+
+A report is held back for the debounce window it was spooled with, counted
+from the last time it was replaced, so a burst of transactions results in
+one trailing upload of the final state.
+"""
+import errno
+import fcntl
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+import traceback
+
+from katello import fingerprint
+from katello.agent import PACKAGES, REPOS, TRACER, trigger_window
+from katello.constants import DRAINER_LOG_FILE, SPOOL_DIR
+
+REPORT_SUFFIX = '.json'
+CLAIMED_SUFFIX = '.sending'
+LOCK_FILE = '.drain.lock'
+
+
+def report_path(kind, consumer_id, directory=SPOOL_DIR):
+    return os.path.join(directory, '%s-%s%s' % (kind, consumer_id, REPORT_SUFFIX))
+
+
+def spool(kind, consumer_id, report=None, directory=SPOOL_DIR, window=0, taken=None):
+    """
+    Spools a report, replacing the pending one of the same kind and consumer
+    :param kind: one of PACKAGES, REPOS or TRACER
+    :type kind: str
+    :param consumer_id: The consumer ID.
+    :type consumer_id: str
+    :param report: the content to upload; None when it's read while draining
+    :type report: dict
+    :param window: the seconds to wait for a newer report before uploading
+    :type window: float
+    :param taken: the fingerprint taken before collecting the report, which
+        is recorded once it's uploaded
+    :type taken: list
+    """
+    if not os.path.isdir(directory):
+        os.makedirs(directory, 0o700)
+    descriptor, temporary = tempfile.mkstemp(prefix='.', suffix='.tmp', dir=directory)
+    try:
+        with os.fdopen(descriptor, 'w') as spool_file:
+            spool_file.write(json.dumps({'kind': kind, 'consumer_id': consumer_id, 'report': report,
+                                         'window': window, 'fingerprint': taken}))
+        os.rename(temporary, report_path(kind, consumer_id, directory))
+    except Exception:
+        os.remove(temporary)
+        raise
+
+
+def open_drainer_log(log_file=DRAINER_LOG_FILE):
+    """
+    Opens the log the drainer writes its errors to, or /dev/null when it can't be written
+    """
+    try:
+        return open(log_file, 'a')
+    except (IOError, OSError):
+        return open(os.devnull, 'w')
+
+
+def start_drainer(directory=SPOOL_DIR, log_file=DRAINER_LOG_FILE):
+    """
+    Starts a drainer which outlives the calling package manager; its output
+    goes to log_file
+    """
+    if sys.version_info[0] == 3:
+        session = {'start_new_session': True}
+    else:
+        session = {'preexec_fn': os.setsid}
+    devnull = open(os.devnull, 'r')
+    log = open_drainer_log(log_file)
+    try:
+        subprocess.Popen([sys.executable, '-m', 'katello.spool', directory], stdin=devnull, stdout=log,
+                         stderr=log, close_fds=True, cwd='/', **session)
+    finally:
+        devnull.close()
+        log.close()
+
+
+def spool_and_drain(kind, consumer_id, report=None, directory=SPOOL_DIR, taken=None):
+    spool(kind, consumer_id, report, directory, trigger_window(kind), taken)
+    start_drainer(directory)
+
+
+def send_packages(consumer_id, report):
+    from katello.packages import send_package_profile, update_package_profile
+    if report is None:
+        update_package_profile(consumer_id)
+    else:
+        send_package_profile(consumer_id, report['packages'])
+    return True
+
+
+def send_repos(consumer_id, report):
+    from katello.repos import EnabledRepoCache, report_enabled_repos
+    if report_enabled_repos(consumer_id, report):
+        EnabledRepoCache(consumer_id, report).save()
+        return True
+    return False
+
+
+def send_tracer(consumer_id, report):
+    from katello.agent import upload_threshold
+    from katello.tracer import TracerCache
+    from katello.transfer import request_put
+    from katello.uep import get_uep
+    uep = get_uep()
+    method = '/consumers/%s/tracer' % uep.sanitize(consumer_id)
+    request_put(uep, method, {"traces": report['traces']}, upload_threshold(TRACER))
+    TracerCache(consumer_id).save(report['traces'], report['full_scan'])
+    return True
+
+
+SENDERS = {
+    PACKAGES: send_packages,
+    REPOS: send_repos,
+    TRACER: send_tracer,
+}
+
+
+def pending_reports(directory=SPOOL_DIR):
+    try:
+        names = os.listdir(directory)
+    except OSError:
+        return []
+    return sorted(name for name in names if name.endswith(REPORT_SUFFIX))
+
+
+def is_pending(kind, consumer_id, directory=SPOOL_DIR):
+    """
+    Returns whether a report of that kind and consumer waits for an upload,
+    or is being uploaded
+    """
+    path = report_path(kind, consumer_id, directory)
+    return os.path.exists(path) or os.path.exists(path + CLAIMED_SUFFIX)
+
+
+def drain_pending(directory=SPOOL_DIR):
+    """
+    Starts a drainer when reports are pending, e.g. ones put back after a
+    failed upload
+    """
+    if pending_reports(directory):
+        start_drainer(directory)
+
+
+def unclaim(claimed, path):
+    """
+    Puts a claimed report back, unless a newer one is pending
+    """
+    try:
+        os.link(claimed, path)
+    except OSError:
+        error = sys.exc_info()[1]
+        if error.errno != errno.EEXIST:
+            raise
+    os.remove(claimed)
+
+
+def send(path, senders=SENDERS):
+    """
+    Uploads a spooled report; it's put back when the upload fails
+    """
+    claimed = path + CLAIMED_SUFFIX
+    try:
+        os.rename(path, claimed)
+    except OSError:
+        # sent by another drainer
+        return False
+    try:
+        with open(claimed, 'r') as spool_file:
+            data = json.loads(spool_file.read())
+        sender = senders[data['kind']]
+        consumer_id, report = data['consumer_id'], data['report']
+        taken = data.get('fingerprint')
+    except (ValueError, KeyError, TypeError):
+        sys.stderr.write("Dropping the malformed report %s\n" % path)
+        os.remove(claimed)
+        return False
+
+    try:
+        sent = sender(consumer_id, report)
+    except Exception:
+        sys.stderr.write("Unable to upload %s\n%s" % (path, traceback.format_exc()))
+        sent = False
+
+    if sent:
+        fingerprint.record(data['kind'], taken)
+        os.remove(claimed)
+    else:
+        unclaim(claimed, path)
+    return sent
+
+
+def drain(directory=SPOOL_DIR, senders=SENDERS):
+    """
+    Uploads the pending reports, each at most once; returns the number sent
+
+    Only one drainer runs at a time; a report spooled while it runs is
+    picked up by it before it exits.
+    """
+    if not os.path.isdir(directory):
+        return 0
+    attempted = set()
+    sent = 0
+    while True:
+        lock_file = open(os.path.join(directory, LOCK_FILE), 'a')
+        try:
+            try:
+                fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except IOError:
+                # the running drainer sends the pending reports
+                return sent
+            restore_claimed(directory)
+            while True:
+                pending = unattempted(directory, attempted)
+                if not pending:
+                    break
+                now = time.time()
+                due = [(path, key) for path, key, due_time in pending if due_time <= now]
+                if not due:
+                    time.sleep(min(due_time for path, key, due_time in pending) - now)
+                    continue
+                for path, key in due:
+                    attempted.add(key)
+                    if send(path, senders):
+                        sent += 1
+        finally:
+            lock_file.close()
+        if not unattempted(directory, attempted):
+            return sent
+
+
+def restore_claimed(directory):
+    """
+    Puts back the reports claimed by a drainer which was killed
+    """
+    for name in os.listdir(directory):
+        if name.endswith(REPORT_SUFFIX + CLAIMED_SUFFIX):
+            claimed = os.path.join(directory, name)
+            unclaim(claimed, claimed[:-len(CLAIMED_SUFFIX)])
+
+
+def due_time(path, stat):
+    """
+    Returns when the report's debounce window has passed
+    """
+    try:
+        with open(path, 'r') as spool_file:
+            return stat.st_mtime + float(json.loads(spool_file.read()).get('window') or 0)
+    except (IOError, ValueError, TypeError, AttributeError):
+        # sent as is, or dropped when it's malformed
+        return stat.st_mtime
+
+
+def unattempted(directory, attempted):
+    """
+    Returns the paths, keys and due times of the reports not attempted yet;
+    a report which replaced an attempted one is a new one.
+    """
+    pending = []
+    for name in pending_reports(directory):
+        path = os.path.join(directory, name)
+        try:
+            stat = os.stat(path)
+        except OSError:
+            continue
+        key = (name, stat.st_ino)
+        if key not in attempted:
+            pending.append((path, key, due_time(path, stat)))
+    return pending
+
+
+def main():
+    directory = sys.argv[1] if len(sys.argv) > 1 else SPOOL_DIR
+    drain(directory)
+
+
+if __name__ == '__main__':
+    main()
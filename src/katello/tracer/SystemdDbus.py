@@ -17,33 +17,86 @@
 
 import dbus
 
+SYSTEMD_BUS_NAME = 'org.freedesktop.systemd1'
+SYSTEMD_OBJECT_PATH = '/org/freedesktop/systemd1'
+UNIT_INTERFACE = 'org.freedesktop.systemd1.Unit'
+SERVICE_INTERFACE = 'org.freedesktop.systemd1.Service'
+PROPERTIES_INTERFACE = 'org.freedesktop.DBus.Properties'
+
+
 class SystemdDbus(object):
+    """
+    Looks up systemd units over DBus.
+
+    One instance is meant to live for a single collection run: the bus
+    connection is opened once, PID to unit lookups are memoized and the
+    properties of every unit are fetched with a single GetAll call per
+    interface, so the number of round trips grows with the number of
+    distinct units rather than with PIDs times properties.
+    """
     def __init__(self):
-        self.__systemd = dbus.SystemBus().get_object('org.freedesktop.systemd1','/org/freedesktop/systemd1')
+        self.__bus = dbus.SystemBus()
+        self.__systemd = self.__bus.get_object(SYSTEMD_BUS_NAME, SYSTEMD_OBJECT_PATH)
         self.__manager = dbus.Interface(self.__systemd, dbus_interface='org.freedesktop.systemd1.Manager')
+        self.__unit_paths = {}
+        self.__unit_names = {}
+        self.__unit_properties = {}
+
+    def clear_cache(self):
+        self.__unit_paths.clear()
+        self.__unit_names.clear()
+        self.__unit_properties.clear()
 
     def unit_path_from_pid(self, pid):
-        try:
-            return self.__manager.GetUnitByPID(pid)
-        except dbus.exceptions.DBusException:
-            return False
+        if pid not in self.__unit_paths:
+            try:
+                self.__unit_paths[pid] = self.__manager.GetUnitByPID(pid)
+            except dbus.exceptions.DBusException:
+                self.__unit_paths[pid] = False
+        return self.__unit_paths[pid]
+
+    def unit_path_from_name(self, name):
+        if name not in self.__unit_names:
+            try:
+                self.__unit_names[name] = self.__manager.GetUnit(name)
+            except dbus.exceptions.DBusException:
+                self.__unit_names[name] = False
+        return self.__unit_names[name]
+
+    def unit_properties(self, unit_path, interface=UNIT_INTERFACE):
+        """
+        returns all properties of a unit for the given interface, or an
+        empty dict if the unit does not implement it
+
+        :param unit_path: the DBus object path of the unit
+        :type unit_path: str
+        :param interface: the systemd interface to read the properties from
+        :type interface: str
+        """
+        key = (unit_path, interface)
+        if key not in self.__unit_properties:
+            try:
+                proxy = self.__bus.get_object(SYSTEMD_BUS_NAME, unit_path)
+                properties = proxy.GetAll(interface, dbus_interface=PROPERTIES_INTERFACE)
+            except dbus.exceptions.DBusException:
+                properties = {}
+            self.__unit_properties[key] = properties
+        return self.__unit_properties[key]
 
     def has_service_property_from_pid(self, pid, attr):
-        try:
-            unit = self.unit_path_from_pid(pid)
-            if not unit:
-                return False
-
-            proxy = dbus.SystemBus().get_object('org.freedesktop.systemd1', unit)
-            propty = proxy.Get('org.freedesktop.systemd1.Service', attr, dbus_interface='org.freedesktop.DBus.Properties')
-        except dbus.exceptions.DBusException:
+        unit_path = self.unit_path_from_pid(pid)
+        if not unit_path:
             return False
-        return bool(propty)
+        return bool(self.unit_properties(unit_path, SERVICE_INTERFACE).get(attr))
 
     def get_unit_property_from_pid(self, pid, attr):
         unit_path = self.unit_path_from_pid(pid)
-        if bool(unit_path):
-            proxy = dbus.SystemBus().get_object('org.freedesktop.systemd1', self.unit_path_from_pid(pid))
-            return proxy.Get('org.freedesktop.systemd1.Unit', attr, dbus_interface='org.freedesktop.DBus.Properties')
-        else:
+        if not unit_path:
+            return False
+        return self.unit_properties(unit_path, UNIT_INTERFACE).get(attr, False)
+
+    def has_service_property_from_name(self, name, attr):
+        unit_path = self.unit_path_from_name(name)
+        if not unit_path:
             return False
+        return bool(self.unit_properties(unit_path, SERVICE_INTERFACE).get(attr))
@@ -1,51 +1,153 @@
 from __future__ import absolute_import
+from katello import agent, fingerprint
+from katello.constants import TRACER_CACHE_FILE
+from katello.spool import drain_pending, is_pending, spool_and_drain
+from katello.transfer import request_put
 from katello.uep import get_uep, lookup_consumer_id
+from katello.utils import module_available
+from katello.tracer import scanner
+from katello.tracer.incremental import FULL_SCAN_INTERVAL, query_transaction_apps
+import hashlib
+import importlib
+import json
+import os
 import sys
+import time
 
-def collect_apps():
-    raise NotImplementedError("Couldn't detect package manager. Failed to query affected apps!")
-
-# RHEL based systems
-try:
-    import dnf
-    from katello.tracer.dnf import collect_apps
-except ImportError:
-    try:
-        import yum
-        from tracer.query import Query
-        def collect_apps():
-            query = Query()
-            return query.affected_applications().get()
-    except ImportError:
-        pass
-
-# debian based systems
-try:
-    import apt
-    from katello.tracer.deb import collect_apps
-except ImportError:
-    pass
-
-# SUSE based systems
-try:
-    import zypp_plugin
-    from katello.tracer.zypper import collect_apps
-except ImportError:
-    pass
-
-def upload_tracer_profile(queryfunc, plugin=None):
+# the backend of each package manager, in the order they are preferred,
+# with the module the package manager is detected by
+BACKENDS = [
+    ('zypp_plugin', 'katello.tracer.zypper'),  # SUSE based systems
+    ('apt', 'katello.tracer.deb'),  # debian based systems
+    ('dnf', 'katello.tracer.dnf'),  # RHEL based systems
+    ('yum', 'katello.tracer.yum'),
+]
+
+_backend = None
+
+
+def backend():
+    """
+    Returns the backend module of the package manager, imported on first use,
+    or False when none is available
+    """
+    global _backend
+    if _backend is None:
+        _backend = False
+        for requirement, name in BACKENDS:
+            if not module_available(requirement):
+                continue
+            try:
+                _backend = importlib.import_module(name)
+                break
+            except ImportError:
+                continue
+    return _backend
+
+
+def supported():
+    return bool(backend())
+
+
+def collect_apps(plugin=None):
+    if not supported():
+        raise NotImplementedError("Couldn't detect package manager. Failed to query affected apps!")
+    return backend().collect_apps(plugin)
+
+
+def transaction_changes(plugin=None):
+    changes = getattr(backend(), 'transaction_changes', None)
+    if changes is None:
+        return None
+    return changes(plugin)
+
+
+def apps_for_pids(pids):
+    return getattr(backend(), 'apps_for_pids', scanner.apps_for_pids)(pids)
+
+
+def upload_tracer_profile(queryfunc, plugin=None, incremental=False, force=False, transaction=None,
+                          background=False):
+    """
+    Upload the traces to the server, unless they didn't change since the
+    last upload or force is set
+
+    When incremental is set and a full scan was uploaded recently, only the
+    processes running files of the packages changed by the plugin's
+    transaction, or by the given transaction, are checked, and the result is
+    merged into the traces uploaded before.
+
+    When background is set, the traces are spooled and uploaded by a
+    detached drainer, which caches them once they are uploaded.
+
+    When called by a package manager hook, nothing is collected unless the
+    package database changed, or the host rebooted, since the last upload.
+    """
+    hook = plugin is not None or background or transaction is not None
+    if hook and not force and fingerprint.unchanged(agent.TRACER):
+        if background:
+            drain_pending()
+        return
+
+    taken = fingerprint.take(agent.TRACER)
     uep = get_uep()
     consumer_id = lookup_consumer_id()
     if consumer_id is None:
         sys.stderr.write("Cannot upload tracer data, is this client registered?\n")
     else:
-        method = '/consumers/%s/tracer' % uep.sanitize(consumer_id)
-        data = {"traces": get_apps(queryfunc, plugin)}
-        uep.conn.request_put(method, data)
+        cache = TracerCache(consumer_id)
+        if not incremental or force or not cache.full_scan_is_recent():
+            transaction = None
+        elif transaction is None:
+            try:
+                transaction = transaction_changes(plugin)
+            except Exception:
+                sys.stderr.write("Unable to read the transaction, scanning all processes\n")
+
+        if transaction is None or transaction.needs_full_scan():
+            traces = get_apps(queryfunc, plugin)
+            full_scan = time.time()
+        else:
+            traces = dict(cache.traces)
+            traces.update(get_apps(query_transaction_apps(transaction, apps_for_pids), plugin))
+            full_scan = cache.full_scan
+
+        # a pending report replaces the cached traces once it's uploaded
+        pending = background and is_pending(agent.TRACER, consumer_id)
+        if force or pending or not cache.is_valid(traces):
+            if background:
+                spool_and_drain(agent.TRACER, consumer_id, {'traces': traces, 'full_scan': full_scan}, taken=taken)
+            else:
+                method = '/consumers/%s/tracer' % uep.sanitize(consumer_id)
+                data = {"traces": traces}
+                request_put(uep, method, data, agent.upload_threshold(agent.TRACER))
+                cache.save(traces, full_scan)
+                fingerprint.record(agent.TRACER, taken)
+        else:
+            cache.save(traces, full_scan)
+            fingerprint.record(agent.TRACER, taken)
+            if background:
+                drain_pending()
+
+
+def trigger_upload(plugin=None, force=False):
+    """
+    Hand the upload to the katello-host-tools agent, along with the changes
+    of the plugin's transaction. Returns False when the agent isn't running.
+    """
+    if not agent.running():
+        return False
+    transaction = None
+    if plugin is not None:
+        try:
+            transaction = transaction_changes(plugin)
+        except Exception:
+            pass
+    return agent.trigger(agent.TRACER, force, transaction)
 
 
 def query_affected_apps(plugin=None):
-    return collect_apps()
+    return collect_apps(plugin)
 
 
 def get_apps(queryfunc, plugin=None):
@@ -62,3 +164,56 @@ def get_apps(queryfunc, plugin=None):
         apps.pop("yum", None)
         apps.pop("dnf", None)
     return apps
+
+
+def traces_digest(traces):
+    return hashlib.sha256(json.dumps(traces, sort_keys=True).encode('utf-8')).hexdigest()
+
+
+class TracerCache:
+    def __init__(self, consumer_id):
+        self.consumer_id = consumer_id
+        self.traces = {}
+        self.full_scan = 0
+        self.digest = None
+        self.load()
+
+    @staticmethod
+    def remove_cache():
+        try:
+            os.remove(TRACER_CACHE_FILE)
+        except OSError:
+            pass
+
+    def load(self):
+        try:
+            with open(TRACER_CACHE_FILE, 'r') as cache_file:
+                data = json.loads(cache_file.read())[self.consumer_id]
+            self.traces = data['traces']
+            self.full_scan = data['full_scan']
+            self.digest = data.get('digest')
+        except (ValueError, IOError, KeyError, TypeError, AttributeError):
+            pass
+
+    def is_valid(self, traces):
+        return self.digest is not None and self.digest == traces_digest(traces)
+
+    def full_scan_is_recent(self):
+        return 0 <= time.time() - self.full_scan < FULL_SCAN_INTERVAL
+
+    def data(self):
+        return {self.consumer_id: {'traces': self.traces, 'full_scan': self.full_scan, 'digest': self.digest}}
+
+    def save(self, traces, full_scan):
+        self.traces = traces
+        self.full_scan = full_scan
+        self.digest = traces_digest(traces)
+        try:
+            cache_dir = os.path.dirname(TRACER_CACHE_FILE)
+            if not os.path.isdir(cache_dir):
+                os.makedirs(cache_dir)
+
+            with open(TRACER_CACHE_FILE, 'w') as cache_file:
+                cache_file.write(json.dumps(self.data()))
+        except (IOError, OSError):
+            sys.stderr.write("Unable to write the tracer cache\n")
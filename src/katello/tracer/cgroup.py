@@ -0,0 +1,110 @@
+"""
+Resolves the systemd unit owning a process from /proc/<pid>/cgroup.
+
+systemd places every process it manages into a cgroup named after its unit,
+so the owning unit can be read straight from procfs instead of asking the
+manager over DBus for every PID.
+"""
+
+import threading
+
+PROC_CGROUP = '/proc/%d/cgroup'
+
+# cgroup path components named after units that can own processes
+UNIT_SUFFIXES = ('.service', '.scope', '.socket', '.mount', '.swap')
+
+# units known to set PAMName=, used when the system bus can't be reached
+PAM_UNIT_PREFIXES = ('user@',)
+
+
+def unit_from_cgroup(lines):
+    """
+    returns the name of the unit owning a cgroup, or None when the
+    cgroup membership doesn't identify a unit
+
+    :param lines: the lines of a /proc/<pid>/cgroup file
+    :type lines: list
+    """
+    path = None
+    for line in lines:
+        fields = line.rstrip('\n').split(':', 2)
+        if len(fields) != 3:
+            continue
+        hierarchy, controllers, cgroup_path = fields
+        if controllers == 'name=systemd':
+            path = cgroup_path
+            break
+        elif hierarchy == '0' and controllers == '':
+            path = cgroup_path
+
+    if not path:
+        return None
+    for component in path.split('/'):
+        if component.endswith(UNIT_SUFFIXES):
+            return component
+    return None
+
+
+class CgroupResolver(object):
+    """
+    Drop-in replacement for SystemdDbus in tracer.dnf.Process.
+
+    Units are read from /proc/<pid>/cgroup. DBus is only used when the
+    cgroup path is ambiguous and to read service properties, which the
+    fallback caches per unit. The bus is connected lazily, and if it can't
+    be reached lookups carry on from procfs alone.
+    """
+    def __init__(self, fallback=None):
+        """
+        :param fallback: a callable returning a SystemdDbus-like object
+        :type fallback: callable
+        """
+        self.__fallback_factory = fallback
+        self.__fallback = None
+        self.__fallback_lock = threading.Lock()
+        self.__units = {}
+
+    def _fallback(self):
+        with self.__fallback_lock:
+            if self.__fallback is None:
+                self.__fallback = False
+                if self.__fallback_factory is not None:
+                    try:
+                        self.__fallback = self.__fallback_factory()
+                    except Exception:
+                        pass
+        return self.__fallback
+
+    def unit_from_pid(self, pid):
+        if pid not in self.__units:
+            try:
+                with open(PROC_CGROUP % pid, 'r') as cgroup_file:
+                    self.__units[pid] = unit_from_cgroup(cgroup_file.readlines())
+            except (IOError, OSError):
+                self.__units[pid] = None
+        return self.__units[pid]
+
+    def unit_path_from_pid(self, pid):
+        unit = self.unit_from_pid(pid)
+        if unit:
+            return unit
+        bus = self._fallback()
+        return bus and bus.unit_path_from_pid(pid)
+
+    def has_service_property_from_pid(self, pid, attr):
+        unit = self.unit_from_pid(pid)
+        bus = self._fallback()
+        if not unit:
+            return bool(bus and bus.has_service_property_from_pid(pid, attr))
+        if not unit.endswith('.service'):
+            return False
+        if not bus:
+            return attr == 'PAMName' and unit.startswith(PAM_UNIT_PREFIXES)
+        return bus.has_service_property_from_name(unit, attr)
+
+    def get_unit_property_from_pid(self, pid, attr):
+        unit = self.unit_from_pid(pid)
+        if unit and attr == 'Id':
+            return unit
+        bus = self._fallback()
+        return bus and bus.get_unit_property_from_pid(pid, attr)
@@ -2,6 +2,8 @@ from __future__ import absolute_import
 from os import path
 import subprocess
 
+from katello.tracer import scanner
+
 try:
     from shutil import which
 except ImportError:  # on Python 2
@@ -73,6 +75,8 @@ def use_needrestart():
 
 
 def collect_apps(plugin=None):
+    if scanner.native_scanner_enabled():
+        return scanner.collect_services_state() + use_flag()
     if has_needrestart:
         apps = use_needrestart()
     else:
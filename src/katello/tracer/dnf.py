@@ -1,8 +1,14 @@
 import os
 import re
 import subprocess
+from concurrent.futures import ThreadPoolExecutor
+import dnf.sack
 import psutil
 from katello.tracer.SystemdDbus import SystemdDbus
+from katello.tracer.cgroup import CgroupResolver
+from katello.tracer.incremental import Transaction
+from katello.tracer.needs_restarting import NeedsRestarting
+from katello.tracer.scanner import native_scanner_enabled, scan
 
 # these services need a reboot of the system
 STATIC_SERVICES = [
@@ -17,6 +23,12 @@ IGNORE_APPS = [
     "(sd-pam)",
 ]
 
+# number of threads classifying PIDs
+MAX_WORKERS = 8
+
+# process details read in one go for every PID
+PROCESS_ATTRS = ['name', 'exe', 'cmdline', 'terminal', 'ppid']
+
 REBOOT_HELPER= 'You will have to reboot your computer'
 SESSION_HELPER = 'You will have to log out & log in again'
 
@@ -27,23 +39,48 @@ class DnfTracerApp:
         self.type = app_type
 
 
+class ProcessTable:
+    """
+    Snapshots of the processes looked at during one run. Every process is
+    read from /proc once, and parents shared by many children are only
+    looked up once.
+    """
+    def __init__(self):
+        self.__snapshots = {}
+        self.__terminals = {}
+
+    def snapshot(self, pid):
+        if pid not in self.__snapshots:
+            # as_dict() reads all attributes within a single oneshot()
+            self.__snapshots[pid] = psutil.Process(pid).as_dict(attrs=PROCESS_ATTRS, ad_value=None)
+        return self.__snapshots[pid]
+
+    def terminal(self, pid):
+        if pid in self.__snapshots:
+            return self.__snapshots[pid]['terminal']
+        if pid not in self.__terminals:
+            try:
+                self.__terminals[pid] = psutil.Process(pid).terminal()
+            except (psutil.NoSuchProcess, psutil.AccessDenied):
+                self.__terminals[pid] = None
+        return self.__terminals[pid]
+
+
 class Process:
-    def __init__(self, bus, pid):
+    def __init__(self, bus, pid, table=None):
         self.bus = bus
         self.pid = int(pid)
-        self.process = psutil.Process(self.pid)
+        self.table = table if table is not None else ProcessTable()
+        self.info = self.table.snapshot(self.pid)
         self.name = self.detect_name()
 
         # special handling for ssh sessions. Thanks to
         # https://github.com/FrostyX/tracer/blob/ff8fc924fcbe2f638dd88b50549813dab2b8595b/tracer/resources/processes.py#L79
-        try:
-            if self.name == 'sshd':
-                exe = self.process.exe()
-                cmdline = self.process.cmdline()
-                if exe not in cmdline and len(cmdline) > 1:
-                    self.name = 'ssh-{0}-session'.format(re.split(' |@',' '.join(cmdline))[1])
-        except psutil.AccessDenied:
-            pass
+        if self.name == 'sshd':
+            exe = self.info['exe']
+            cmdline = self.info['cmdline']
+            if exe is not None and cmdline is not None and exe not in cmdline and len(cmdline) > 1:
+                self.name = 'ssh-{0}-session'.format(re.split(' |@',' '.join(cmdline))[1])
 
     def detect_name(self):
         if self.pid and self.bus.unit_path_from_pid(self.pid):
@@ -51,16 +88,16 @@ class Process:
                 unit_id = self.bus.get_unit_property_from_pid(self.pid, 'Id')
                 if unit_id and unit_id.endswith('.service'):
                     return unit_id[:-8]
-        return self.process.name()
+        return self.info['name']
 
     def is_session(self):
         if self.name.startswith("ssh-") and self.name.endswith("-session"):
             return True
 
-        terminal = self.process.terminal()
+        terminal = self.info['terminal']
         if terminal is not None:
-            parent = self.process.parent()
-            if parent is None or terminal != parent.terminal():
+            ppid = self.info['ppid']
+            if not ppid or terminal != self.table.terminal(ppid):
                 return True
         return False
 
@@ -68,51 +105,112 @@ class Process:
         return self.name in STATIC_SERVICES
 
 
-def collect_services_state():
+def needs_restarting_pids():
     env = dict(os.environ, LANG='C')
     process = subprocess.run(['dnf', 'needs-restarting'], env=env, stdout=subprocess.PIPE, stderr=subprocess.PIPE, universal_newlines=True)
     if process.returncode != 0:
         return []
 
     lines = process.stdout.split('\n')
-    pids = [line.split(' : ')[0].strip() for line in lines if ' : ' in line]
+    return [line.split(' : ')[0].strip() for line in lines if ' : ' in line]
 
-    apps = set()
-    bus = SystemdDbus()
-    added_services = []
 
-    for pid in pids:
-        p = Process(bus, pid)
+def scanned_pids():
+    return sorted(scan())
 
-        if p.name in IGNORE_APPS:
-            continue
 
-        app_type = 'daemon'
-        helper = "systemctl restart " + p.name
-        if p.is_session():
-            app_type = 'session'
-            helper = SESSION_HELPER
-        if p.is_reboot_required():
-            app_type = 'static'
-            helper = REBOOT_HELPER
+def process_app(bus, pid, table=None):
+    try:
+        p = Process(bus, pid, table)
+    except psutil.NoSuchProcess:
+        return None
 
-        if p.name is not None and p.name not in added_services:
-            app = DnfTracerApp(p.name, helper, app_type)
-            apps.add(app)
-            added_services.append(p.name)
-    return list(apps)
+    if p.name in IGNORE_APPS:
+        return None
 
+    app_type = 'daemon'
+    helper = "systemctl restart " + p.name
+    if p.is_session():
+        app_type = 'session'
+        helper = SESSION_HELPER
+    if p.is_reboot_required():
+        app_type = 'static'
+        helper = REBOOT_HELPER
+    return DnfTracerApp(p.name, helper, app_type)
+
+
+def collect_services_state(pids=None):
+    if pids is None:
+        pids = needs_restarting_pids()
 
-def collect_restart():
     apps = []
+    bus = CgroupResolver(SystemdDbus)
+    table = ProcessTable()
+    added_services = []
+
+    with ThreadPoolExecutor(max_workers=MAX_WORKERS) as executor:
+        results = list(executor.map(lambda pid: process_app(bus, pid, table), pids))
+
+    # results keep the order of the PIDs, so the first process of a
+    # service decides how it's reported
+    for app in results:
+        if app is not None and app.name is not None and app.name not in added_services:
+            apps.append(app)
+            added_services.append(app.name)
+    return apps
+
+
+# the apps of the processes found by incremental tracing
+apps_for_pids = collect_services_state
+
+
+def reboot_required():
     process = subprocess.run(["dnf", "needs-restarting", "-r"], stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
-    if process.returncode == 1:
+    return process.returncode == 1
+
+
+def collect_restart(required=None):
+    apps = []
+    if required is None:
+        required = reboot_required()
+    if required:
         app = DnfTracerApp("kernel", REBOOT_HELPER, "static")
         apps.append(app)
     return apps
 
 
 def collect_apps(plugin=None):
-    apps = collect_services_state()
-    reboot = collect_restart()
+    base = getattr(plugin, 'base', None)
+    if base is not None:
+        # Running inside dnf: reuse its Base rather than starting
+        # `dnf needs-restarting` twice. Only the rpmdb is loaded, as the
+        # sack of the Base predates the transaction.
+        pids, required = NeedsRestarting(dnf.sack.rpmdb_sack(base)).run()
+        return collect_services_state(pids) + collect_restart(required)
+
+    find_pids = scanned_pids if native_scanner_enabled() else needs_restarting_pids
+    with ThreadPoolExecutor(max_workers=2) as executor:
+        pids = executor.submit(find_pids)
+        required = executor.submit(reboot_required)
+        # PIDs are resolved while `dnf needs-restarting -r` may still run
+        apps = collect_services_state(pids.result())
+        reboot = collect_restart(required.result())
     return apps + reboot
+
+
+def transaction_changes(plugin=None):
+    base = getattr(plugin, 'base', None)
+    if base is None:
+        return None
+
+    installed = [pkg.name for pkg in base.transaction.install_set]
+    removed = list(base.transaction.remove_set)
+    files = set()
+    for pkg in removed:
+        files.update(pkg.files)
+    if installed:
+        # packages from repositories may lack file lists
+        query = dnf.sack.rpmdb_sack(base).query().installed().filter(name=installed)
+        for pkg in query:
+            files.update(pkg.files)
+    return Transaction(installed + [pkg.name for pkg in removed], files)
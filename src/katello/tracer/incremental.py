@@ -0,0 +1,63 @@
+"""
+Transaction scoped tracing.
+
+Instead of evaluating every process on the system after a transaction, only
+the processes still running files of the packages the transaction changed
+are checked, and the result is merged into the last uploaded traces.
+"""
+from __future__ import absolute_import
+import subprocess
+
+from katello.tracer import scanner
+from katello.tracer.needs_restarting import NEED_REBOOT
+
+# a full scan is done when the last one is older than this many seconds
+FULL_SCAN_INTERVAL = 24 * 60 * 60
+
+
+class Transaction(object):
+    def __init__(self, packages, files):
+        """
+        :param packages: names of the packages installed, updated or removed
+        :type packages: iterable
+        :param files: the files of those packages
+        :type files: iterable
+        """
+        self.packages = set(packages)
+        self.files = set(files)
+
+    def needs_full_scan(self):
+        # a reboot verdict needs the backend's own checks
+        return bool(self.packages.intersection(NEED_REBOOT))
+
+
+def package_files(names):
+    """
+    returns the files of the given installed packages
+    """
+    if not names:
+        return set()
+    # rpm fails for removed packages but still lists the installed ones
+    process = subprocess.Popen(['rpm', '-ql', '--'] + sorted(names), stdout=subprocess.PIPE,
+                               stderr=subprocess.PIPE, universal_newlines=True)
+    output = process.communicate()[0]
+    return set(line for line in output.split('\n') if line.startswith('/'))
+
+
+def query_transaction_apps(transaction, apps_for_pids):
+    """
+    returns a query function finding the apps which still run files
+    changed by the transaction
+
+    :param transaction: the changes of the transaction
+    :type transaction: Transaction
+    :param apps_for_pids: a callable returning the apps of a list of PIDs
+    """
+    def check(pid):
+        return scanner.deleted_files(pid).intersection(transaction.files)
+
+    def queryfunc(plugin=None):
+        if not transaction.files:
+            return []
+        return apps_for_pids(sorted(scanner.scan(check)))
+    return queryfunc
@@ -0,0 +1,101 @@
+"""
+In-process equivalent of `dnf needs-restarting` and `dnf needs-restarting -r`.
+
+The logic follows the needs-restarting plugin from dnf-plugins-core, but
+works on a sack handed in by the caller, so the dnf tracer plugin can reuse
+the dnf.Base it is running in instead of booting a new dnf twice.
+"""
+import os
+
+from katello.tracer import scanner
+
+# packages which need a reboot of the system once updated, as used by
+# dnf needs-restarting -r
+NEED_REBOOT = [
+    'kernel',
+    'kernel-core',
+    'kernel-rt',
+    'glibc',
+    'linux-firmware',
+    'systemd',
+    'dbus',
+    'dbus-broker',
+    'dbus-daemon',
+    'microcode_ctl',
+]
+
+
+def boot_time():
+    with open(os.path.join(scanner.PROC, 'stat'), 'r') as stat_file:
+        for line in stat_file:
+            if line.startswith('btime '):
+                return int(line.split()[1])
+    raise ValueError('btime missing from %s/stat' % scanner.PROC)
+
+
+def process_start(pid, btime, ticks=None):
+    """
+    returns the time a process was started at, in seconds since the epoch
+    """
+    if ticks is None:
+        ticks = os.sysconf('SC_CLK_TCK')
+    # starttime is field 22 of /proc/<pid>/stat
+    return btime + int(scanner.read_stat(pid)[19]) / float(ticks)
+
+
+class NeedsRestarting(object):
+    def __init__(self, sack):
+        """
+        :param sack: a sack containing at least the installed packages
+        :type sack: hawkey.Sack
+        """
+        self.installed = sack.query().installed()
+        self.btime = boot_time()
+        self.ticks = os.sysconf('SC_CLK_TCK')
+        self.__owners = {}
+
+    def owning_package(self, path):
+        if path not in self.__owners:
+            packages = self.installed.filter(file=path)
+            self.__owners[path] = packages[0] if packages else None
+        return self.__owners[path]
+
+    def process_files(self, pid):
+        """
+        returns the start time of a process and the paths of the files it
+        maps, None when it's gone; only /proc is read, so it's safe to call
+        from the threads of the scan
+        """
+        try:
+            start = process_start(pid, self.btime, self.ticks)
+        except (IOError, OSError, IndexError, ValueError):
+            return None
+        return start, set(path for path, inode, deleted in scanner.mapped_files(pid))
+
+    def is_stale(self, start, paths):
+        """
+        returns True if one of the files belongs to a package installed
+        after the process was started
+        """
+        for path in sorted(paths):
+            package = self.owning_package(path)
+            if package is not None and package.installtime > start:
+                return True
+        return False
+
+    def stale_pids(self):
+        # /proc is walked by the threads of the scan, the owners are looked
+        # up here as hawkey isn't thread-safe
+        processes = scanner.scan(self.process_files)
+        return [pid for pid in sorted(processes) if self.is_stale(*processes[pid])]
+
+    def reboot_required(self):
+        packages = self.installed.filter(name=NEED_REBOOT)
+        return any(package.installtime > self.btime for package in packages)
+
+    def run(self):
+        """
+        returns a tuple of the PIDs which need restarting and whether the
+        system needs a reboot
+        """
+        return self.stale_pids(), self.reboot_required()
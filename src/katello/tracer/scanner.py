@@ -0,0 +1,243 @@
+"""
+Native scanner for processes running deleted or replaced files.
+
+Walks /proc/<pid>/maps and /proc/<pid>/exe the way `needrestart`,
+`zypper ps` and `dnf needs-restarting` do, so every distribution backend can
+find stale processes without shelling out to a package manager tool.
+"""
+from __future__ import absolute_import
+import os
+import time
+from multiprocessing.pool import ThreadPool
+
+from katello.tracer.cgroup import CgroupResolver
+
+PROC = '/proc'
+
+# set in the flags field of /proc/<pid>/stat for kernel threads
+PF_KTHREAD = 0x00200000
+
+DEFAULT_WORKERS = 8
+DEFAULT_TIMEOUT = 60
+
+# environment variable making the distribution backends use this scanner
+# instead of their package manager tool
+NATIVE_SCANNER_VAR = 'KATELLO_TRACER_NATIVE_SCANNER'
+
+# deleted files below these paths don't come from packages
+IGNORE_PREFIXES = (
+    '/dev/',
+    '/drm',
+    '/home/',
+    '/memfd:',
+    '/proc/',
+    '/run/',
+    '/SYSV',
+    '/sys/',
+    '/tmp/',
+    '/var/',
+)
+
+# these services need a reboot of the system
+STATIC_SERVICES = [
+    'systemd',
+    'dbus',
+    'dbus-broker',
+]
+
+REBOOT_HELPER = 'You will have to reboot your computer'
+SESSION_HELPER = 'You will have to log out & log in again'
+
+DELETED = ' (deleted)'
+
+
+class TracerApp:
+    def __init__(self, name, helper, app_type):
+        self.name = name
+        self.helper = helper
+        self.type = app_type
+
+
+def native_scanner_enabled():
+    return os.environ.get(NATIVE_SCANNER_VAR, '') != ''
+
+
+def list_pids():
+    return sorted(int(entry) for entry in os.listdir(PROC) if entry.isdigit())
+
+
+def read_stat(pid):
+    """
+    returns the fields of /proc/<pid>/stat following the command name,
+    starting with the process state
+    """
+    with open(os.path.join(PROC, str(pid), 'stat'), 'r') as stat_file:
+        stat = stat_file.read()
+    # the command name may contain spaces and parentheses
+    return stat[stat.rfind(')') + 2:].split()
+
+
+def is_kernel_thread(pid):
+    try:
+        fields = read_stat(pid)
+        return pid == 2 or fields[1] == '2' or bool(int(fields[6]) & PF_KTHREAD)
+    except (IOError, OSError, IndexError, ValueError):
+        return True
+
+
+def mapped_file(line):
+    """
+    returns a tuple of path, inode and whether the file was deleted for
+    a file mapped by a line of /proc/<pid>/maps, or None for anonymous
+    mappings and ignored paths
+
+    The device isn't checked: btrfs and overlayfs files are on devices of
+    major number 0, like anonymous mappings.
+
+    :param line: a line of /proc/<pid>/maps
+    :type line: str
+    """
+    fields = line.split(None, 5)
+    if len(fields) < 6 or fields[4] == '0':
+        return None
+    path = fields[5].rstrip('\n')
+    if not path.startswith('/'):
+        return None
+    deleted = path.endswith(DELETED)
+    if deleted:
+        path = path[:-len(DELETED)]
+    if is_ignored(path):
+        return None
+    return path, int(fields[4]), deleted
+
+
+def mapped_files(pid):
+    try:
+        with open(os.path.join(PROC, str(pid), 'maps'), 'r') as maps_file:
+            return set(filter(None, (mapped_file(line) for line in maps_file)))
+    except (IOError, OSError):
+        return set()
+
+
+def is_ignored(path):
+    return path.startswith(IGNORE_PREFIXES)
+
+
+def mount_namespace(pid):
+    try:
+        return os.readlink(os.path.join(PROC, str(pid), 'ns', 'mnt'))
+    except OSError:
+        return None
+
+
+def is_replaced(path, inode):
+    try:
+        return os.stat(path).st_ino != inode
+    except OSError:
+        return False
+
+
+def deleted_files(pid):
+    """
+    returns the files mapped or executed by a process which were deleted
+    or replaced on disk since they were opened
+    """
+    stale = set()
+    try:
+        exe = os.readlink(os.path.join(PROC, str(pid), 'exe'))
+        if exe.endswith(DELETED) and not is_ignored(exe):
+            stale.add(exe[:-len(DELETED)])
+    except OSError:
+        pass
+
+    # paths of processes in another mount namespace, like containers, can't
+    # be compared with the files we see
+    own_namespace = mount_namespace(pid) == mount_namespace('self')
+    for path, inode, deleted in mapped_files(pid):
+        if deleted or (own_namespace and is_replaced(path, inode)):
+            stale.add(path)
+    return stale
+
+
+def scan(check=deleted_files, pids=None, workers=DEFAULT_WORKERS, timeout=DEFAULT_TIMEOUT):
+    """
+    returns a dict mapping the PIDs for which check returned something
+    truthy to that result
+
+    Kernel threads are skipped before check is called. PIDs which haven't
+    been reached when the timeout expires are skipped as well, so a scan
+    never takes much longer than the timeout.
+
+    :param check: a callable taking a PID
+    :param pids: the PIDs to scan, all running processes by default
+    :type pids: list
+    :param workers: the number of threads walking /proc
+    :type workers: int
+    :param timeout: the number of seconds after which PIDs are skipped
+    :type timeout: int
+    """
+    if pids is None:
+        pids = list_pids()
+    deadline = time.time() + timeout
+
+    def scan_pid(pid):
+        if time.time() > deadline or is_kernel_thread(pid):
+            return pid, None
+        return pid, check(pid)
+
+    pool = ThreadPool(max(1, workers))
+    try:
+        results = pool.map(scan_pid, pids)
+    finally:
+        pool.close()
+        pool.join()
+    return dict((pid, result) for pid, result in results if result)
+
+
+def process_name(pid):
+    try:
+        with open(os.path.join(PROC, str(pid), 'comm'), 'r') as comm_file:
+            return comm_file.read().strip()
+    except (IOError, OSError):
+        return None
+
+
+def group_by_service(pids):
+    """
+    returns a dict mapping the name of the service, or of the process if it
+    doesn't belong to one, to a tuple of the app type and the PIDs
+    """
+    resolver = CgroupResolver()
+    groups = {}
+    for pid in sorted(pids):
+        unit = resolver.unit_from_pid(pid)
+        if pid == 1:
+            name, app_type = 'systemd', 'static'
+        elif unit and unit.endswith('.service') and not unit.startswith('user@'):
+            name = unit[:-len('.service')]
+            app_type = 'static' if name in STATIC_SERVICES else 'daemon'
+        else:
+            name, app_type = process_name(pid), 'session'
+        if name is None:
+            continue
+        groups.setdefault(name, (app_type, []))[1].append(pid)
+    return groups
+
+
+def apps_for_pids(pids):
+    apps = []
+    services = group_by_service(pids)
+    for name in sorted(services):
+        app_type = services[name][0]
+        if app_type == 'static':
+            helper = REBOOT_HELPER
+        elif app_type == 'session':
+            helper = SESSION_HELPER
+        else:
+            helper = 'systemctl restart ' + name
+        apps.append(TracerApp(name, helper, app_type))
+    return apps
+
+
+def collect_services_state(pids=None, workers=DEFAULT_WORKERS):
+    return apps_for_pids(scan(pids=pids, workers=workers))
@@ -0,0 +1,35 @@
+from __future__ import absolute_import
+# raises ImportError when yum is found but broken, so the next backend is used
+import yum  # noqa: F401
+from tracer.query import Query
+
+from katello.tracer.incremental import Transaction
+
+# the states of the members installed by a transaction; the other ones are
+# installed packages being removed, updated or obsoleted
+INSTALLING = ('i', 'u')
+
+
+def collect_apps(plugin=None):
+    query = Query()
+    return query.affected_applications().get()
+
+
+def transaction_changes(conduit=None):
+    """
+    The packages a transaction installed come from the repositories, their
+    files are read from the rpmdb so yum doesn't load the filelists metadata
+    """
+    rpmdb = conduit.getRpmDB()
+    packages = []
+    files = set()
+    for member in conduit.getTsInfo().getMembers():
+        package = member.po
+        packages.append(package.name)
+        if member.ts_state in INSTALLING:
+            for installed in rpmdb.searchNevra(name=package.name, epoch=package.epoch, ver=package.version,
+                                               rel=package.release, arch=package.arch):
+                files.update(installed.filelist)
+        else:
+            files.update(package.filelist)
+    return Transaction(packages, files)
@@ -2,6 +2,9 @@ from __future__ import absolute_import
 from os import path
 import subprocess
 
+from katello.tracer import scanner
+from katello.tracer.incremental import Transaction, package_files
+
 # The path is defined in zypper, see https://github.com/openSUSE/libzypp/blob/master/zypp/target/TargetImpl.cc
 REBOOT_NEEDED_FLAG = "/var/run/reboot-needed"
 
@@ -37,6 +40,15 @@ def collect_services_state():
 
 
 def collect_apps(plugin=None):
+    if scanner.native_scanner_enabled():
+        return scanner.collect_services_state() + check_for_reboot_flag()
     apps = collect_services_state()
     reboot = check_for_reboot_flag()
     return apps + reboot
+
+
+def transaction_changes(plugin=None):
+    packages = getattr(plugin, 'changed_packages', None)
+    if packages is None:
+        return None
+    return Transaction(packages, package_files(packages))
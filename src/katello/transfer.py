@@ -0,0 +1,265 @@
+"""
+Compressed request bodies for the large reports.
+
+subscription-manager's connection serializes a report into one string and
+sends it as is. Above the compression threshold of its plugin
+configuration, a report is instead encoded chunk by chunk and gzip
+compressed into a spooled temporary file while it's encoded, so the JSON of
+a large profile is never held in memory as a whole, and sent with
+`Content-Encoding: gzip`. Smaller reports, and every report when the
+threshold is 0, go through subscription-manager's connection unchanged.
+
+The compressed body is sent over a connection made with the certs, proxy and
+no_proxy of subscription-manager's connection. Katello doesn't decode
+compressed request bodies by itself, so the threshold is 0 by default and is
+only meant for a server, or a proxy in front of it, known to take them. When
+the server rejects the compressed body with any 4xx, the report is sent
+again uncompressed through subscription-manager's connection.
+"""
+import base64
+import json
+import os
+import sys
+import tempfile
+import zlib
+
+# the compressed body is kept in memory up to that size, and written to disk beyond
+SPOOL_SIZE = 1024 * 1024
+
+# the JSON is compressed in blocks of that size
+BLOCK_SIZE = 64 * 1024
+
+# the items of a list encoded at once
+LIST_SLICE = 256
+
+# gzip framing of zlib
+GZIP_WBITS = 16 + zlib.MAX_WBITS
+
+TEXT = (str, type(u''))
+
+
+def json_chunks(data, depth=2):
+    """
+    Yields the JSON of data in chunks, as json.dumps writes it; the values
+    nested deeper than depth are encoded whole, and the lists at that depth
+    a slice at a time
+    """
+    if depth > 0 and isinstance(data, dict) and data and all(isinstance(key, TEXT) for key in data):
+        separator = '{'
+        for key, value in data.items():
+            yield separator + json.dumps(key) + ': '
+            for chunk in json_chunks(value, depth - 1):
+                yield chunk
+            separator = ', '
+        yield '}'
+    elif depth > 1 and isinstance(data, (list, tuple)) and data:
+        separator = '['
+        for value in data:
+            yield separator
+            for chunk in json_chunks(value, depth - 1):
+                yield chunk
+            separator = ', '
+        yield ']'
+    elif depth > 0 and isinstance(data, (list, tuple)) and data:
+        # a slice of items at a time, without its brackets
+        separator = '['
+        for start in range(0, len(data), LIST_SLICE):
+            yield separator + json.dumps(list(data[start:start + LIST_SLICE]))[1:-1]
+            separator = ', '
+        yield ']'
+    else:
+        yield json.dumps(data)
+
+
+def json_blocks(data, size=BLOCK_SIZE):
+    """
+    Yields the JSON of data in blocks of about size bytes, as UTF-8
+    """
+    block = []
+    length = 0
+    for chunk in json_chunks(data):
+        block.append(chunk)
+        length += len(chunk)
+        if length >= size:
+            yield ''.join(block).encode('utf-8')
+            block = []
+            length = 0
+    if block:
+        yield ''.join(block).encode('utf-8')
+
+
+def compressed_body(data, threshold, level=6):
+    """
+    Returns the gzip compressed JSON of data in a file positioned at its
+    start, and its size; None when the JSON isn't larger than the threshold
+    """
+    chunks = json_blocks(data, min(BLOCK_SIZE, threshold + 1))
+    head = []
+    size = 0
+    for chunk in chunks:
+        head.append(chunk)
+        size += len(chunk)
+        if size > threshold:
+            break
+    else:
+        return None
+
+    compressor = zlib.compressobj(level, zlib.DEFLATED, GZIP_WBITS)
+    body = tempfile.SpooledTemporaryFile(max_size=SPOOL_SIZE)
+    for chunk in head:
+        body.write(compressor.compress(chunk))
+    del head
+    for chunk in chunks:
+        body.write(compressor.compress(chunk))
+    body.write(compressor.flush())
+    length = body.tell()
+    body.seek(0)
+    return body, length
+
+
+def ssl_context(restlib):
+    """
+    Returns the SSL context of subscription-manager's connection; like it,
+    each *.pem file of the CA directory is loaded, they aren't hashed
+    """
+    import ssl
+    context = ssl.SSLContext(getattr(ssl, 'PROTOCOL_TLS_CLIENT', ssl.PROTOCOL_SSLv23))
+    if restlib.insecure:
+        context.check_hostname = False
+        context.verify_mode = ssl.CERT_NONE
+    else:
+        context.verify_mode = ssl.CERT_REQUIRED
+        context.check_hostname = True
+        for name in sorted(os.listdir(restlib.ca_dir)):
+            if name.endswith('.pem'):
+                context.load_verify_locations(cafile=os.path.join(restlib.ca_dir, name))
+    if restlib.cert_file:
+        context.load_cert_chain(restlib.cert_file, restlib.key_file)
+    return context
+
+
+def proxy_bypassed(host, no_proxy=None):
+    """
+    Returns whether no_proxy, of rhsm.conf or else of the environment, excludes
+    the host from the proxy, as subscription-manager's connection does
+    """
+    no_proxy = no_proxy or os.environ.get('no_proxy') or os.environ.get('NO_PROXY') or ''
+    host = host.lower()
+    for entry in no_proxy.split(','):
+        entry = entry.strip().lower().lstrip('.')
+        if entry == '*' or (entry and (host == entry or host.endswith('.' + entry))):
+            return True
+    return False
+
+
+def https_connection(restlib):
+    """
+    Returns a connection to the server of subscription-manager's connection,
+    with its certs, proxy and no_proxy, None when it can't be made here
+    """
+    import ssl
+    try:
+        from http.client import HTTPSConnection
+    except ImportError:
+        from httplib import HTTPSConnection
+
+    if not hasattr(ssl, 'SSLContext'):
+        return None
+    try:
+        context = ssl_context(restlib)
+        timeout = getattr(restlib, 'timeout', None)
+        proxy_hostname = getattr(restlib, 'proxy_hostname', None)
+        if proxy_hostname and not proxy_bypassed(restlib.host, getattr(restlib, 'no_proxy', None)):
+            connection = HTTPSConnection(proxy_hostname, int(restlib.proxy_port), context=context, timeout=timeout)
+            headers = {}
+            if getattr(restlib, 'proxy_user', None):
+                credentials = '%s:%s' % (restlib.proxy_user, restlib.proxy_password or '')
+                token = base64.b64encode(credentials.encode('utf-8')).decode('ascii')
+                headers['Proxy-Authorization'] = 'Basic %s' % token
+            connection.set_tunnel(restlib.host, int(restlib.ssl_port), headers)
+        else:
+            connection = HTTPSConnection(restlib.host, int(restlib.ssl_port), context=context, timeout=timeout)
+    except (AttributeError, IOError, OSError, ValueError, TypeError):
+        return None
+    return connection
+
+
+def connect(connection):
+    """
+    Connects, through the proxy when there's one; returns whether it's
+    connected, e.g. not when the server's cert isn't trusted
+    """
+    try:
+        connection.connect()
+        return True
+    except (IOError, OSError):
+        # including ssl.SSLError and socket errors
+        connection.close()
+        return False
+
+
+def send(connection, restlib, request_type, handler, body, length):
+    """
+    Sends a compressed body; the response is validated by
+    subscription-manager's connection
+    :return: the decoded response
+    """
+    headers = {
+        'Content-Type': 'application/json',
+        'Content-Encoding': 'gzip',
+        'Content-Length': str(length),
+        'Accept': 'application/json',
+    }
+    try:
+        connection.request(request_type, restlib.apihandler + handler, body, headers)
+        response = connection.getresponse()
+        result = {
+            'content': response.read().decode('utf-8'),
+            'status': response.status,
+            'headers': dict(response.getheaders()),
+        }
+    finally:
+        connection.close()
+    restlib.validateResponse(result, request_type, handler)
+    if result['content']:
+        return json.loads(result['content'])
+    return None
+
+
+def encoding_rejected(error):
+    """
+    Returns whether the server rejected the request with a 4xx, which may be
+    caused by the compressed body, e.g. a 415 or a 400 when it can't parse it
+    """
+    try:
+        return 400 <= int(getattr(error, 'code', None)) < 500
+    except (TypeError, ValueError):
+        return False
+
+
+def request_put(uep, handler, data, threshold=0):
+    """
+    PUTs the JSON of data, like uep.conn.request_put, compressed when it's
+    larger than the threshold in bytes
+    :param threshold: 0 to never compress
+    :type threshold: int
+    """
+    if threshold <= 0:
+        return uep.conn.request_put(handler, data)
+    compressed = compressed_body(data, threshold)
+    if compressed is None:
+        return uep.conn.request_put(handler, data)
+    body, length = compressed
+    try:
+        connection = https_connection(uep.conn)
+        # nothing is sent yet, so subscription-manager's connection can take over
+        if connection is not None and connect(connection):
+            return send(connection, uep.conn, 'PUT', handler, body, length)
+    except Exception:
+        if not encoding_rejected(sys.exc_info()[1]):
+            raise
+        # the server may not take compressed bodies; a rejection of the report
+        # itself is raised again by the uncompressed upload
+    finally:
+        body.close()
+    return uep.conn.request_put(handler, data)
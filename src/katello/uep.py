@@ -1,43 +1,174 @@
+import os
 import sys
+import threading
 sys.path.append('/usr/share/rhsm')
-from rhsm.connection import UEPConnection
 
-try:
-    from subscription_manager import action_client
-except ImportError:
-    from subscription_manager import certmgr
+# subscription-manager is imported and initialized on first use
+_subscription_manager = None
+_subscription_manager_lock = threading.Lock()
 
-try:
-    from subscription_manager.identity import ConsumerIdentity
-except ImportError:
-    from subscription_manager.certlib import ConsumerIdentity
 
-try:
-    from subscription_manager.injectioninit import init_dep_injection
-    init_dep_injection()
-except ImportError:
-    pass
+def load_subscription_manager():
+    """
+    Imports the classes used from subscription-manager and initializes its
+    dependency injection, once
+    """
+    global _subscription_manager
+    with _subscription_manager_lock:
+        if _subscription_manager is None:
+            from rhsm.connection import UEPConnection
+            classes = {'UEPConnection': UEPConnection}
+
+            try:
+                from subscription_manager import action_client
+                classes['ActionClient'] = action_client.ActionClient
+            except ImportError:
+                from subscription_manager import certmgr
+                classes['CertManager'] = certmgr.CertManager
+
+            try:
+                from subscription_manager.identity import ConsumerIdentity
+            except ImportError:
+                from subscription_manager.certlib import ConsumerIdentity
+            classes['ConsumerIdentity'] = ConsumerIdentity
+
+            try:
+                from subscription_manager.injectioninit import init_dep_injection
+                init_dep_injection()
+            except ImportError:
+                pass
+            _subscription_manager = classes
+    return _subscription_manager
+
+
+class LazyClass(object):
+    """
+    Stands in for a class of subscription-manager until it's used
+    """
+    def __init__(self, name):
+        self._name = name
+
+    def _target(self):
+        return load_subscription_manager()[self._name]
+
+    def __getattr__(self, attribute):
+        return getattr(self._target(), attribute)
+
+    def __call__(self, *args, **kwargs):
+        return self._target()(*args, **kwargs)
+
+
+UEPConnection = LazyClass('UEPConnection')
+ConsumerIdentity = LazyClass('ConsumerIdentity')
+
+
+class Identity(object):
+    def __init__(self, consumer_id, keypath, certpath):
+        self.consumer_id = consumer_id
+        self.keypath = keypath
+        self.certpath = certpath
+
+
+# the identity read from the cert, with the signature of the cert
+_identity = None
+_identity_lock = threading.Lock()
+
+
+def identity_signature(*paths):
+    """
+    Returns what identifies the current content of the files
+    """
+    signature = []
+    for path in paths:
+        try:
+            stat = os.stat(path)
+            signature.append((stat.st_ino, stat.st_size, stat.st_mtime))
+        except OSError:
+            signature.append(None)
+    return tuple(signature)
+
+
+def consumer_identity():
+    """
+    Returns the consumer identity, shared within the process; the cert is
+    only parsed again when it changed on disk, e.g. after a re-registration.
+    :rtype: Identity
+    """
+    global _identity
+    with _identity_lock:
+        if _identity is not None:
+            signature, identity = _identity
+            if identity_signature(identity.certpath) == signature:
+                return identity
+
+        keypath = ConsumerIdentity.keypath()
+        certpath = ConsumerIdentity.certpath()
+        # taken before reading, so a cert written meanwhile is read again
+        signature = identity_signature(certpath)
+        try:
+            consumer_id = ConsumerIdentity.read().getConsumerId()
+        except IOError:
+            consumer_id = None
+        identity = Identity(consumer_id, keypath, certpath)
+        if signature != (None,):
+            _identity = (signature, identity)
+        else:
+            # not registered; looked up again until the cert shows up
+            _identity = None
+        return identity
 
 
 def lookup_consumer_id():
-    try:
-        certificate = ConsumerIdentity.read()
-        return certificate.getConsumerId()
-    except IOError:
-        return None
+    return consumer_identity().consumer_id
+
+
+# the connection of each key/cert pair, with the signature of the files
+_connections = {}
+_connections_lock = threading.Lock()
 
 
 def get_uep():
-    key = ConsumerIdentity.keypath()
-    cert = ConsumerIdentity.certpath()
-    uep = UEPConnection(key_file=key, cert_file=cert)
-    return uep
+    """
+    Returns the connection to the UEP, shared within the process so the
+    reports reuse its keep-alive socket; a new one is made when the identity
+    cert or key changed on disk.
+    """
+    identity = consumer_identity()
+    key = identity.keypath
+    cert = identity.certpath
+    signature = identity_signature(key, cert)
+    with _connections_lock:
+        cached = _connections.get((key, cert))
+        if cached is not None and cached[0] == signature:
+            return cached[1]
+        uep = UEPConnection(key_file=key, cert_file=cert)
+        _connections[(key, cert)] = (signature, uep)
+        return uep
+
+
+def clear_uep_cache():
+    global _identity
+    with _identity_lock:
+        _identity = None
+    with _connections_lock:
+        _connections.clear()
+
+
+def get_profile_manager():
+    """
+    Returns the profile manager of subscription-manager, which uploads and
+    caches the combined profile
+    """
+    load_subscription_manager()
+    from subscription_manager import injection as inj
+    return inj.require(inj.PROFILE_MANAGER)
 
 
 def get_manager():
-    if 'subscription_manager.action_client' in sys.modules:
-        mgr = action_client.ActionClient()
+    classes = load_subscription_manager()
+    if 'ActionClient' in classes:
+        mgr = classes['ActionClient']()
     else:
         # for compatability with subscription-manager >= 1.13
-        mgr = certmgr.CertManager(uep=get_uep())
+        mgr = classes['CertManager'](uep=get_uep())
     return mgr
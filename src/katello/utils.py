@@ -1,3 +1,4 @@
+import json
 import sys
 import os
 from os import environ
@@ -12,6 +13,32 @@ else:
     from ConfigParser import ConfigParser
 
 
+def module_available(name):
+    """
+    Returns whether a top level module can be imported, without importing it
+    """
+    if name in sys.modules:
+        return True
+    try:
+        if sys.version_info[0] == 3:
+            from importlib.util import find_spec
+            return find_spec(name) is not None
+        import imp
+        imp.find_module(name)
+        return True
+    except (ImportError, ValueError):
+        return False
+
+
+def to_str(value):
+    """
+    Returns the text of a value read as bytes on Python 3, e.g. an rpm header tag
+    """
+    if sys.version_info[0] == 3 and isinstance(value, bytes):
+        return value.decode('utf-8')
+    return value
+
+
 def plugin_enabled(filepath, environment_variable=None, force=False):
     return force or (config_enabled(filepath) and not environment_disabled(environment_variable))
 
@@ -25,6 +52,59 @@ def config_enabled(filepath):
         return False
 
 
+def debounce_window(filepath):
+    """
+    Returns the seconds uploads triggered in a row are held back and merged
+    into one trailing upload, 0 when they aren't
+    """
+    try:
+        parser = ConfigParser()
+        parser.read(filepath)
+        return max(0, parser.getfloat('main', 'debounce'))
+    except:
+        return 0
+
+
+def compress_threshold(filepath):
+    """
+    Returns the size in bytes above which the uploads are gzip compressed,
+    0 when they aren't
+    """
+    try:
+        parser = ConfigParser()
+        parser.read(filepath)
+        return max(0, parser.getint('main', 'compress_threshold'))
+    except:
+        return 0
+
+
+def delta_upload_enabled(filepath):
+    """
+    Returns whether the package profile is uploaded as a delta when possible
+    """
+    try:
+        parser = ConfigParser()
+        parser.read(filepath)
+        return parser.getboolean('main', 'delta_upload')
+    except:
+        return False
+
+
+def profile_reporting_enabled(filepath):
+    """
+    Returns whether the package profile is reported, as subscription-manager
+    decides it from its environment variable and rhsm.conf
+    """
+    if environ.get('SUBMAN_DISABLE_PROFILE_REPORTING', '').lower() in ('true', '1', 'yes', 'on'):
+        return False
+    try:
+        parser = ConfigParser()
+        parser.read(filepath)
+        return parser.getint('rhsm', 'report_package_profile') == 1
+    except:
+        return True
+
+
 def environment_disabled(variable):
     return variable is not None and variable in environ and environ[variable] != ''
 
@@ -38,5 +118,17 @@ def combined_profiles_enabled():
         return False
 
 
+def committed_packages(body):
+    """
+    Returns the names of the packages a zypp transaction committed, from the
+    body of the COMMITEND message to the zypp plugins; None when it can't be read
+    """
+    try:
+        steps = json.loads(body)['TransactionStepList']
+        return [step['solvable']['n'] for step in steps if step.get('stage') == 'ok' and 'solvable' in step]
+    except (ValueError, KeyError, TypeError):
+        return None
+
+
 def is_root_user():
     return os.getuid() == 0
@@ -0,0 +1,177 @@
+"""
+Resolves the variables used in the repository URLs ($releasever, $basearch
+and the ones defined in the vars directories) without loading the package
+manager.
+
+The result is cached on disk; the cache is valid as long as the rpmdb, the
+yum configuration and the vars directories are unchanged.
+"""
+import json
+import os
+import re
+
+from katello.constants import RPMDB_PATHS, YUM_CONF, YUM_VARS_DIRS, YUMVARS_CACHE_FILE
+from katello.utils import ConfigParser, to_str
+
+# the provides holding the release version, unless yum.conf sets distroverpkg
+DISTROVERPKG = ['system-release(releasever)', 'redhat-release']
+
+# the base architecture of the machine architectures which differ from it
+BASEARCH = {
+    'i386': 'i386',
+    'i486': 'i386',
+    'i586': 'i386',
+    'i686': 'i386',
+    'athlon': 'i386',
+    'amd64': 'x86_64',
+    'ia32e': 'x86_64',
+    'armv7l': 'armhfp',
+    'armv7hl': 'armhfp',
+    'armv6l': 'armhfp',
+    'ppc64p7': 'ppc64',
+    'ppc64iseries': 'ppc64',
+    'ppc64pseries': 'ppc64',
+    's390': 's390x',
+}
+
+VAR_NAME = re.compile(r'^[A-Za-z0-9_]+$')
+
+
+def basearch(arch=None):
+    """
+    Returns the base architecture of the machine, as yum names it
+    """
+    arch = arch or os.uname()[4]
+    return BASEARCH.get(arch, arch)
+
+
+def distroverpkg(yum_conf=YUM_CONF):
+    try:
+        parser = ConfigParser()
+        parser.read(yum_conf)
+        provides = parser.get('main', 'distroverpkg')
+        return [provide for provide in re.split(r'[\s,]+', provides) if provide]
+    except Exception:
+        return list(DISTROVERPKG)
+
+
+def releasever(provides=None):
+    """
+    Returns the release version from the version of the first provide of
+    distroverpkg found in the rpmdb, or the version of the package providing it
+    """
+    try:
+        import rpm
+    except ImportError:
+        return None
+
+    for provide in provides or distroverpkg():
+        transaction_set = rpm.TransactionSet()
+        for header in transaction_set.dbMatch('providename', provide):
+            for name, version in zip(header['providename'], header['provideversion']):
+                name, version = to_str(name), to_str(version)
+                if name == provide and version:
+                    return version
+            return to_str(header['version'])
+    return None
+
+
+def read_vars(directories=YUM_VARS_DIRS):
+    """
+    Reads the variables defined in the vars directories, one file each
+    """
+    variables = {}
+    for directory in directories:
+        try:
+            names = sorted(os.listdir(directory))
+        except OSError:
+            continue
+        for name in names:
+            if not VAR_NAME.match(name):
+                continue
+            try:
+                with open(os.path.join(directory, name), 'r') as var_file:
+                    lines = var_file.read().splitlines()
+            except IOError:
+                continue
+            if lines:
+                variables.setdefault(name, lines[0].strip())
+    return variables
+
+
+def signature(paths=None):
+    """
+    Returns what identifies the current state of the files the variables
+    are resolved from
+    """
+    if paths is None:
+        paths = RPMDB_PATHS + [YUM_CONF] + YUM_VARS_DIRS
+    stats = []
+    for path in paths:
+        try:
+            stat = os.stat(path)
+            stats.append([path, stat.st_ino, stat.st_size, stat.st_mtime])
+        except OSError:
+            pass
+    return stats
+
+
+def resolve():
+    """
+    Resolves the variables from the files
+    :return: the variables, without releasever when it can't be resolved
+    :rtype: dict
+    """
+    variables = {'basearch': basearch(), 'arch': os.uname()[4]}
+    version = releasever()
+    if version:
+        variables['releasever'] = version
+    variables.update(read_vars())
+    return variables
+
+
+def load_cache(current, cache_file=YUMVARS_CACHE_FILE):
+    try:
+        with open(cache_file, 'r') as cache:
+            data = json.loads(cache.read())
+        if data['signature'] == current:
+            return data['variables']
+    except (IOError, ValueError, KeyError, TypeError):
+        pass
+    return None
+
+
+def save_cache(current, variables, cache_file=YUMVARS_CACHE_FILE):
+    try:
+        cache_dir = os.path.dirname(cache_file)
+        if not os.path.isdir(cache_dir):
+            os.makedirs(cache_dir)
+        with open(cache_file, 'w') as cache:
+            cache.write(json.dumps({'signature': current, 'variables': variables}))
+    except (IOError, OSError):
+        # only a cache; e.g. not writable by the current user
+        pass
+
+
+def yum_variables(cache_file=YUMVARS_CACHE_FILE):
+    """
+    Returns the variables of the repository URLs, from the cache when the
+    files they are resolved from are unchanged
+    :rtype: dict
+    """
+    current = signature()
+    variables = load_cache(current, cache_file)
+    if variables is None:
+        variables = resolve()
+        save_cache(current, variables, cache_file)
+    return variables
+
+
+def substitute(url, variables):
+    """
+    Replaces the $name and ${name} variables known in a URL
+    """
+    # the longest name first, so $basearch isn't taken for $base
+    for name in sorted(variables, key=len, reverse=True):
+        url = url.replace('${%s}' % name, variables[name]).replace('$' + name, variables[name])
+    return url
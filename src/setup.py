@@ -39,6 +39,8 @@ setup(
             'katello-enabled-repos-upload=katello.scripts:enabled_repos_upload',
             'katello-package-upload=katello.scripts:package_upload',
             'katello-tracer-upload=katello.scripts:tracer_upload',
+            'katello-host-tools-agent=katello.agent:main',
+            'katello-host-tools=katello.scripts:host_tools',
         ],
     },
 )
@@ -1,6 +1,7 @@
 import os
 from yum.plugins import TYPE_CORE, TYPE_INTERACTIVE
 
+from katello import agent
 from katello.repos import upload_enabled_repos_report
 
 from logging import Logger
@@ -18,10 +19,11 @@ def close_hook(conduit):
     if not conduit.confBool("main", "supress_debug"):
         conduit.info(2, "Uploading Enabled Repositories Report")
     try:
-        report = None
-        if not combined_profiles_enabled():
-            report = EnabledReport(REPOSITORY_PATH)
-        upload_enabled_repos_report(report)
+        if not agent.trigger(agent.REPOS):
+            report = None
+            if not combined_profiles_enabled():
+                report = EnabledReport(REPOSITORY_PATH)
+            upload_enabled_repos_report(report, background=True)
     except:
         if not conduit.confBool("main", "supress_errors"):
             conduit.error(2, "Unable to upload Enabled Repositories Report")
@@ -11,19 +11,30 @@
 # http://www.gnu.org/licenses/old-licenses/gpl-2.0.txt.
 #
 
-from katello.packages import upload_package_profile
+from katello import agent
+from katello.packages import rpmdb_fingerprint, upload_package_profile
 
 from yum.plugins import TYPE_CORE, TYPE_INTERACTIVE
 
 requires_api_version = '2.3'
 plugin_type = (TYPE_CORE, TYPE_INTERACTIVE)
 
+# the rpmdb as it was before the transaction, for an incremental profile
+rpmdb_before = None
+
+
+def pretrans_hook(conduit):
+    global rpmdb_before
+    rpmdb_before = rpmdb_fingerprint()
+
 
 def posttrans_hook(conduit):
     if not conduit.confBool("main", "supress_debug"):
         conduit.info(2, "Uploading Package Profile")
     try:
-        upload_package_profile()
+        if not agent.trigger(agent.PACKAGES):
+            changed = [member.po.name for member in conduit.getTsInfo().getMembers()]
+            upload_package_profile(background=True, changed=changed, rpmdb_before=rpmdb_before)
     except:
         if not conduit.confBool("main", "supress_errors"):
             conduit.error(2, "Unable to upload Package Profile")
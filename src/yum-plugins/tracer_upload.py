@@ -1,6 +1,8 @@
 import time
 
-from katello.tracer import Query, upload_tracer_profile
+from tracer.query import Query
+
+from katello.tracer import trigger_upload, upload_tracer_profile
 
 from yum.plugins import TYPE_CORE, TYPE_INTERACTIVE
 
@@ -33,7 +35,8 @@ def posttrans_hook(conduit):
     if not conduit.confBool("main", "supress_debug"):
         conduit.info(2, "Uploading Tracer Profile")
     try:
-        upload_tracer_profile(query_apps, conduit)
+        if not trigger_upload(conduit):
+            upload_tracer_profile(query_apps, conduit, incremental=True, background=True)
     except:
         if not conduit.confBool("main", "supress_errors"):
             conduit.error(2, "Unable to upload Tracer Profile")
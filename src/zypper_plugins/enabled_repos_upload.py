@@ -2,6 +2,7 @@
 import sys
 import logging, traceback
 
+from katello import agent
 from katello.repos import upload_enabled_repos_report
 from katello.utils import combined_profiles_enabled
 from katello.enabled_report import EnabledReport
@@ -16,11 +17,12 @@ class EnabledReposUpload(Plugin):
     def PLUGINEND(self, headers, body):
         logging.info("Uploading Enabled Repositories Report")
         try:
-            report = None
-            if not combined_profiles_enabled():
-                report = EnabledReport(ZYPPER_REPOSITORY_PATH)
-            logging.info("Uploading Enabled Repositories Report ->  %s" % str(report))
-            upload_enabled_repos_report(report)
+            if not agent.trigger(agent.REPOS):
+                report = None
+                if not combined_profiles_enabled():
+                    report = EnabledReport(ZYPPER_REPOSITORY_PATH)
+                logging.info("Uploading Enabled Repositories Report ->  %s" % ZYPPER_REPOSITORY_PATH)
+                upload_enabled_repos_report(report, background=True)
         except:
             logging.error("Unable to upload Enabled Repositories Report - %s" % traceback.format_exc())
         self.ack()
@@ -17,7 +17,9 @@ from os.path import basename
 import sys
 import logging
 
-from katello.packages import upload_package_profile
+from katello import agent
+from katello.packages import rpmdb_fingerprint, upload_package_profile
+from katello.utils import committed_packages
 
 from zypp_plugin import Plugin
 
@@ -29,6 +31,8 @@ class KatelloZyppPlugin(Plugin):
         self.description = ""
         self.cleanup = "number"
         self.userdata = {}
+        self.rpmdb_before = None
+        self.changed_packages = None
 
 
     def parse_userdata(self, s):
@@ -57,10 +61,22 @@ class KatelloZyppPlugin(Plugin):
         self.userdata = self.get_userdata(headers)
         self.ack()
 
+    def COMMITBEGIN(self, headers, body):
+        self.rpmdb_before = rpmdb_fingerprint()
+        self.ack()
+
+    def COMMITEND(self, headers, body):
+        self.changed_packages = committed_packages(body)
+        if self.changed_packages is None:
+            logging.error("Unable to read the committed packages")
+        self.ack()
+
     def PLUGINEND(self, headers, body):
         logging.info("Uploading Package Profile")
         try:
-            upload_package_profile()
+            if not agent.trigger(agent.PACKAGES):
+                upload_package_profile(background=True, changed=self.changed_packages,
+                                       rpmdb_before=self.rpmdb_before)
         except:
             logging.error("Unable to upload Package Profile")
         self.ack()
@@ -11,18 +11,30 @@
 
 from os import path, environ
 import logging
-from katello.tracer import upload_tracer_profile
+from katello.tracer import trigger_upload, upload_tracer_profile
 from katello.tracer.zypper import collect_apps
+from katello.utils import committed_packages
 from zypp_plugin import Plugin
 
 
 class TracerUploadPlugin(Plugin):
+    def __init__(self):
+        Plugin.__init__(self)
+        self.changed_packages = None
+
+    def COMMITEND(self, headers, body):
+        self.changed_packages = committed_packages(body)
+        if self.changed_packages is None:
+            logging.error("Unable to read the committed packages")
+        self.ack()
+
     def PLUGINEND(self, headers, body):
         logging.info("PLUGINEND")
 
         logging.info("Uploading Tracer Profile")
         try:
-            upload_tracer_profile(collect_apps)
+            if not trigger_upload(self):
+                upload_tracer_profile(collect_apps, self, incremental=True, background=True)
         except:
             logging.error("Unable to upload Tracer Profile")
 
@@ -0,0 +1,108 @@
+#!/usr/bin/env python
+"""
+Benchmarks reading the enabled repos of large synthetic redhat.repo files
+with ConfigParser and with katello.repofile.
+
+    python test/benchmarks/repofile_benchmark.py
+    python test/benchmarks/repofile_benchmark.py --sections 1000,10000 --enabled 0.1
+    python test/benchmarks/repofile_benchmark.py --min-speedup 2
+"""
+import optparse
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+sys.path.append(os.path.join(os.path.dirname(__file__), '../../src/'))
+from katello import repofile
+from katello.utils import ConfigParser
+
+SECTIONS = [1000, 10000]
+
+SECTION = """[%(name)s]
+name = Red Hat Product %(index)d (RPMs)
+baseurl = https://cdn.example.com/content/dist/rhel8/$releasever/$basearch/product%(index)d/os
+enabled = %(enabled)d
+gpgcheck = 1
+gpgkey = file:///etc/pki/rpm-gpg/RPM-GPG-KEY-redhat-release
+sslverify = 1
+sslcacert = /etc/rhsm/ca/redhat-uep.pem
+sslclientkey = /etc/pki/entitlement/%(index)d-key.pem
+sslclientcert = /etc/pki/entitlement/%(index)d.pem
+metadata_expire = 86400
+enabled_metadata = %(enabled)d
+ui_repoid_vars = releasever basearch
+
+"""
+
+
+def write_repo_file(path, sections, enabled):
+    every = max(1, int(round(1 / enabled))) if enabled else sections + 1
+    with open(path, 'w') as repo_file:
+        repo_file.write('#\n# Certificate-Based Repositories\n#\n')
+        for index in range(sections):
+            repo_file.write(SECTION % {'name': 'product-%d-rpms' % index, 'index': index,
+                                       'enabled': int(index % every == 0)})
+
+
+def config_parser(path):
+    config = ConfigParser()
+    config.read(path)
+    return [(section, config.get(section, 'baseurl')) for section in config.sections()
+            if config.getboolean(section, 'enabled')]
+
+
+def streaming(path):
+    return list(repofile.enabled_repos(path))
+
+
+def best_time(parse, path, runs):
+    best = None
+    for run in range(runs):
+        start = time.time()
+        result = parse(path)
+        elapsed = time.time() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best, result
+
+
+def main():
+    parser = optparse.OptionParser(description='Benchmarks the parsers of .repo files.')
+    parser.add_option('-s', '--sections', default=','.join(str(size) for size in SECTIONS),
+            help="Comma separated numbers of sections [%default]")
+    parser.add_option('-e', '--enabled', type='float', default=0.2,
+            help="Share of the enabled sections [%default]")
+    parser.add_option('-r', '--runs', type='int', default=3,
+            help="Runs of each parser; the fastest one is reported [%default]")
+    parser.add_option('--min-speedup', type='float', default=None,
+            help="Fail if the streaming parser isn't that many times faster")
+    (options, args) = parser.parse_args()
+
+    directory = tempfile.mkdtemp()
+    failed = []
+    try:
+        print('%10s %10s %16s %16s %8s' % ('sections', 'enabled', 'configparser ms', 'streaming ms', 'speedup'))
+        for sections in [int(size) for size in options.sections.split(',')]:
+            path = os.path.join(directory, 'redhat-%d.repo' % sections)
+            write_repo_file(path, sections, options.enabled)
+            baseline, expected = best_time(config_parser, path, options.runs)
+            elapsed, result = best_time(streaming, path, options.runs)
+            if result != expected:
+                sys.stderr.write('The parsers disagree on %d sections\n' % sections)
+                sys.exit(2)
+            speedup = baseline / elapsed if elapsed else float('inf')
+            print('%10d %10d %16.1f %16.1f %7.1fx' % (sections, len(result), baseline * 1000, elapsed * 1000,
+                                                      speedup))
+            if options.min_speedup is not None and speedup < options.min_speedup:
+                failed.append(sections)
+    finally:
+        shutil.rmtree(directory)
+
+    if failed:
+        sys.stderr.write('Below the minimum speedup: %s sections\n' % ', '.join(str(size) for size in failed))
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,135 @@
+#!/usr/bin/env python
+"""
+Benchmarks building the package profile from a synthetic sqlite rpmdb with
+katello.rpmdb, against the rpm bindings when they are installed, and against
+decoding every entry of every header.
+
+    python test/benchmarks/rpmdb_benchmark.py
+    python test/benchmarks/rpmdb_benchmark.py --packages 1000,5000 --files 200
+    python test/benchmarks/rpmdb_benchmark.py --min-speedup 2
+"""
+import optparse
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+sys.path.append(os.path.join(os.path.dirname(__file__), '../../src/'))
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+from katello import rpmdb
+from katello.packages import package_info
+from rpmdb_support import write_rpmdb
+
+PACKAGES = [5000]
+
+
+class AllTags(object):
+    def __contains__(self, tag):
+        return True
+
+    def __getitem__(self, tag):
+        return tag
+
+
+def synthetic_packages(count, files):
+    return [{'name': 'package-%d' % index, 'version': '%d.%d' % (index % 7, index % 13),
+             'release': '%d.el9' % (index % 5), 'epoch': index % 3, 'files': files}
+            for index in range(count)]
+
+
+def sqlite_reader(path):
+    return rpmdb.installed_packages(path=path)
+
+
+def full_decode(path):
+    import sqlite3
+    connection = sqlite3.connect(path)
+    try:
+        headers = [rpmdb.read_header(row[0], AllTags())
+                   for row in connection.execute('SELECT blob FROM Packages ORDER BY hnum')]
+    finally:
+        connection.close()
+    return [rpmdb.package_info({'name': header.get(rpmdb.NAME), 'version': header.get(rpmdb.VERSION),
+                                'release': header.get(rpmdb.RELEASE), 'epoch': header.get(rpmdb.EPOCH),
+                                'arch': header.get(rpmdb.ARCH), 'vendor': header.get(rpmdb.VENDOR)})
+            for header in headers]
+
+
+def rpm_bindings(path):
+    import rpm
+    rpm.addMacro('_dbpath', os.path.dirname(path))
+    rpm.addMacro('_db_backend', 'sqlite')
+    try:
+        transaction_set = rpm.TransactionSet()
+        transaction_set.setVSFlags(-1)
+        return [package_info(header) for header in transaction_set.dbMatch()]
+    finally:
+        rpm.delMacro('_db_backend')
+        rpm.delMacro('_dbpath')
+
+
+def best_time(collect, path, runs):
+    best = None
+    for run in range(runs):
+        start = time.time()
+        result = collect(path)
+        elapsed = time.time() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best, result
+
+
+def main():
+    parser = optparse.OptionParser(description='Benchmarks building the package profile from a sqlite rpmdb.')
+    parser.add_option('-p', '--packages', default=','.join(str(size) for size in PACKAGES),
+            help="Comma separated numbers of packages [%default]")
+    parser.add_option('-f', '--files', type='int', default=100,
+            help="Files of each package, most of the size of a header [%default]")
+    parser.add_option('-r', '--runs', type='int', default=3,
+            help="Runs of each reader; the fastest one is reported [%default]")
+    parser.add_option('--min-speedup', type='float', default=None,
+            help="Fail if katello.rpmdb isn't that many times faster than one of the other readers")
+    (options, args) = parser.parse_args()
+
+    try:
+        import rpm  # noqa: F401
+        baselines = [('rpm', rpm_bindings), ('full decode', full_decode)]
+    except ImportError:
+        sys.stderr.write('The rpm bindings are not installed, comparing with decoding full headers only\n')
+        baselines = [('full decode', full_decode)]
+
+    directory = tempfile.mkdtemp()
+    failed = []
+    try:
+        print('%10s %12s %14s %14s %8s' % ('packages', 'reader', 'baseline ms', 'rpmdb ms', 'speedup'))
+        for count in [int(size) for size in options.packages.split(',')]:
+            path = os.path.join(directory, str(count), 'rpmdb.sqlite')
+            os.makedirs(os.path.dirname(path))
+            write_rpmdb(path, synthetic_packages(count, options.files))
+            elapsed, expected = best_time(sqlite_reader, path, options.runs)
+            best_speedup = None
+            for name, baseline in baselines:
+                try:
+                    baseline_time, result = best_time(baseline, path, options.runs)
+                except Exception:
+                    sys.stderr.write('%s: unable to read the synthetic rpmdb: %s\n' % (name, sys.exc_info()[1]))
+                    continue
+                if result != expected:
+                    sys.stderr.write('%s: the profiles differ on %d packages\n' % (name, count))
+                    sys.exit(2)
+                speedup = baseline_time / elapsed if elapsed else float('inf')
+                best_speedup = speedup if best_speedup is None else max(best_speedup, speedup)
+                print('%10d %12s %14.1f %14.1f %7.1fx' % (count, name, baseline_time * 1000, elapsed * 1000,
+                                                          speedup))
+            if options.min_speedup is not None and (best_speedup is None or best_speedup < options.min_speedup):
+                failed.append(count)
+    finally:
+        shutil.rmtree(directory)
+
+    if failed:
+        sys.stderr.write('Below the minimum speedup: %s packages\n' % ', '.join(str(size) for size in failed))
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
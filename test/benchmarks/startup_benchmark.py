@@ -0,0 +1,104 @@
+#!/usr/bin/env python
+"""
+Measures the time it takes to import the katello modules.
+
+Each module is imported in a fresh interpreter run with `-X importtime`
+(Python 3.7 or newer), which reports the cumulative import time of every
+module. The package manager bindings and subscription-manager are loaded on
+first use, so importing a katello module must not pull them in.
+
+    python test/benchmarks/startup_benchmark.py
+    python test/benchmarks/startup_benchmark.py --runs 10 --max-ms 50
+"""
+import optparse
+import os
+import subprocess
+import sys
+
+SRC_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '../../src/')
+
+MODULES = [
+    'katello.constants',
+    'katello.uep',
+    'katello.packages',
+    'katello.repos',
+    'katello.tracer',
+    'katello.spool',
+    'katello.agent',
+    'katello.scripts',
+]
+
+# modules which are only loaded when an upload or a scan needs them
+HEAVY_MODULES = [
+    'apt',
+    'dbus',
+    'dnf',
+    'rhsm',
+    'subscription_manager',
+    'yum',
+    'zypp_plugin',
+]
+
+
+def import_times(module):
+    """
+    Imports a module in a fresh interpreter
+    :return: the cumulative import time of each module loaded, in microseconds
+    :rtype: dict
+    """
+    env = dict(os.environ)
+    env['PYTHONPATH'] = os.pathsep.join(filter(None, [SRC_DIR, env.get('PYTHONPATH')]))
+    process = subprocess.Popen([sys.executable, '-X', 'importtime', '-c', 'import ' + module],
+                               env=env, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+    stdout, stderr = process.communicate()
+    stderr = stderr.decode('utf-8', 'replace')
+    if process.returncode:
+        raise RuntimeError('Unable to import %s:\n%s' % (module, stderr))
+
+    times = {}
+    for line in stderr.splitlines():
+        if not line.startswith('import time:') or '|' not in line:
+            continue
+        fields = [field.strip() for field in line[len('import time:'):].split('|')]
+        try:
+            times[fields[2]] = int(fields[1])
+        except ValueError:
+            # the header line
+            continue
+    return times
+
+
+def heavy_imports(times):
+    return sorted(name for name in times if name.split('.')[0] in HEAVY_MODULES)
+
+
+def main():
+    parser = optparse.OptionParser(description='Measures the import time of the katello modules.')
+    parser.add_option('-m', '--modules', default=','.join(MODULES),
+            help="Comma separated modules to import [%default]")
+    parser.add_option('-r', '--runs', type='int', default=5,
+            help="Imports of each module; the fastest one is reported [%default]")
+    parser.add_option('--max-ms', type='float', default=None,
+            help="Fail if a module takes longer to import, or pulls in a heavy module")
+    (options, args) = parser.parse_args()
+
+    if sys.version_info < (3, 7):
+        parser.error('-X importtime needs Python 3.7 or newer')
+
+    failed = []
+    print('%-20s %10s  %s' % ('module', 'ms', 'heavy imports'))
+    for module in options.modules.split(','):
+        runs = [import_times(module) for run in range(options.runs)]
+        elapsed = min(times[module] for times in runs) / 1000.0
+        heavy = heavy_imports(runs[0])
+        print('%-20s %10.1f  %s' % (module, elapsed, ', '.join(heavy) or '-'))
+        if options.max_ms is not None and (elapsed > options.max_ms or heavy):
+            failed.append(module)
+
+    if failed:
+        sys.stderr.write('Over the startup budget: %s\n' % ', '.join(failed))
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
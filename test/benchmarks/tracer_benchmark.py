@@ -0,0 +1,308 @@
+#!/usr/bin/env python
+"""
+Benchmarks the katello.tracer backends against synthetic hosts.
+
+Everything runs offline: the output of `dnf needs-restarting`, `needrestart -b`
+and `zypper ps -sss` is generated, the system bus and psutil are replaced by
+fakes counting their calls, and /proc is a temporary directory.
+
+    python test/benchmarks/tracer_benchmark.py
+    python test/benchmarks/tracer_benchmark.py --sizes 100,1000 --dbus-latency 0.2
+    python test/benchmarks/tracer_benchmark.py --max-ms-per-pid 1
+"""
+import optparse
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+from mock import Mock, patch
+
+sys.path.append(os.path.join(os.path.dirname(__file__), '../../src/'))
+
+SIZES = [100, 1000, 10000]
+BACKENDS = ['dnf', 'dnf-plugin', 'deb', 'zypper', 'native']
+BTIME = 1700000000
+
+# modules the backends import but which the benchmark replaces by fakes
+OFFLINE_MODULES = [
+    'dbus',
+    'dnf',
+    'dnf.sack',
+    'rhsm',
+    'rhsm.connection',
+    'subscription_manager',
+    'subscription_manager.action_client',
+    'subscription_manager.identity',
+    'subscription_manager.injectioninit',
+]
+
+
+def offline_modules():
+    missing = {}
+    for name in OFFLINE_MODULES:
+        try:
+            __import__(name)
+        except ImportError:
+            missing[name] = Mock()
+    return patch.dict(sys.modules, missing)
+
+
+class Counter(object):
+    def __init__(self):
+        self.calls = 0
+
+    def hit(self):
+        self.calls += 1
+
+
+class DBusException(Exception):
+    pass
+
+
+class FakeDbus(object):
+    """
+    Stands in for the dbus module used by katello.tracer.SystemdDbus. Every
+    method call on an object is a round trip and sleeps for the latency.
+    """
+    def __init__(self, host, latency):
+        self.host = host
+        self.latency = latency
+        self.counter = Counter()
+        self.exceptions = Mock(DBusException=DBusException)
+
+    def round_trip(self):
+        self.counter.hit()
+        if self.latency:
+            time.sleep(self.latency)
+
+    def SystemBus(self):
+        return self
+
+    def Interface(self, obj, dbus_interface=None):
+        return obj
+
+    def get_object(self, bus_name, object_path):
+        return FakeUnit(self, object_path)
+
+
+class FakeUnit(object):
+    def __init__(self, bus, object_path):
+        self.bus = bus
+        self.object_path = object_path
+
+    def GetUnitByPID(self, pid):
+        self.bus.round_trip()
+        return '/org/freedesktop/systemd1/unit/' + self.bus.host.units[pid]
+
+    def GetUnit(self, name):
+        self.bus.round_trip()
+        return '/org/freedesktop/systemd1/unit/' + name
+
+    def GetAll(self, interface, dbus_interface=None):
+        self.bus.round_trip()
+        unit = self.object_path.rsplit('/', 1)[1]
+        if interface.endswith('.Service'):
+            return {'PAMName': 'systemd-user' if unit.startswith('user@') else ''}
+        return {'Id': unit}
+
+
+class FakePsutil(object):
+    """
+    Stands in for psutil.Process; every read of a process is counted.
+    """
+    def __init__(self, host):
+        self.host = host
+        self.counter = Counter()
+
+    def __call__(self, pid):
+        return FakePsutilProcess(self, pid)
+
+
+class FakePsutilProcess(object):
+    def __init__(self, psutil, pid):
+        self.psutil = psutil
+        self.snapshot = psutil.host.snapshots[pid]
+
+    def as_dict(self, attrs=None, ad_value=None):
+        self.psutil.counter.hit()
+        return dict((attr, self.snapshot[attr]) for attr in attrs)
+
+    def terminal(self):
+        self.psutil.counter.hit()
+        return self.snapshot['terminal']
+
+
+class FakeSack(object):
+    def __init__(self, host):
+        self.host = host
+
+    def query(self):
+        return self
+
+    def installed(self):
+        return self
+
+    def filter(self, file=None, name=None):
+        if file is not None:
+            return [Mock(installtime=BTIME + 3600)] if file == self.host.DELETED_LIB else []
+        return []
+
+
+class SyntheticHost(object):
+    """
+    A host with the given number of stale processes: two thirds belong to
+    services, the others to login sessions, ssh sessions and user managers.
+    """
+    DELETED_LIB = '/usr/lib64/libssl.so.3'
+
+    def __init__(self, size):
+        self.pids = list(range(1000, 1000 + size))
+        services = max(1, size // 10)
+        self.units = {}
+        self.snapshots = {}
+        for index, pid in enumerate(self.pids):
+            kind = index % 12
+            if kind < 8:
+                name = 'svc-%d' % (index % services)
+                unit, terminal, cmdline = name + '.service', None, ['/usr/sbin/' + name]
+            elif kind < 10:
+                name = 'bash'
+                unit, terminal, cmdline = 'session-%d.scope' % (index % 50), '/dev/pts/%d' % (index % 50), ['bash']
+            elif kind < 11:
+                name = 'sshd'
+                unit, terminal, cmdline = 'session-%d.scope' % (index % 50), None, ['sshd:', 'user%d@pts/1' % index]
+            else:
+                name = 'systemd'
+                unit, terminal, cmdline = 'user@%d.service' % (1000 + index % 20), None, ['/usr/lib/systemd/systemd', '--user']
+            self.units[pid] = unit
+            self.snapshots[pid] = {'name': name, 'exe': '/usr/bin/' + name, 'cmdline': cmdline,
+                                   'terminal': terminal, 'ppid': 1 + index % 20}
+        for ppid in range(1, 21):
+            self.snapshots[ppid] = {'name': 'sshd', 'exe': '/usr/sbin/sshd', 'cmdline': ['sshd'],
+                                    'terminal': None, 'ppid': 1}
+
+    def services(self):
+        return sorted(set(unit[:-len('.service')] for unit in self.units.values()
+                          if unit.endswith('.service') and not unit.startswith('user@')))
+
+    def needs_restarting(self):
+        return ''.join('%d : %s\n' % (pid, ' '.join(self.snapshots[pid]['cmdline'])) for pid in self.pids)
+
+    def needrestart(self):
+        lines = ['NEEDRESTART-VER: 3.5', 'NEEDRESTART-KSTA: 3']
+        lines += ['NEEDRESTART-SVC: %s.service' % service for service in self.services()]
+        return '\n'.join(lines) + '\n'
+
+    def zypper_ps(self):
+        return '\n'.join(self.services()) + '\n'
+
+    def write_proc(self, root):
+        with open(os.path.join(root, 'stat'), 'w') as stat_file:
+            stat_file.write('cpu  1 2 3\nbtime %d\n' % BTIME)
+        for pid in self.pids:
+            directory = os.path.join(root, str(pid))
+            os.mkdir(directory)
+            stat = ['S', str(self.snapshots[pid]['ppid'])] + ['0'] * 17 + ['100'] + ['0'] * 30
+            files = {
+                'stat': '%d (%s) %s\n' % (pid, self.snapshots[pid]['name'], ' '.join(stat)),
+                'comm': self.snapshots[pid]['name'] + '\n',
+                'cgroup': '0::/system.slice/%s\n' % self.units[pid],
+                'maps': '7f00-7f01 r-xp 00000000 fd:00 11 /usr/lib64/libc.so.6\n'
+                        '7f01-7f02 r-xp 00000000 fd:00 12 %s (deleted)\n' % self.DELETED_LIB,
+            }
+            for name, content in files.items():
+                with open(os.path.join(directory, name), 'w') as proc_file:
+                    proc_file.write(content)
+
+
+def fake_run(host):
+    def run(args, **kwargs):
+        if args[-1] == '-r':
+            return subprocess.CompletedProcess(args, 1)
+        return subprocess.CompletedProcess(args, 0, stdout=host.needs_restarting(), stderr='')
+    return run
+
+
+def run_backend(backend, host, proc, dbus, psutil):
+    from katello.tracer import scanner
+
+    patches = [
+        patch('katello.tracer.SystemdDbus.dbus', dbus),
+        patch('katello.tracer.cgroup.PROC_CGROUP', os.path.join(proc, '%d', 'cgroup')),
+        patch.object(scanner, 'PROC', proc),
+        patch.object(scanner, 'IGNORE_PREFIXES', ('/dev/',)),
+        patch.object(scanner, 'mount_namespace', lambda pid: None),
+    ]
+    if backend in ('dnf', 'dnf-plugin'):
+        patches += [
+            patch('katello.tracer.dnf.psutil.Process', psutil),
+            patch('katello.tracer.dnf.subprocess.run', fake_run(host)),
+            patch('katello.tracer.dnf.dnf.sack.rpmdb_sack', lambda base: FakeSack(host)),
+        ]
+    elif backend == 'deb':
+        patches.append(patch('katello.tracer.deb.subprocess.check_output', return_value=host.needrestart()))
+    elif backend == 'zypper':
+        patches.append(patch('katello.tracer.zypper.subprocess.check_output', return_value=host.zypper_ps()))
+
+    for patcher in patches:
+        patcher.start()
+    try:
+        start = time.time()
+        if backend == 'dnf':
+            from katello.tracer import dnf
+            apps = dnf.collect_apps()
+        elif backend == 'dnf-plugin':
+            from katello.tracer import dnf
+            apps = dnf.collect_apps(Mock())
+        elif backend == 'deb':
+            from katello.tracer import deb
+            apps = deb.collect_apps()
+        elif backend == 'zypper':
+            from katello.tracer import zypper
+            apps = zypper.collect_apps()
+        else:
+            apps = scanner.collect_services_state()
+        return time.time() - start, len(apps)
+    finally:
+        for patcher in reversed(patches):
+            patcher.stop()
+
+
+def main():
+    parser = optparse.OptionParser(description='Benchmark the katello.tracer backends on synthetic hosts.')
+    parser.add_option('--sizes', default=','.join(str(size) for size in SIZES),
+            help="Comma separated numbers of stale PIDs to benchmark [%default]")
+    parser.add_option('--backends', default=','.join(BACKENDS),
+            help="Comma separated backends to benchmark [%default]")
+    parser.add_option('--dbus-latency', type='float', default=0.0,
+            help="Latency of every DBus call in milliseconds [%default]")
+    parser.add_option('--max-ms-per-pid', type='float',
+            help="Exit with an error if a backend needs more time per PID")
+    (options, args) = parser.parse_args()
+
+    print('%-12s %7s %9s %11s %7s %11s %7s' % ('backend', 'pids', 'seconds', 'pids/s', 'apps', 'dbus calls', 'psutil'))
+    failed = False
+    with offline_modules():
+        for size in [int(size) for size in options.sizes.split(',')]:
+            host = SyntheticHost(size)
+            proc = tempfile.mkdtemp(prefix='katello-proc-')
+            try:
+                host.write_proc(proc)
+                for backend in options.backends.split(','):
+                    dbus = FakeDbus(host, options.dbus_latency / 1000.0)
+                    psutil = FakePsutil(host)
+                    seconds, apps = run_backend(backend, host, proc, dbus, psutil)
+                    print('%-12s %7d %9.3f %11.0f %7d %11d %7d' % (backend, size, seconds, size / max(seconds, 1e-9),
+                                                                  apps, dbus.counter.calls, psutil.counter.calls))
+                    if options.max_ms_per_pid is not None and seconds * 1000.0 / size > options.max_ms_per_pid:
+                        failed = True
+            finally:
+                shutil.rmtree(proc)
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
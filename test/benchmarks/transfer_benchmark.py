@@ -0,0 +1,122 @@
+#!/usr/bin/env python
+"""
+Benchmarks the request bodies of synthetic package profiles: serialized into
+one string as subscription-manager's connection does, and encoded as a
+stream and gzip compressed by katello.transfer.
+
+The bytes on the wire are the sizes of the bodies. The peak memory is
+measured with tracemalloc, and the peak RSS from /proc/self/status after
+resetting it through /proc/self/clear_refs (Linux only).
+
+    python test/benchmarks/transfer_benchmark.py
+    python test/benchmarks/transfer_benchmark.py --packages 5000,50000 --threshold 65536
+    python test/benchmarks/transfer_benchmark.py --max-ratio 0.2
+"""
+import json
+import optparse
+import os
+import sys
+import time
+
+sys.path.append(os.path.join(os.path.dirname(__file__), '../../src/'))
+from katello import transfer
+
+PACKAGES = [1000, 10000, 50000]
+
+
+def synthetic_profile(count):
+    return [{'name': 'package-%d' % index, 'version': '%d.%d.%d' % (index % 7, index % 13, index % 3),
+             'release': '%d.el9' % (index % 5), 'epoch': index % 3, 'arch': 'x86_64',
+             'vendor': 'Red Hat, Inc.'} for index in range(count)]
+
+
+def plain(data, threshold):
+    return len(json.dumps(data).encode('utf-8'))
+
+
+def compressed(data, threshold):
+    body, length = transfer.compressed_body(data, threshold)
+    body.close()
+    return length
+
+
+def reset_peak_rss():
+    try:
+        with open('/proc/self/clear_refs', 'w') as clear_refs:
+            clear_refs.write('5')
+        return True
+    except IOError:
+        return False
+
+
+def status_kb(field):
+    with open('/proc/self/status') as status:
+        for line in status:
+            if line.startswith(field + ':'):
+                return int(line.split()[1])
+    return None
+
+
+def measure(encode, data, threshold):
+    """
+    Returns the body size, the seconds, the peak of traced memory and the
+    peak RSS increase in bytes, None when it can't be measured
+    """
+    try:
+        import tracemalloc
+    except ImportError:
+        tracemalloc = None
+
+    rss = status_kb('VmRSS') if reset_peak_rss() else None
+    start = time.time()
+    size = encode(data, threshold)
+    elapsed = time.time() - start
+    peak_rss = (status_kb('VmHWM') - rss) * 1024 if rss is not None else None
+
+    peak = None
+    if tracemalloc is not None:
+        tracemalloc.start()
+        encode(data, threshold)
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+    return size, elapsed, peak, peak_rss
+
+
+def kilobytes(value):
+    return '%.0f' % (value / 1024.0) if value is not None else 'n/a'
+
+
+def main():
+    parser = optparse.OptionParser(description='Benchmarks the compressed request bodies.')
+    parser.add_option('-p', '--packages', default=','.join(str(size) for size in PACKAGES),
+            help="Comma separated numbers of packages of the profiles [%default]")
+    parser.add_option('-t', '--threshold', type='int', default=64 * 1024,
+            help="Compression threshold in bytes [%default]")
+    parser.add_option('--max-ratio', type='float', default=None,
+            help="Fail if a compressed body is larger than that share of the plain one")
+    (options, args) = parser.parse_args()
+
+    failed = []
+    print('%9s %11s %12s %8s %13s %13s' % ('packages', 'body', 'wire KB', 'ms', 'peak KB', 'peak RSS KB'))
+    for count in [int(size) for size in options.packages.split(',')]:
+        data = {'packages': synthetic_profile(count)}
+        results = {}
+        for name, encode in (('plain', plain), ('gzip stream', compressed)):
+            if name != 'plain' and results['plain'][0] <= options.threshold:
+                print('%9d %11s %12s' % (count, name, 'below the threshold'))
+                continue
+            size, elapsed, peak, peak_rss = measure(encode, data, options.threshold)
+            results[name] = (size, peak)
+            print('%9d %11s %12s %8.1f %13s %13s' % (count, name, kilobytes(size), elapsed * 1000, kilobytes(peak),
+                                                     kilobytes(peak_rss)))
+        if 'gzip stream' in results and options.max_ratio is not None:
+            if results['gzip stream'][0] > results['plain'][0] * options.max_ratio:
+                failed.append(count)
+
+    if failed:
+        sys.stderr.write('Above the maximum ratio: %s packages\n' % ', '.join(str(size) for size in failed))
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
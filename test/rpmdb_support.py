@@ -0,0 +1,94 @@
+"""
+Writes synthetic sqlite rpmdbs, with the schema and header layout of rpm.
+"""
+import sqlite3
+import struct
+
+REGION_TAG = 63  # RPMTAG_HEADERIMMUTABLE
+
+INT32 = 4
+STRING = 6
+BIN = 7
+STRING_ARRAY = 8
+I18NSTRING = 9
+
+
+def encode(entry_type, value):
+    if entry_type == INT32:
+        values = value if isinstance(value, list) else [value]
+        return struct.pack('>%di' % len(values), *values), len(values)
+    if entry_type == STRING_ARRAY:
+        return b''.join(item.encode('utf-8') + b'\0' for item in value), len(value)
+    if isinstance(value, bytes):
+        # as is, e.g. not UTF-8
+        return value + b'\0', 1
+    return value.encode('utf-8') + b'\0', 1
+
+
+def header_blob(tags):
+    """
+    Returns a header blob as rpm stores it, with an immutable region
+    :param tags: (tag, type, value) of each entry
+    :type tags: list
+    """
+    entries = []
+    data = b''
+    for tag, entry_type, value in sorted(tags, key=lambda entry: entry[0]):
+        if entry_type == INT32:
+            data += b'\0' * (-len(data) % 4)
+        encoded, count = encode(entry_type, value)
+        entries.append(struct.pack('>iiiI', tag, entry_type, len(data), count))
+        data += encoded
+    index_length = len(entries) + 1
+    # the region entry points to a trailer after the data
+    region = struct.pack('>iiiI', REGION_TAG, BIN, len(data), 16)
+    data += struct.pack('>iiiI', REGION_TAG, BIN, -index_length * 16, 16)
+    return struct.pack('>ii', index_length, len(data)) + region + b''.join(entries) + data
+
+
+def package_tags(name, version='1.0', release='1.el9', epoch=0, arch='x86_64', vendor='Acme', files=0):
+    tags = [
+        (1000, STRING, name),
+        (1001, STRING, version),
+        (1002, STRING, release),
+        (1004, I18NSTRING, 'The %s package' % name),
+        (1005, I18NSTRING, 'A synthetic package named %s.' % name),
+        (1006, INT32, 1700000000),
+        (1009, INT32, 1024 * files),
+        (1011, STRING, vendor),
+        (1014, STRING, 'GPLv2'),
+        (1022, STRING, arch),
+        (1044, STRING, '%s-%s-%s.src.rpm' % (name, version, release)),
+        (1047, STRING_ARRAY, [name, '%s(x86-64)' % name]),
+        (1049, STRING_ARRAY, ['glibc', 'rpmlib(CompressedFileNames)']),
+    ]
+    if epoch:
+        tags.append((1003, INT32, epoch))
+    if files:
+        tags.append((1116, INT32, [index % 4 for index in range(files)]))
+        tags.append((1117, STRING_ARRAY, ['%s-file-%d' % (name, index) for index in range(files)]))
+        tags.append((1118, STRING_ARRAY, ['/usr/bin/', '/usr/lib64/', '/usr/share/doc/%s/' % name,
+                                          '/usr/share/man/man1/']))
+    return tags
+
+
+def write_rpmdb(path, packages):
+    """
+    Writes a sqlite rpmdb with the Packages table and the Name index
+    :param packages: the keyword arguments of package_tags of each package
+    :type packages: list
+    """
+    connection = sqlite3.connect(path)
+    try:
+        connection.execute("CREATE TABLE 'Packages' (hnum INTEGER PRIMARY KEY AUTOINCREMENT, blob BLOB NOT NULL)")
+        connection.execute("CREATE TABLE 'Name' (key 'TEXT' NOT NULL, hnum INTEGER NOT NULL, idx INTEGER NOT NULL, "
+                           "FOREIGN KEY (hnum) REFERENCES 'Packages'(hnum))")
+        connection.execute("CREATE INDEX 'Name_key_idx' ON 'Name'(key ASC)")
+        for package in packages:
+            cursor = connection.execute('INSERT INTO Packages (blob) VALUES (?)',
+                                        (sqlite3.Binary(header_blob(package_tags(**package))),))
+            connection.execute('INSERT INTO Name (key, hnum, idx) VALUES (?, ?, 0)',
+                               (package['name'], cursor.lastrowid))
+        connection.commit()
+    finally:
+        connection.close()
@@ -0,0 +1,35 @@
+"""
+Test cases working on files in a temporary directory instead of /var/cache.
+"""
+import os
+import shutil
+import tempfile
+from unittest import TestCase
+
+from mock import patch
+
+
+class TempDirTestCase(TestCase):
+    """
+    Gives each test a temporary directory, removed after the test
+    """
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory)
+
+    def start_patch(self, target, value):
+        """
+        Patches target with value until the end of the test
+        """
+        patcher = patch(target, value)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def patch_path(self, target, name):
+        """
+        Patches target, a path, with name in the temporary directory
+        :return: the patched path
+        """
+        path = os.path.join(self.directory, name)
+        self.start_patch(target, path)
+        return path
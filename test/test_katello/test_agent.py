@@ -0,0 +1,149 @@
+import os
+import shutil
+import sys
+import tempfile
+import threading
+import time
+import unittest
+
+sys.path.append(os.path.join(os.path.dirname(__file__), '../../src/'))
+from katello import agent
+
+from mock import Mock, patch
+
+
+class TestMerge(unittest.TestCase):
+    def test_first(self):
+        merged = agent.merge(None, {'trigger': agent.PACKAGES})
+        self.assertEqual(merged, {'trigger': agent.PACKAGES, 'force': False, 'transaction': None})
+
+    def test_transactions(self):
+        queued = agent.merge(None, {'trigger': agent.TRACER,
+                                    'transaction': {'packages': ['vim'], 'files': ['/usr/bin/vim']}})
+        merged = agent.merge(queued, {'trigger': agent.TRACER, 'force': True,
+                                      'transaction': {'packages': ['bash'], 'files': ['/usr/bin/bash']}})
+
+        self.assertTrue(merged['force'])
+        self.assertEqual(merged['transaction'], {'packages': ['bash', 'vim'],
+                                                 'files': ['/usr/bin/bash', '/usr/bin/vim']})
+
+    def test_full_scan_wins(self):
+        queued = agent.merge(None, {'trigger': agent.TRACER,
+                                    'transaction': {'packages': ['vim'], 'files': ['/usr/bin/vim']}})
+        merged = agent.merge(queued, {'trigger': agent.TRACER})
+
+        self.assertFalse(merged['force'])
+        self.assertEqual(merged['transaction'], None)
+
+
+class TestAgent(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory)
+        self.path = os.path.join(self.directory, 'run', 'agent.sock')
+        self.requests = []
+        self.done = threading.Event()
+
+        def job(request):
+            self.requests.append(request)
+            self.done.set()
+
+        self.agent = agent.Agent(self.path, {agent.TRACER: job})
+        self.agent.bind()
+        worker = threading.Thread(target=self.agent.work)
+        worker.daemon = True
+        worker.start()
+        server = threading.Thread(target=self.agent.server.serve_forever)
+        server.daemon = True
+        server.start()
+        self.addCleanup(self.agent.server.server_close)
+        self.addCleanup(self.agent.stop)
+        self.addCleanup(self.agent.shutdown)
+
+    def test_socket_mode(self):
+        self.assertEqual(os.stat(self.path).st_mode & 0o777, 0o600)
+
+    def test_trigger(self):
+        transaction = Mock(packages=set(['vim']), files=set(['/usr/bin/vim']))
+
+        self.assertTrue(agent.trigger(agent.TRACER, transaction=transaction, path=self.path))
+        self.assertTrue(self.done.wait(5))
+        self.assertEqual(self.requests, [{'trigger': agent.TRACER, 'force': False,
+                                          'transaction': {'packages': ['vim'], 'files': ['/usr/bin/vim']}}])
+
+    def test_unknown_trigger(self):
+        self.assertFalse(agent.trigger(agent.PACKAGES, path=self.path))
+
+    def test_not_running(self):
+        self.assertFalse(agent.trigger(agent.TRACER, path=self.path + '.missing'))
+
+    def test_disabled(self):
+        with patch.dict(os.environ, {agent.DISABLE_VARS[agent.PACKAGES]: '1'}):
+            self.assertTrue(agent.trigger(agent.PACKAGES, path=self.path + '.missing'))
+            self.assertFalse(agent.trigger(agent.PACKAGES, force=True, path=self.path + '.missing'))
+
+
+class TestDebounce(unittest.TestCase):
+    def setUp(self):
+        self.requests = []
+        self.agent = agent.Agent(jobs={agent.TRACER: self.requests.append}, windows=lambda kind: 30)
+
+    def test_held_back(self):
+        self.agent.submit({'trigger': agent.TRACER})
+
+        ready, timeout = self.agent.ready()
+        self.assertEqual(ready, [])
+        self.assertTrue(29 < timeout <= 30)
+
+    @patch('katello.agent.time.time')
+    def test_trailing_trigger(self, now):
+        now.return_value = 1000
+        self.agent.submit({'trigger': agent.TRACER, 'transaction': {'packages': ['vim'], 'files': []}})
+        now.return_value = 1020
+        self.agent.submit({'trigger': agent.TRACER, 'transaction': {'packages': ['bash'], 'files': []}})
+
+        now.return_value = 1040
+        self.assertEqual(self.agent.ready(), ([], 10))
+        now.return_value = 1050
+        self.assertEqual(self.agent.ready(), ([agent.TRACER], None))
+
+    def test_force_is_not_held_back(self):
+        self.agent.submit({'trigger': agent.TRACER, 'force': True})
+        self.assertEqual(self.agent.ready(), ([agent.TRACER], None))
+
+    def test_work(self):
+        self.agent.windows = lambda kind: 0.1
+        self.agent.submit({'trigger': agent.TRACER})
+        self.agent.submit({'trigger': agent.TRACER})
+        worker = threading.Thread(target=self.agent.work)
+        worker.start()
+        self.addCleanup(worker.join)
+        self.addCleanup(self.agent.stop)
+
+        for attempt in range(50):
+            if self.requests:
+                break
+            time.sleep(0.1)
+        self.assertEqual(len(self.requests), 1)
+
+
+class TestJobs(unittest.TestCase):
+    @patch('katello.tracer.TracerCache.remove_cache')
+    @patch('katello.tracer.upload_tracer_profile')
+    def test_upload_tracer(self, upload, remove_cache):
+        agent.upload_tracer({'trigger': agent.TRACER, 'force': False,
+                             'transaction': {'packages': ['vim'], 'files': ['/usr/bin/vim']}})
+
+        transaction = upload.call_args[1]['transaction']
+        self.assertEqual(transaction.packages, set(['vim']))
+        self.assertTrue(upload.call_args[1]['incremental'])
+        remove_cache.assert_not_called()
+
+    @patch('katello.tracer.TracerCache.remove_cache')
+    @patch('katello.tracer.upload_tracer_profile')
+    def test_upload_tracer_forced(self, upload, remove_cache):
+        agent.upload_tracer({'trigger': agent.TRACER, 'force': True, 'transaction': None})
+
+        self.assertFalse(upload.call_args[1]['incremental'])
+        self.assertTrue(upload.call_args[1]['force'])
+        remove_cache.assert_called_once_with()
@@ -1,7 +1,7 @@
 import os
 import sys
 import unittest
-from mock import patch
+from mock import Mock, patch
 sys.path.append(os.path.join(os.path.dirname(__file__), '../../src/'))
 from katello import enabled_report
 from katello.constants import YUM, ZYPPER
@@ -21,6 +21,42 @@ class TestEnabledReport(unittest.TestCase):
 
         self.assertEqual(expected, report.content)
 
+    @patch('katello.enabled_report.ConfigParser')
+    @patch('katello.enabled_report.repofile.enabled_repos', return_value=iter([('enabled', 'https://enabled_repo.com')]))
+    def test_streamed(self, enabled_repos, config_parser):
+        report = enabled_report.EnabledReport(os.path.join(os.path.dirname(__file__), 'data/repos/redhat.repo'))
+        expected = {'enabled_repos': {'repos': [{'baseurl': ['https://enabled_repo.com'],
+                                                 'repositoryid': 'enabled'}]}}
+
+        self.assertEqual(expected, report.content)
+        config_parser.assert_not_called()
+
+    @patch('katello.enabled_report.repofile.enabled_repos', side_effect=enabled_report.repofile.UnsupportedRepoFile)
+    def test_unsupported_by_stream(self, enabled_repos):
+        report = enabled_report.EnabledReport(os.path.join(os.path.dirname(__file__), 'data/repos/redhat.repo'))
+        expected = {'enabled_repos': {'repos': [{'baseurl': ['https://enabled_repo.com'],
+                                                 'repositoryid': 'enabled'}]}}
+
+        self.assertEqual(expected, report.content)
+
+    @patch('katello.enabled_report.yum_variables', return_value={'releasever': '8'})
+    def test_fingerprint(self, yum_variables):
+        rh_repo = os.path.join(os.path.dirname(__file__), 'data/repos/redhat.repo')
+        fingerprint = enabled_report.EnabledReport(rh_repo).fingerprint('1234')
+
+        self.assertEqual(fingerprint[0], rh_repo)
+        self.assertEqual(fingerprint[4:], ['1234', {'releasever': '8'}])
+        self.assertEqual(enabled_report.EnabledReport('wrong path').fingerprint('1234'), None)
+
+    @patch('katello.enabled_report.yum_variables', return_value={'releasever': '8'})
+    def test_fingerprint_taken_once(self, yum_variables):
+        report = enabled_report.EnabledReport(os.path.join(os.path.dirname(__file__), 'data/repos/redhat.repo'))
+
+        self.assertEqual(report.fingerprint('1234'), report.fingerprint('1234'))
+        self.assertEqual(yum_variables.call_count, 1)
+        report.fingerprint('5678')
+        self.assertEqual(yum_variables.call_count, 2)
+
     @unittest.skipIf(ZYPPER == False, "Zypper not present")
     @patch('katello.enabled_report.YUM', False)
     def test_zypper_valid(self):
@@ -31,9 +67,48 @@ class TestEnabledReport(unittest.TestCase):
 
         self.assertEqual(expected, report.content)
 
+    @patch('katello.enabled_report.yum_variables', return_value={'releasever': '8', 'basearch': 'x86_64'})
+    def test_var_interpolation(self, yum_variables):
+        rh_repo = os.path.join(os.path.dirname(__file__), 'data/repos/redhat.repo.with_vars')
+        report = enabled_report.EnabledReport(rh_repo)
+        expected = {'enabled_repos': {'repos': [{'baseurl': ['https://enabled_repo.com/8/x86_64'], 'repositoryid': 'enabled_one'}]}}
+
+        self.assertEqual(expected, report.content)
+        yum_variables.assert_called_once_with()
+
+    @patch('katello.enabled_report.yum_variables')
+    def test_no_vars(self, yum_variables):
+        rh_repo = os.path.join(os.path.dirname(__file__), 'data/repos/redhat.repo')
+        enabled_report.EnabledReport(rh_repo)
+        yum_variables.assert_not_called()
+
+    @patch('katello.enabled_report.YUM', True)
+    @patch('katello.enabled_report.yum_variables', return_value={'releasever': '8', 'basearch': 'x86_64'})
+    def test_resolved_without_yum(self, yum_variables):
+        yum = Mock()
+        with patch.dict(sys.modules, {'yum': yum}):
+            report = enabled_report.EnabledReport(os.path.join(os.path.dirname(__file__), 'data/repos/redhat.repo.with_vars'))
+            content = report.content
+
+        self.assertEqual(['https://enabled_repo.com/8/x86_64'], content['enabled_repos']['repos'][0]['baseurl'])
+        yum.YumBase.assert_not_called()
+
+    @patch('katello.enabled_report.YUM', True)
+    @patch('katello.enabled_report.yum_variables', return_value={'releasever': '8'})
+    def test_basearch_from_yum(self, yum_variables):
+        yum = Mock()
+        yum.YumBase.return_value.conf.yumvar = {'releasever': '6.22', 'basearch': '80286'}
+        with patch.dict(sys.modules, {'yum': yum}):
+            report = enabled_report.EnabledReport(os.path.join(os.path.dirname(__file__), 'data/repos/redhat.repo.with_vars'))
+            content = report.content
+
+        self.assertEqual(['https://enabled_repo.com/6.22/80286'], content['enabled_repos']['repos'][0]['baseurl'])
+        yum.YumBase.assert_called_once_with()
+
     @unittest.skipIf(YUM == False, "Yum not present")
-    @patch('katello.enabled_report.yum.YumBase.conf')
-    def test_var_interpolation_yum(self, yum_base_conf):
+    @patch('katello.enabled_report.yum_variables', return_value={'basearch': 'x86_64'})
+    @patch('yum.YumBase.conf')
+    def test_var_interpolation_yum(self, yum_base_conf, yum_variables):
         yum_base_conf.yumvar = {'releasever': "6.22", 'basearch': "80286"}
         rh_repo = os.path.join(os.path.dirname(__file__), 'data/repos/redhat.repo.with_vars')
         report = enabled_report.EnabledReport(rh_repo)
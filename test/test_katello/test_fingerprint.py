@@ -0,0 +1,60 @@
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+
+sys.path.append(os.path.join(os.path.dirname(__file__), '../../src/'))
+from katello import fingerprint
+from katello.agent import PACKAGES, TRACER
+
+from mock import patch
+
+
+class TestFingerprint(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory)
+        self.status = self.write('status', 'Package: bash\n')
+        for name, value in [('PACKAGE_DB_FINGERPRINT_FILE', os.path.join(self.directory, 'cache', '%s.json')),
+                            ('PACKAGE_DB_PATHS', [self.status]),
+                            ('RHSM_CONF', os.path.join(self.directory, 'rhsm.conf'))]:
+            patcher = patch('katello.fingerprint.' + name, value)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def write(self, name, content):
+        path = os.path.join(self.directory, name)
+        with open(path, 'w') as out:
+            out.write(content)
+        return path
+
+    def test_unchanged(self):
+        self.assertFalse(fingerprint.unchanged(PACKAGES))
+        fingerprint.record(PACKAGES, fingerprint.take(PACKAGES))
+        self.assertTrue(fingerprint.unchanged(PACKAGES))
+        self.assertFalse(fingerprint.unchanged(TRACER))
+
+    def test_package_db_changed(self):
+        fingerprint.record(PACKAGES, fingerprint.take(PACKAGES))
+        os.remove(self.status)
+        self.write('status', 'Package: bash\nPackage: vim\n')
+
+        self.assertFalse(fingerprint.unchanged(PACKAGES))
+
+    def test_reregistered(self):
+        self.write('rhsm.conf', '[rhsm]\nconsumerCertDir = %s\n' % self.directory)
+        fingerprint.record(PACKAGES, fingerprint.take(PACKAGES))
+        self.write('cert.pem', 'cert')
+
+        self.assertFalse(fingerprint.unchanged(PACKAGES))
+
+    @patch('katello.fingerprint.boot_id', return_value='first')
+    def test_reboot(self, boot_id):
+        fingerprint.record(TRACER, fingerprint.take(TRACER))
+        boot_id.return_value = 'second'
+
+        self.assertFalse(fingerprint.unchanged(TRACER))
+
+    def test_consumer_cert(self):
+        self.assertEqual(fingerprint.consumer_cert('/nonexistent'), '/etc/pki/consumer/cert.pem')
@@ -1,12 +1,78 @@
+import json
 import os
 import sys
 from unittest import TestCase
 
 sys.path.append(os.path.join(os.path.dirname(__file__), '../../src/'))
-from katello.packages import purge_package_cache, upload_package_profile
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+from katello.constants import PACKAGE_PROFILE_PLUGIN_CONF
+from katello.packages import (incremental_profile, load_profile, profile_delta, profile_digest, purge_package_cache,
+        save_profile, send_package_profile, sort_profile, update_package_profile, upload_package_profile)
+from tempdir_support import TempDirTestCase
 
-from mock import patch
+from mock import ANY, Mock, patch
+
+FINGERPRINT_FILE = '/tmp/package_db_%s.json'  # Override default fingerprint due to /var/cache perms
+PROFILE_FILE = '/tmp/package_profile.json'
+
+
+def package(name, version='1.0', arch='noarch'):
+    return {'name': name, 'version': version, 'release': '1', 'epoch': 0, 'arch': arch, 'vendor': 'Acme'}
+
+
+class Rejected(Exception):
+    def __init__(self, code):
+        Exception.__init__(self, code)
+        self.code = code
+
+
+class StandInUEP(object):
+    """
+    Stores the package profiles like the server, applying the deltas when
+    they are supported
+    """
+    def __init__(self, supports_delta=True):
+        self.supports_delta = supports_delta
+        self.profiles = {}
+        self.full_uploads = 0
+        self.delta_uploads = 0
+        self.conn = self
+
+    def sanitize(self, consumer_id):
+        return consumer_id
+
+    def updatePackageProfile(self, consumer_id, packages):
+        self.full_uploads += 1
+        self.profiles[consumer_id] = sort_profile(json.loads(json.dumps(packages)))
+
+    def request_put(self, method, body):
+        consumer_id = method.split('/')[2]
+        if not self.supports_delta or method != '/consumers/%s/packages/delta' % consumer_id:
+            raise Rejected(405)
+        delta = json.loads(json.dumps(body))
+        profile = self.profiles.get(consumer_id)
+        if profile is None or profile_digest(profile) != delta['base']:
+            raise Rejected(409)
+        self.delta_uploads += 1
+        for removed in delta['removed']:
+            profile.remove(removed)
+        for changed in delta['changed']:
+            profile = [entry for entry in profile if (entry['name'], entry['arch']) != (changed['name'],
+                                                                                        changed['arch'])]
+        self.profiles[consumer_id] = sort_profile(profile + delta['changed'] + delta['added'])
+
+
+@patch('katello.fingerprint.PACKAGE_DB_FINGERPRINT_FILE', FINGERPRINT_FILE)
+@patch('katello.packages.PACKAGE_PROFILE_FILE', PROFILE_FILE)
+@patch('katello.packages.collect_package_profile', Mock(return_value=None))
 class TestUploadPackageProfile(TestCase):
+    def setUp(self):
+        for path in (FINGERPRINT_FILE % 'packages', PROFILE_FILE):
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+
     @patch('katello.packages.plugin_enabled', return_value=True)
     @patch('katello.packages.get_manager')
     @patch('katello.packages.lookup_consumer_id')
@@ -26,6 +92,298 @@ class TestUploadPackageProfile(TestCase):
 
         mock_manager.assert_not_called()
 
+    @patch('katello.packages.plugin_enabled', return_value=True)
+    @patch('katello.packages.spool_and_drain')
+    @patch('katello.packages.get_manager')
+    @patch('katello.packages.lookup_consumer_id', return_value='1234')
+    def test_upload_background(self, mock_lookup, mock_manager, spool_and_drain, plugin_enabled):
+        upload_package_profile(background=True)
+
+        mock_manager.assert_not_called()
+        spool_and_drain.assert_called_with('packages', '1234', taken=ANY)
+
+    @patch('katello.packages.plugin_enabled', return_value=True)
+    @patch('katello.packages.get_manager')
+    @patch('katello.packages.lookup_consumer_id', return_value='1234')
+    def test_unchanged_package_db(self, mock_lookup, mock_manager, plugin_enabled):
+        upload_package_profile()
+        upload_package_profile()
+
+        self.assertEqual(mock_manager.return_value.profilelib._do_update.call_count, 1)
+        self.assertEqual(mock_lookup.call_count, 1)
+
+        upload_package_profile(force=True)
+        self.assertEqual(mock_manager.return_value.profilelib._do_update.call_count, 2)
+
+    @patch('katello.packages.plugin_enabled', return_value=True)
+    @patch('katello.packages.combined_profiles_enabled', return_value=False)
+    @patch('katello.packages.spool_and_drain')
+    @patch('katello.packages.installed_packages', return_value=[package('bar', '2.0')])
+    @patch('katello.packages.rpmdb_fingerprint', return_value=['after'])
+    @patch('katello.packages.lookup_consumer_id', return_value='1234')
+    def test_upload_incremental(self, mock_lookup, rpmdb_fingerprint, installed_packages, spool_and_drain,
+                                combined, plugin_enabled):
+        save_profile(['before'], [package('bar'), package('foo')])
+
+        upload_package_profile(background=True, changed=['bar'], rpmdb_before=['before'])
+
+        expected = [package('bar', '2.0'), package('foo')]
+        spool_and_drain.assert_called_with('packages', '1234', {'packages': expected}, taken=ANY)
+        self.assertEqual(load_profile(), (['after'], expected))
+
+    @patch('katello.packages.plugin_enabled', return_value=True)
+    @patch('katello.packages.combined_profiles_enabled', return_value=True)
+    @patch('katello.packages.spool_and_drain')
+    @patch('katello.packages.installed_packages', return_value=[package('bar', '2.0')])
+    @patch('katello.packages.rpmdb_fingerprint', return_value=['after'])
+    @patch('katello.packages.lookup_consumer_id', return_value='1234')
+    def test_upload_combined(self, mock_lookup, rpmdb_fingerprint, installed_packages, spool_and_drain,
+                             combined, plugin_enabled):
+        save_profile(['before'], [package('bar')])
+
+        upload_package_profile(background=True, changed=['bar'], rpmdb_before=['before'])
+
+        spool_and_drain.assert_called_with('packages', '1234', {'packages': [package('bar', '2.0')]}, taken=ANY)
+
+
+@patch('katello.packages.PACKAGE_PROFILE_FILE', PROFILE_FILE)
+@patch('katello.packages.rpmdb_fingerprint', return_value=['after'])
+class TestIncrementalProfile(TestCase):
+    def setUp(self):
+        try:
+            os.remove(PROFILE_FILE)
+        except OSError:
+            pass
+
+    @patch('katello.packages.installed_packages', return_value=[package('baz')])
+    def test_changed_packages(self, installed_packages, rpmdb_fingerprint):
+        save_profile(['before'], [package('bar'), package('foo')])
+
+        profile = incremental_profile(['foo', 'baz'], ['before'])
+
+        installed_packages.assert_called_with(['foo', 'baz'])
+        self.assertEqual(profile, [package('bar'), package('baz')])
+
+    @patch('katello.packages.installed_packages')
+    def test_rpmdb_changed_meanwhile(self, installed_packages, rpmdb_fingerprint):
+        save_profile(['other'], [package('bar')])
+
+        self.assertEqual(incremental_profile(['bar'], ['before']), None)
+        installed_packages.assert_not_called()
+
+    @patch('katello.packages.installed_packages')
+    def test_no_profile(self, installed_packages, rpmdb_fingerprint):
+        self.assertEqual(incremental_profile(['bar'], ['before']), None)
+        self.assertEqual(incremental_profile(['bar'], None), None)
+        installed_packages.assert_not_called()
+
+
+@patch('katello.packages.PACKAGE_PROFILE_FILE', PROFILE_FILE)
+@patch('katello.packages.combined_profiles_enabled', return_value=False)
+@patch('katello.packages.get_manager')
+@patch('katello.packages.collect_package_profile', Mock(return_value=None))
+@patch('katello.packages.profile_reporting_enabled', Mock(return_value=True))
+class TestUpdatePackageProfile(TempDirTestCase):
+    def setUp(self):
+        try:
+            os.remove(PROFILE_FILE)
+        except OSError:
+            pass
+        TempDirTestCase.setUp(self)
+        self.cache_file = self.patch_path('katello.packages.PACKAGE_CACHE_FILE', 'packages.json')
+        with open(self.cache_file, 'w') as cache_file:
+            cache_file.write(json.dumps([package('foo'), package('bar')]))
+
+    @patch('katello.packages.rpmdb_fingerprint', return_value=['rpmdb'])
+    def test_seeds_profile(self, rpmdb_fingerprint, get_manager, combined):
+        update_package_profile()
+
+        get_manager.return_value.profilelib._do_update.assert_called()
+        self.assertEqual(load_profile(), (['rpmdb'], [package('bar'), package('foo')]))
+
+    @patch('katello.packages.rpmdb_fingerprint', side_effect=[['before'], ['after']])
+    def test_rpmdb_changed_meanwhile(self, rpmdb_fingerprint, get_manager, combined):
+        update_package_profile()
+
+        self.assertEqual(load_profile(), None)
+
+    @patch('katello.packages.rpmdb_fingerprint', return_value=['rpmdb'])
+    @patch('katello.packages.get_uep')
+    def test_sqlite_rpmdb(self, get_uep, rpmdb_fingerprint, get_manager, combined):
+        packages = [package('baz'), package('foo')]
+        with patch('katello.packages.collect_package_profile', return_value=packages):
+            update_package_profile('1234')
+
+        get_manager.assert_not_called()
+        get_uep.return_value.updatePackageProfile.assert_called_with('1234', packages)
+        with open(self.cache_file) as cache_file:
+            self.assertEqual(json.loads(cache_file.read()), packages)
+        self.assertEqual(load_profile(), (['rpmdb'], packages))
+
+    @patch('katello.packages.rpmdb_fingerprint', return_value=['rpmdb'])
+    @patch('katello.packages.get_uep')
+    def test_sqlite_rpmdb_cached(self, get_uep, rpmdb_fingerprint, get_manager, combined):
+        packages = [package('bar'), package('foo')]
+        with patch('katello.packages.collect_package_profile', return_value=packages):
+            update_package_profile('1234')
+
+        get_uep.assert_not_called()
+        get_manager.assert_not_called()
+        self.assertEqual(load_profile(), (['rpmdb'], packages))
+
+    @patch('katello.packages.rpmdb_fingerprint', return_value=['rpmdb'])
+    @patch('katello.packages.get_uep')
+    def test_reporting_disabled(self, get_uep, rpmdb_fingerprint, get_manager, combined):
+        packages = [package('baz'), package('foo')]
+        with patch('katello.packages.collect_package_profile', return_value=packages):
+            with patch('katello.packages.profile_reporting_enabled', return_value=False) as reporting_enabled:
+                with patch('sys.stderr'):
+                    update_package_profile('1234')
+
+        reporting_enabled.assert_called_with('/etc/rhsm/rhsm.conf')
+        get_uep.assert_not_called()
+        self.assertEqual(load_profile(), (['rpmdb'], packages))
+
+    @patch('katello.packages.rpmdb_fingerprint', return_value=['rpmdb'])
+    @patch('katello.packages.get_uep')
+    @patch('katello.packages.get_profile_manager')
+    def test_combined_profile(self, get_profile_manager, get_uep, rpmdb_fingerprint, get_manager, combined):
+        combined.return_value = True
+        profile = Mock()
+        profile.get_profile.side_effect = lambda content_type: Mock(collect=Mock(return_value=[content_type]))
+        packages = [package('baz'), package('foo')]
+        with patch.dict('sys.modules', {'rhsm': Mock(), 'rhsm.profile': profile}):
+            with patch('katello.packages.collect_package_profile', return_value=packages):
+                update_package_profile('1234')
+
+        get_manager.assert_not_called()
+        manager = get_profile_manager.return_value
+        self.assertEqual(manager._current_profile, {'rpm': packages, 'enabled_repos': ['enabled_repos'],
+                                                    'modulemd': ['modulemd']})
+        manager.update_check.assert_called_once_with(get_uep.return_value, '1234')
+        self.assertEqual(load_profile(), (['rpmdb'], packages))
+
+    @patch('katello.packages.rpmdb_fingerprint', return_value=['rpmdb'])
+    def test_seeds_profile_from_combined_cache(self, rpmdb_fingerprint, get_manager, combined):
+        combined.return_value = True
+        with open(self.patch_path('katello.packages.PROFILE_CACHE_FILE', 'profile.json'), 'w') as cache_file:
+            cache_file.write(json.dumps({'rpm': [package('foo'), package('bar')], 'enabled_repos': [],
+                                         'modulemd': []}))
+
+        update_package_profile()
+
+        get_manager.return_value.profilelib._do_update.assert_called()
+        self.assertEqual(load_profile(), (['rpmdb'], [package('bar'), package('foo')]))
+
+
+PROFILES = [
+    [package('bash'), package('kernel', '5.14', 'x86_64'), package('openssl'), package('tzdata'), package('vim')],
+    [package('bash', '2.0'), package('kernel', '5.14', 'x86_64'), package('openssl'), package('tzdata'),
+     package('vim')],
+    [package('bash', '2.0'), package('kernel', '5.14', 'x86_64'), package('kernel', '5.15', 'x86_64'),
+     package('openssl'), package('tzdata'), package('vim')],
+    [package('bash', '2.0'), package('kernel', '5.15', 'x86_64'), package('openssl', '3.0'), package('tzdata'),
+     package('vim'), package('zsh')],
+]
+
+
+@patch('katello.packages.combined_profiles_enabled', Mock(return_value=False))
+@patch('katello.packages.profile_reporting_enabled', Mock(return_value=True))
+@patch('katello.packages.delta_upload_enabled', Mock(return_value=True))
+class TestPackageDelta(TempDirTestCase):
+    def setUp(self):
+        TempDirTestCase.setUp(self)
+        self.cache_file = self.patch_path('katello.packages.PACKAGE_CACHE_FILE', 'packages.json')
+        self.patch_path('katello.packages.PACKAGE_DELTA_FILE', 'delta.json')
+
+    def upload(self, server, profiles):
+        with patch('katello.packages.get_uep', return_value=server):
+            for packages in profiles:
+                send_package_profile('1234', packages)
+                self.assertEqual(server.profiles['1234'], sort_profile(packages))
+
+    def test_delta(self):
+        delta = profile_delta(PROFILES[2], PROFILES[3])
+
+        self.assertEqual(delta['base'], profile_digest(PROFILES[2]))
+        self.assertEqual(delta['added'], [package('zsh')])
+        self.assertEqual(delta['removed'], [package('kernel', '5.14', 'x86_64')])
+        self.assertEqual(delta['changed'], [package('openssl', '3.0')])
+
+    def test_full_and_delta_uploads_converge(self):
+        delta_server = StandInUEP()
+        self.upload(delta_server, PROFILES)
+        os.remove(self.cache_file)
+        full_server = StandInUEP(supports_delta=False)
+        self.upload(full_server, PROFILES)
+
+        self.assertEqual(delta_server.profiles, full_server.profiles)
+        self.assertEqual((delta_server.full_uploads, delta_server.delta_uploads), (1, 3))
+        self.assertEqual((full_server.full_uploads, full_server.delta_uploads), (4, 0))
+
+    def test_unsupported_delta_is_not_retried(self):
+        server = StandInUEP(supports_delta=False)
+        with patch.object(server, 'request_put', wraps=server.request_put) as request_put:
+            self.upload(server, PROFILES)
+
+        self.assertEqual(request_put.call_count, 1)
+
+    def test_not_found_is_retried(self):
+        server = StandInUEP()
+        self.upload(server, PROFILES[:1])
+
+        with patch.object(server, 'request_put', side_effect=Rejected(404)):
+            with patch('sys.stderr'):
+                self.upload(server, PROFILES[1:2])
+        self.upload(server, PROFILES[2:])
+
+        self.assertEqual((server.full_uploads, server.delta_uploads), (2, 2))
+
+    def test_delta_upload_disabled(self):
+        server = StandInUEP()
+        with patch('katello.packages.delta_upload_enabled', return_value=False) as delta_upload_enabled:
+            self.upload(server, PROFILES)
+
+        delta_upload_enabled.assert_called_with(PACKAGE_PROFILE_PLUGIN_CONF)
+        self.assertEqual((server.full_uploads, server.delta_uploads), (4, 0))
+
+    def test_base_mismatch(self):
+        server = StandInUEP()
+        self.upload(server, PROFILES[:1])
+        server.profiles['1234'] = PROFILES[2]
+
+        self.upload(server, PROFILES[1:])
+
+        self.assertEqual((server.full_uploads, server.delta_uploads), (2, 2))
+
+    def test_delta_rejected(self):
+        server = StandInUEP()
+        self.upload(server, PROFILES[:1])
+
+        with patch.object(server, 'request_put', side_effect=Rejected(400)):
+            with patch('sys.stderr'):
+                self.upload(server, PROFILES[1:2])
+        self.upload(server, PROFILES[2:])
+
+        # the next delta is tried again
+        self.assertEqual((server.full_uploads, server.delta_uploads), (2, 2))
+
+    def test_upload_error(self):
+        server = StandInUEP()
+        self.upload(server, PROFILES[:1])
+
+        with patch.object(server, 'request_put', side_effect=Rejected(503)):
+            with patch('katello.packages.get_uep', return_value=server):
+                self.assertRaises(Rejected, send_package_profile, '1234', PROFILES[1])
+        self.assertEqual(server.profiles['1234'], sort_profile(PROFILES[0]))
+
+    def test_large_change(self):
+        server = StandInUEP()
+        self.upload(server, [PROFILES[0], [package('other')]])
+
+        self.assertEqual((server.full_uploads, server.delta_uploads), (2, 0))
+
+
 class TestPurgePackageCache(TestCase):
     @patch('katello.packages.os')
     @patch('katello.packages.combined_profiles_enabled', return_value = True)
@@ -0,0 +1,89 @@
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+
+sys.path.append(os.path.join(os.path.dirname(__file__), '../../src/'))
+from katello import repofile
+from katello.utils import ConfigParser
+
+DATA_DIR = os.path.join(os.path.dirname(__file__), 'data/repos')
+
+
+class TestEnabledRepos(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory)
+
+    def write(self, content):
+        path = os.path.join(self.directory, 'test.repo')
+        with open(path, 'w') as repo_file:
+            repo_file.write(content)
+        return path
+
+    def config_parser(self, path):
+        config = ConfigParser()
+        config.read(path)
+        return [(section, config.get(section, 'baseurl')) for section in config.sections()
+                if config.getboolean(section, 'enabled')]
+
+    def assertSameAsConfigParser(self, content):
+        path = self.write(content)
+        self.assertEqual(list(repofile.enabled_repos(path)), self.config_parser(path))
+
+    def assertUnsupported(self, content):
+        path = self.write(content)
+        self.assertRaises(repofile.UnsupportedRepoFile, list, repofile.enabled_repos(path))
+
+    def test_data_files(self):
+        for name in ['redhat.repo', 'redhat.repo.suse', 'redhat.repo.with_vars']:
+            path = os.path.join(DATA_DIR, name)
+            self.assertEqual(list(repofile.enabled_repos(path)), self.config_parser(path))
+
+    def test_quirks(self):
+        self.assertSameAsConfigParser(
+            '# comment\n'
+            '; comment\n'
+            '\n'
+            '[one]\n'
+            'Enabled : True\n'
+            'BaseURL=https://one.example.com/$basearch  \n'
+            'name = one = 1\n'
+            '\n'
+            '[two] trailing\n'
+            'baseurl = https://two.example.com\n'
+            '    https://mirror.example.com\n'
+            'enabled=off\n'
+            '[three]\n'
+            'enabled = yes\r\n'
+            'baseurl = https://three.example.com\n'
+            '    https://mirror.example.com\n'
+            'gpgcheck = 1\n')
+
+    def test_empty(self):
+        self.assertSameAsConfigParser('')
+        self.assertSameAsConfigParser('# only a comment\n')
+
+    def test_unsupported(self):
+        for content in ['[DEFAULT]\nenabled = 1\n',
+                        '[one]\nenabled = 1\nbaseurl = a\n[one]\nenabled = 0\n',
+                        '[one]\nenabled = 1\nenabled = 0\nbaseurl = a\n',
+                        'enabled = 1\n',
+                        '[one]\nenabled\n',
+                        '[one]\nenabled = maybe\n',
+                        '[one]\nenabled = 1\n',
+                        '[one]\n  enabled = 1\n',
+                        '[one]\nenabled = 1\nbaseurl = a\n\n  b\n',
+                        '[a]b]\nenabled = 0\n']:
+            self.assertUnsupported(content)
+
+    def test_missing_file(self):
+        self.assertRaises(repofile.UnsupportedRepoFile, list,
+                          repofile.enabled_repos(os.path.join(self.directory, 'missing.repo')))
+
+    def test_lazy(self):
+        path = self.write('[one]\nenabled = 1\nbaseurl = a\n[two]\nenabled = 1\n')
+        repos = repofile.enabled_repos(path)
+        self.assertEqual(next(repos), ('one', 'a'))
+        self.assertRaises(repofile.UnsupportedRepoFile, next, repos)
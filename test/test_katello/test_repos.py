@@ -5,9 +5,11 @@ import sys
 from unittest import TestCase
 
 sys.path.append(os.path.join(os.path.dirname(__file__), '../../src/'))
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
 from katello import repos
+from tempdir_support import TempDirTestCase
 
-from mock import patch
+from mock import ANY, Mock, patch
 
 
 class TestEnabledRepoCache(TestCase):
@@ -46,3 +48,111 @@ class TestEnabledRepoCache(TestCase):
         cache_file = open(self.CACHE_FILE, 'w')
         cache_file.write(data)
         cache_file.close()
+
+
+class TestUploadEnabledReposReport(TempDirTestCase):
+    def setUp(self):
+        TempDirTestCase.setUp(self)
+        self.patch_path('katello.fingerprint.PACKAGE_DB_FINGERPRINT_FILE', '%s.json')
+
+    @patch('katello.repos.plugin_enabled', return_value=True)
+    @patch('katello.repos.lookup_consumer_id', return_value='1234')
+    @patch('katello.repos.EnabledRepoCache.is_valid', return_value=False)
+    @patch('katello.repos.report_enabled_repos')
+    @patch('katello.repos.spool_and_drain')
+    def test_background(self, spool_and_drain, report_enabled_repos, is_valid, lookup, plugin_enabled):
+        report = Mock(content={'enabled_repos': {'repos': []}})
+
+        repos.upload_enabled_repos_report(report, background=True)
+
+        report_enabled_repos.assert_not_called()
+        spool_and_drain.assert_called_with('repos', '1234', report.content, taken=ANY)
+
+    @patch('katello.repos.plugin_enabled', return_value=True)
+    @patch('katello.repos.lookup_consumer_id', return_value='1234')
+    @patch('katello.repos.EnabledRepoCache.is_valid', return_value=True)
+    @patch('katello.repos.spool_and_drain')
+    def test_background_unchanged(self, spool_and_drain, is_valid, lookup, plugin_enabled):
+        repos.upload_enabled_repos_report(Mock(), background=True)
+
+        spool_and_drain.assert_not_called()
+
+    @patch('katello.repos.plugin_enabled', return_value=True)
+    @patch('katello.repos.lookup_consumer_id', return_value='1234')
+    @patch('katello.repos.get_manager')
+    @patch('katello.repos.spool_and_drain')
+    def test_background_combined_profile(self, spool_and_drain, get_manager, lookup, plugin_enabled):
+        repos.upload_enabled_repos_report(None, background=True)
+
+        get_manager.assert_not_called()
+        spool_and_drain.assert_called_with('packages', '1234', taken=ANY)
+
+    @patch('katello.repos.plugin_enabled', return_value=True)
+    @patch('katello.repos.lookup_consumer_id', return_value='1234')
+    @patch('katello.repos.EnabledRepoCache.is_valid', return_value=True)
+    def test_unchanged_package_db(self, is_valid, lookup, plugin_enabled):
+        report = Mock()
+        repos.upload_enabled_repos_report(report)
+        repos.upload_enabled_repos_report(report)
+
+        self.assertEqual(lookup.call_count, 1)
+        repos.upload_enabled_repos_report(report, force=True)
+        self.assertEqual(lookup.call_count, 2)
+
+
+@patch('katello.repos.plugin_enabled', return_value=True)
+@patch('katello.repos.lookup_consumer_id', return_value='1234')
+@patch('katello.repos.report_enabled_repos', return_value=True)
+class TestReportFingerprint(TempDirTestCase):
+    def setUp(self):
+        TempDirTestCase.setUp(self)
+        self.repo_file = os.path.join(self.directory, 'redhat.repo')
+        self.write_repo_file('https://enabled_repo.com')
+        self.patch_path('katello.repos.ENABLED_REPOS_CACHE_FILE', 'enabled_repos.json')
+        self.patch_path('katello.repos.ENABLED_REPOS_FINGERPRINT_FILE', 'fingerprint.json')
+        self.patch_path('katello.fingerprint.PACKAGE_DB_FINGERPRINT_FILE', '%s.json')
+        self.start_patch('katello.enabled_report.yum_variables', Mock(return_value={'releasever': '8'}))
+        # the package db changes between the uploads
+        self.start_patch('katello.fingerprint.unchanged', Mock(return_value=False))
+
+    def write_repo_file(self, baseurl):
+        with open(self.repo_file, 'w') as repo_file:
+            repo_file.write('[enabled]\nenabled = 1\nbaseurl = %s\n' % baseurl)
+
+    def upload(self):
+        report = repos.EnabledReport(self.repo_file)
+        repos.upload_enabled_repos_report(report)
+        return report
+
+    def test_unchanged_files_are_not_parsed(self, report_enabled_repos, lookup, plugin_enabled):
+        self.upload()
+        with patch('katello.enabled_report.repofile.enabled_repos') as enabled_repos:
+            report = self.upload()
+            enabled_repos.assert_not_called()
+
+        self.assertEqual(report._content, None)
+        self.assertEqual(report_enabled_repos.call_count, 1)
+
+    def test_changed_file(self, report_enabled_repos, lookup, plugin_enabled):
+        self.upload()
+        os.remove(self.repo_file)
+        self.write_repo_file('https://other_repo.com')
+        self.upload()
+
+        self.assertEqual(report_enabled_repos.call_args[0][1]['enabled_repos']['repos'][0]['baseurl'],
+                         ['https://other_repo.com'])
+
+    def test_failed_upload(self, report_enabled_repos, lookup, plugin_enabled):
+        report_enabled_repos.return_value = None
+        self.upload()
+        self.upload()
+
+        self.assertEqual(report_enabled_repos.call_count, 2)
+
+    def test_removed_cache(self, report_enabled_repos, lookup, plugin_enabled):
+        self.upload()
+        with patch('katello.repos.combined_profiles_enabled', return_value=False):
+            repos.EnabledRepoCache.remove_cache()
+        self.upload()
+
+        self.assertEqual(report_enabled_repos.call_count, 2)
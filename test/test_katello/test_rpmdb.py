@@ -0,0 +1,100 @@
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+
+sys.path.append(os.path.join(os.path.dirname(__file__), '../../src/'))
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+from katello import rpmdb
+from rpmdb_support import header_blob, package_tags, write_rpmdb
+
+from mock import patch
+
+PACKAGES = [
+    {'name': 'bash', 'version': '5.1.8', 'release': '6.el9', 'files': 10},
+    {'name': 'kernel', 'version': '5.14.0', 'release': '70.el9', 'epoch': 1},
+    {'name': 'tzdata', 'version': '2023c', 'release': '1.el9', 'arch': 'noarch', 'vendor': 'Red Hat, Inc.'},
+]
+
+
+def profile_entry(name, version, release, epoch=0, arch='x86_64', vendor='Acme', files=0):
+    return {'name': name, 'version': version, 'release': release, 'epoch': epoch, 'arch': arch, 'vendor': vendor}
+
+
+class RpmdbTestCase(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory)
+        self.path = os.path.join(self.directory, 'rpmdb.sqlite')
+
+
+class TestReadHeader(unittest.TestCase):
+    def test_profile_tags(self):
+        header = rpmdb.read_header(header_blob(package_tags(**PACKAGES[1])))
+
+        self.assertEqual(header, {'name': 'kernel', 'version': '5.14.0', 'release': '70.el9', 'epoch': 1,
+                                  'arch': 'x86_64', 'vendor': 'Acme'})
+
+    def test_other_tags(self):
+        header = rpmdb.read_header(header_blob(package_tags('bash', files=3)), {1004: 'summary', 1117: 'basenames'})
+
+        self.assertEqual(header, {'summary': 'The bash package', 'basenames': 'bash-file-0'})
+
+    def test_not_utf8(self):
+        header = rpmdb.read_header(header_blob(package_tags('bash', vendor=u'Soci\xe9t\xe9'.encode('latin-1'))))
+
+        self.assertEqual(header['name'], 'bash')
+        if sys.version_info[0] == 3:
+            self.assertEqual(header['vendor'], u'Soci\ufffdt\ufffd')
+
+    def test_malformed_header(self):
+        blob = header_blob(package_tags('bash'))
+
+        self.assertRaises(rpmdb.UnsupportedRpmdb, rpmdb.read_header, blob[:len(blob) // 2])
+
+
+class TestInstalledPackages(RpmdbTestCase):
+    def test_all_packages(self):
+        write_rpmdb(self.path, PACKAGES)
+
+        packages = rpmdb.installed_packages(path=self.path)
+
+        self.assertEqual(packages, [profile_entry(**package) for package in PACKAGES])
+
+    def test_packages_by_name(self):
+        write_rpmdb(self.path, PACKAGES)
+
+        packages = rpmdb.installed_packages(['tzdata', 'missing'], path=self.path)
+
+        self.assertEqual(packages, [profile_entry(**PACKAGES[2])])
+        self.assertEqual(rpmdb.installed_packages([], path=self.path), [])
+
+    def test_not_an_rpmdb(self):
+        with open(self.path, 'w') as rpmdb_file:
+            rpmdb_file.write('not a database')
+
+        self.assertRaises(rpmdb.UnsupportedRpmdb, rpmdb.installed_packages, path=self.path)
+
+    def test_read_only(self):
+        self.assertRaises(rpmdb.UnsupportedRpmdb, rpmdb.installed_packages, path=self.path)
+        self.assertFalse(os.path.exists(self.path))
+
+
+class TestSqlitePath(RpmdbTestCase):
+    def test_sqlite_rpmdb(self):
+        write_rpmdb(self.path, [])
+        missing = os.path.join(self.directory, 'missing', 'rpmdb.sqlite')
+
+        self.assertEqual(rpmdb.sqlite_path([missing, self.path]), self.path)
+
+    def test_legacy_rpmdb(self):
+        write_rpmdb(self.path, [])
+        open(os.path.join(self.directory, 'Packages'), 'w').close()
+
+        self.assertEqual(rpmdb.sqlite_path([self.path]), None)
+
+    def test_no_rpmdb(self):
+        with patch('katello.rpmdb.RPMDB_SQLITE_PATHS', [self.path]):
+            self.assertEqual(rpmdb.sqlite_path(), None)
+            self.assertRaises(rpmdb.UnsupportedRpmdb, rpmdb.installed_packages)
@@ -0,0 +1,154 @@
+import os
+import sys
+import threading
+import unittest
+
+sys.path.append(os.path.join(os.path.dirname(__file__), '../../src/'))
+from katello import scripts
+from katello.enabled_report import EnabledReport
+
+from mock import Mock, PropertyMock, patch
+
+try:
+    from StringIO import StringIO
+except ImportError:
+    from io import StringIO
+
+
+@patch('katello.scripts.upload_enabled_repos_report')
+@patch('katello.scripts.upload_package_profile')
+@patch('katello.scripts.enabled_repos_report')
+@patch('katello.scripts.collect_traces')
+class TestSyncReports(unittest.TestCase):
+    def setUp(self):
+        self.output = StringIO()
+
+    @patch('katello.tracer.upload_tracer_profile')
+    def test_all(self, upload_tracer, collect_traces, report, upload_packages, upload_repos):
+        apps = [Mock()]
+        collect_traces.return_value = apps
+
+        failed = scripts.sync_reports(set(scripts.SYNC_REPORTS), set(), self.output)
+
+        self.assertEqual(failed, [])
+        upload_packages.assert_called_once_with(False)
+        upload_repos.assert_called_once_with(report.return_value, False)
+        self.assertEqual(upload_tracer.call_args[0][0](None), apps)
+        self.assertEqual([line.split()[0] for line in self.output.getvalue().splitlines()],
+                         ['packages', 'repos', 'tracer'])
+
+    @patch('katello.scripts.EnabledRepoCache.remove_cache')
+    def test_only_forced(self, remove_cache, collect_traces, report, upload_packages, upload_repos):
+        scripts.sync_reports(set(['repos']), set(['repos']), self.output)
+
+        collect_traces.assert_not_called()
+        upload_packages.assert_not_called()
+        remove_cache.assert_called_once_with()
+        upload_repos.assert_called_once_with(report.return_value, True)
+
+    def test_combined_profile(self, collect_traces, report, upload_packages, upload_repos):
+        report.return_value = None
+
+        scripts.sync_reports(set(['packages', 'repos']), set(), self.output)
+
+        upload_packages.assert_called_once_with(False)
+        upload_repos.assert_not_called()
+
+    def test_failed_collector(self, collect_traces, report, upload_packages, upload_repos):
+        report.side_effect = IOError('Neither yum nor zypper can be used')
+
+        failed = scripts.sync_reports(set(['packages', 'repos']), set(), self.output)
+
+        self.assertEqual(failed, ['repos'])
+        upload_packages.assert_called_once_with(False)
+        self.assertIn('Neither yum nor zypper', self.output.getvalue())
+
+
+    @patch('katello.scripts.lookup_consumer_id', return_value='1234')
+    @patch('katello.scripts.fingerprint_matches', return_value=False)
+    def test_repos_parsed_by_collector(self, fingerprint_matches, lookup, collect_traces, report, upload_packages,
+                                       upload_repos):
+        threads = []
+        report.return_value = Mock(spec=EnabledReport)
+        type(report.return_value).content = PropertyMock(
+            side_effect=lambda: threads.append(threading.current_thread()))
+
+        scripts.sync_reports(set(['repos']), set(), self.output)
+
+        report.return_value.fingerprint.assert_called_once_with('1234')
+        self.assertEqual(len(threads), 1)
+        self.assertNotEqual(threads[0], threading.current_thread())
+        upload_repos.assert_called_once_with(report.return_value, False)
+
+    @patch('katello.scripts.lookup_consumer_id', return_value='1234')
+    @patch('katello.scripts.fingerprint_matches', return_value=True)
+    def test_repos_unchanged(self, fingerprint_matches, lookup, collect_traces, report, upload_packages,
+                             upload_repos):
+        report.return_value = Mock(spec=EnabledReport)
+        content = PropertyMock()
+        type(report.return_value).content = content
+
+        scripts.sync_reports(set(['repos']), set(), self.output)
+
+        content.assert_not_called()
+        upload_repos.assert_called_once_with(report.return_value, False)
+
+
+class TestParseReports(unittest.TestCase):
+    def test_names(self):
+        parser = Mock()
+        self.assertEqual(scripts.parse_reports(parser, ['repos,tracer', 'packages']),
+                         set(['packages', 'repos', 'tracer']))
+        self.assertEqual(scripts.parse_reports(parser, ['all']), set(scripts.SYNC_REPORTS))
+        self.assertEqual(scripts.parse_reports(parser, None), set())
+
+    def test_unknown(self):
+        parser = Mock()
+        scripts.parse_reports(parser, ['errata'])
+        parser.error.assert_called_once_with('unknown report: errata')
+
+
+class TestSplay(unittest.TestCase):
+    def test_delay(self):
+        delay = scripts.splay_delay('e6a7b8c9-0d1e-4f2a-8b3c-4d5e6f708192', 300)
+
+        self.assertTrue(0 <= delay < 300)
+        self.assertEqual(scripts.splay_delay('e6a7b8c9-0d1e-4f2a-8b3c-4d5e6f708192', 300), delay)
+
+    def test_spread(self):
+        delays = [scripts.splay_delay('consumer-%d' % index, 100) for index in range(1000)]
+
+        # about 100 hosts within each tenth of the splay
+        for tenth in range(10):
+            self.assertTrue(50 < len([delay for delay in delays if tenth * 10 <= delay < tenth * 10 + 10]) < 150)
+
+    def test_no_delay(self):
+        self.assertEqual(scripts.splay_delay(None, 300), 0)
+        self.assertEqual(scripts.splay_delay('1234', 0), 0)
+
+    @patch('katello.scripts.lookup_consumer_id', return_value='1234')
+    def test_splay(self, lookup_consumer_id):
+        sleep = Mock()
+
+        scripts.splay(300, sleep)
+
+        sleep.assert_called_once_with(scripts.splay_delay('1234', 300))
+
+    @patch('katello.scripts.lookup_consumer_id')
+    def test_no_splay(self, lookup_consumer_id):
+        sleep = Mock()
+
+        scripts.splay(0, sleep)
+
+        lookup_consumer_id.assert_not_called()
+        sleep.assert_not_called()
+
+    @patch('katello.scripts.upload_package_profile')
+    @patch('katello.scripts.agent.trigger', return_value=False)
+    @patch('katello.scripts.splay')
+    def test_option(self, splay, trigger, upload_package_profile):
+        with patch.object(sys, 'argv', ['katello-package-upload', '--splay', '120']):
+            scripts.package_upload()
+
+        splay.assert_called_once_with(120)
+        upload_package_profile.assert_called_once_with(None)
@@ -0,0 +1,223 @@
+import fcntl
+import json
+import os
+import sys
+import unittest
+
+sys.path.append(os.path.join(os.path.dirname(__file__), '../../src/'))
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+from katello import spool
+from katello.agent import PACKAGES, REPOS, TRACER
+from tempdir_support import TempDirTestCase
+
+from mock import Mock, patch
+
+
+class SpoolTestCase(TempDirTestCase):
+    def setUp(self):
+        TempDirTestCase.setUp(self)
+        self.sent = []
+
+    def sender(self, consumer_id, report):
+        self.sent.append((consumer_id, report))
+        return True
+
+    def read(self, kind, consumer_id):
+        with open(spool.report_path(kind, consumer_id, self.directory)) as spool_file:
+            return json.loads(spool_file.read())
+
+    def files(self):
+        return sorted(os.listdir(self.directory))
+
+
+class TestSpool(SpoolTestCase):
+    def test_newest_report_wins(self):
+        spool.spool(TRACER, '1234', {'sshd': 1}, self.directory)
+        spool.spool(TRACER, '1234', {'crond': 1}, self.directory)
+        spool.spool(TRACER, '5678', {'sshd': 1}, self.directory)
+        spool.spool(PACKAGES, '1234', directory=self.directory)
+
+        self.assertEqual(self.files(), ['packages-1234.json', 'tracer-1234.json', 'tracer-5678.json'])
+        self.assertEqual(self.read(TRACER, '1234'), {'kind': TRACER, 'consumer_id': '1234', 'report': {'crond': 1},
+                                                     'window': 0, 'fingerprint': None})
+
+    def test_creates_directory(self):
+        directory = os.path.join(self.directory, 'spool')
+        spool.spool(REPOS, '1234', {}, directory)
+        self.assertEqual(os.listdir(directory), ['repos-1234.json'])
+
+    @patch('katello.spool.subprocess.Popen')
+    def test_start_drainer(self, popen):
+        log_file = os.path.join(self.directory, 'drainer.log')
+        spool.start_drainer(self.directory, log_file)
+        self.assertEqual(popen.call_args[0][0], [sys.executable, '-m', 'katello.spool', self.directory])
+        self.assertEqual(popen.call_args[1]['stderr'].name, log_file)
+        self.assertEqual(popen.call_args[1]['stdout'].name, log_file)
+
+    def test_unwritable_drainer_log(self):
+        log = spool.open_drainer_log(os.path.join(self.directory, 'missing', 'drainer.log'))
+        self.assertEqual(log.name, os.devnull)
+        log.close()
+
+
+class TestDrain(SpoolTestCase):
+    def test_drain(self):
+        spool.spool(TRACER, '1234', {'sshd': 1}, self.directory)
+        spool.spool(REPOS, '1234', {'repos': []}, self.directory)
+
+        sent = spool.drain(self.directory, {TRACER: self.sender, REPOS: self.sender})
+
+        self.assertEqual(sent, 2)
+        self.assertEqual(self.sent, [('1234', {'repos': []}), ('1234', {'sshd': 1})])
+        self.assertEqual(self.files(), [spool.LOCK_FILE])
+
+    def test_failed_upload_is_kept(self):
+        spool.spool(TRACER, '1234', {'sshd': 1}, self.directory)
+        sender = Mock(side_effect=IOError)
+
+        self.assertEqual(spool.drain(self.directory, {TRACER: sender}), 0)
+
+        sender.assert_called_once_with('1234', {'sshd': 1})
+        self.assertEqual(self.read(TRACER, '1234')['report'], {'sshd': 1})
+
+    def test_newer_report_replaces_failed_one(self):
+        spool.spool(TRACER, '1234', {'sshd': 1}, self.directory)
+
+        def sender(consumer_id, report):
+            self.sent.append(report)
+            if len(self.sent) == 1:
+                spool.spool(TRACER, '1234', {'crond': 1}, self.directory)
+                return False
+            return True
+
+        self.assertEqual(spool.drain(self.directory, {TRACER: sender}), 1)
+        self.assertEqual(self.sent, [{'sshd': 1}, {'crond': 1}])
+        self.assertEqual(self.files(), [spool.LOCK_FILE])
+
+    @patch('katello.spool.fingerprint.record')
+    def test_records_fingerprint(self, record):
+        spool.spool(TRACER, '1234', {'sshd': 1}, self.directory, taken=[['/var/lib/dpkg/status', 1, 2, 3]])
+        spool.spool(REPOS, '1234', {'repos': []}, self.directory, taken=[['/var/lib/dpkg/status', 1, 2, 3]])
+
+        spool.drain(self.directory, {TRACER: self.sender, REPOS: Mock(return_value=False)})
+
+        record.assert_called_once_with(TRACER, [['/var/lib/dpkg/status', 1, 2, 3]])
+
+    def test_malformed_report_is_dropped(self):
+        with open(spool.report_path(TRACER, '1234', self.directory), 'w') as spool_file:
+            spool_file.write('{')
+
+        self.assertEqual(spool.drain(self.directory, {TRACER: self.sender}), 0)
+        self.assertEqual(self.files(), [spool.LOCK_FILE])
+
+    def test_restores_claimed_report(self):
+        spool.spool(TRACER, '1234', {'sshd': 1}, self.directory)
+        path = spool.report_path(TRACER, '1234', self.directory)
+        os.rename(path, path + spool.CLAIMED_SUFFIX)
+
+        self.assertEqual(spool.drain(self.directory, {TRACER: self.sender}), 1)
+        self.assertEqual(self.sent, [('1234', {'sshd': 1})])
+
+    def test_running_drainer(self):
+        spool.spool(TRACER, '1234', {'sshd': 1}, self.directory)
+        lock_file = open(os.path.join(self.directory, spool.LOCK_FILE), 'a')
+        self.addCleanup(lock_file.close)
+        fcntl.flock(lock_file, fcntl.LOCK_EX)
+
+        self.assertEqual(spool.drain(self.directory, {TRACER: self.sender}), 0)
+        self.assertEqual(self.sent, [])
+
+    def test_debounce(self):
+        spool.spool(TRACER, '1234', {'sshd': 1}, self.directory, window=30)
+        spool.spool(REPOS, '1234', {'repos': []}, self.directory)
+        path = spool.report_path(TRACER, '1234', self.directory)
+
+        def sleep(seconds):
+            self.assertTrue(29 < seconds <= 30)
+            self.assertEqual(self.sent, [('1234', {'repos': []})])
+            # a newer report arrives, the window passes
+            spool.spool(TRACER, '1234', {'crond': 1}, self.directory, window=30)
+            os.utime(path, (0, 0))
+
+        with patch('katello.spool.time.sleep', side_effect=sleep) as mock_sleep:
+            sent = spool.drain(self.directory, {TRACER: self.sender, REPOS: self.sender})
+
+        self.assertEqual(mock_sleep.call_count, 1)
+        self.assertEqual(sent, 2)
+        self.assertEqual(self.sent, [('1234', {'repos': []}), ('1234', {'crond': 1})])
+
+    @patch('katello.spool.start_drainer')
+    @patch('katello.spool.trigger_window', return_value=30)
+    def test_spool_and_drain(self, trigger_window, start_drainer):
+        spool.spool_and_drain(TRACER, '1234', {'sshd': 1}, self.directory)
+
+        trigger_window.assert_called_with(TRACER)
+        self.assertEqual(self.read(TRACER, '1234')['window'], 30)
+        start_drainer.assert_called_with(self.directory)
+
+    def test_missing_directory(self):
+        self.assertEqual(spool.drain(os.path.join(self.directory, 'missing')), 0)
+
+
+class TestPending(SpoolTestCase):
+    def test_is_pending(self):
+        self.assertFalse(spool.is_pending(TRACER, '1234', self.directory))
+        spool.spool(TRACER, '1234', {'sshd': 1}, self.directory)
+        self.assertTrue(spool.is_pending(TRACER, '1234', self.directory))
+        path = spool.report_path(TRACER, '1234', self.directory)
+        os.rename(path, path + spool.CLAIMED_SUFFIX)
+        self.assertTrue(spool.is_pending(TRACER, '1234', self.directory))
+        self.assertFalse(spool.is_pending(TRACER, '5678', self.directory))
+
+    @patch('katello.spool.start_drainer')
+    def test_drain_pending(self, start_drainer):
+        spool.drain_pending(self.directory)
+        start_drainer.assert_not_called()
+
+        spool.spool(TRACER, '1234', {'sshd': 1}, self.directory)
+        spool.drain_pending(self.directory)
+        start_drainer.assert_called_once_with(self.directory)
+
+
+class TestSendTracer(unittest.TestCase):
+    REPORT = {'traces': {'sshd': {'helper': 'systemctl restart sshd', 'type': 'daemon'}}, 'full_scan': 42}
+
+    @patch('katello.agent.upload_threshold', return_value=0)
+    @patch('katello.tracer.TracerCache')
+    @patch('katello.uep.get_uep')
+    def test_cached_once_uploaded(self, get_uep, tracer_cache, upload_threshold):
+        get_uep().sanitize.return_value = '1234'
+
+        self.assertTrue(spool.send_tracer('1234', self.REPORT))
+
+        get_uep().conn.request_put.assert_called_with('/consumers/1234/tracer', {'traces': self.REPORT['traces']})
+        tracer_cache.assert_called_with('1234')
+        tracer_cache().save.assert_called_with(self.REPORT['traces'], 42)
+
+    @patch('katello.agent.upload_threshold', return_value=0)
+    @patch('katello.tracer.TracerCache')
+    @patch('katello.uep.get_uep')
+    def test_not_cached_when_failed(self, get_uep, tracer_cache, upload_threshold):
+        get_uep().conn.request_put.side_effect = Exception('Service Unavailable')
+
+        self.assertRaises(Exception, spool.send_tracer, '1234', self.REPORT)
+
+        tracer_cache().save.assert_not_called()
+
+
+class TestSendPackages(unittest.TestCase):
+    @patch('katello.packages.send_package_profile')
+    @patch('katello.packages.update_package_profile')
+    def test_full_profile(self, update_package_profile, send_package_profile):
+        self.assertTrue(spool.send_packages('1234', None))
+
+        update_package_profile.assert_called_with('1234')
+        send_package_profile.assert_not_called()
+
+    @patch('katello.packages.send_package_profile')
+    @patch('katello.packages.update_package_profile')
+    def test_incremental_profile(self, update_package_profile, send_package_profile):
+        self.assertTrue(spool.send_packages('1234', {'packages': [{'name': 'foo'}]}))
+
+        send_package_profile.assert_called_with('1234', [{'name': 'foo'}])
+        update_package_profile.assert_not_called()
@@ -0,0 +1,104 @@
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+
+sys.path.append(os.path.join(os.path.dirname(__file__), '../../../src/'))
+from katello.tracer.cgroup import CgroupResolver, unit_from_cgroup
+
+from mock import patch, Mock
+
+UNIFIED = ["0::/system.slice/sshd.service\n"]
+HYBRID = [
+    "12:memory:/system.slice/crond.service\n",
+    "1:name=systemd:/system.slice/crond.service\n",
+    "0::/system.slice/crond.service\n",
+]
+
+
+class TestUnitFromCgroup(unittest.TestCase):
+    def test_unified(self):
+        self.assertEqual(unit_from_cgroup(UNIFIED), 'sshd.service')
+
+    def test_hybrid(self):
+        self.assertEqual(unit_from_cgroup(HYBRID), 'crond.service')
+
+    def test_session_scope(self):
+        lines = ["0::/user.slice/user-1000.slice/session-3.scope\n"]
+        self.assertEqual(unit_from_cgroup(lines), 'session-3.scope')
+
+    def test_nested_user_service(self):
+        lines = ["0::/user.slice/user-1000.slice/user@1000.service/app.slice/foo.service\n"]
+        self.assertEqual(unit_from_cgroup(lines), 'user@1000.service')
+
+    def test_delegated_subtree(self):
+        lines = ["0::/system.slice/containerd.service/kubepods/pod1\n"]
+        self.assertEqual(unit_from_cgroup(lines), 'containerd.service')
+
+    def test_ambiguous(self):
+        self.assertEqual(unit_from_cgroup(["0::/\n"]), None)
+        self.assertEqual(unit_from_cgroup(["0::/user.slice\n"]), None)
+        self.assertEqual(unit_from_cgroup(["5:cpu:/foo\n"]), None)
+        self.assertEqual(unit_from_cgroup([]), None)
+
+
+class TestCgroupResolver(unittest.TestCase):
+    def setUp(self):
+        self.proc = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.proc)
+        patcher = patch('katello.tracer.cgroup.PROC_CGROUP', os.path.join(self.proc, '%d'))
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+        self.bus = Mock()
+        self.factory = Mock(return_value=self.bus)
+        self.resolver = CgroupResolver(self.factory)
+
+    def write_cgroup(self, pid, lines):
+        with open(os.path.join(self.proc, str(pid)), 'w') as cgroup_file:
+            cgroup_file.writelines(lines)
+
+    def test_service_without_dbus_per_pid(self):
+        self.bus.has_service_property_from_name.return_value = False
+        for pid in range(1, 20):
+            self.write_cgroup(pid, UNIFIED)
+            self.assertEqual(self.resolver.unit_path_from_pid(pid), 'sshd.service')
+            self.assertEqual(self.resolver.get_unit_property_from_pid(pid, 'Id'), 'sshd.service')
+            self.assertFalse(self.resolver.has_service_property_from_pid(pid, 'PAMName'))
+
+        self.bus.unit_path_from_pid.assert_not_called()
+        self.bus.get_unit_property_from_pid.assert_not_called()
+        self.factory.assert_called_once_with()
+
+    def test_scope_is_not_a_service(self):
+        self.write_cgroup(1, ["0::/user.slice/user-1000.slice/session-3.scope\n"])
+
+        self.assertFalse(self.resolver.has_service_property_from_pid(1, 'PAMName'))
+        self.bus.has_service_property_from_name.assert_not_called()
+
+    def test_ambiguous_falls_back(self):
+        self.write_cgroup(1, ["0::/\n"])
+        self.bus.unit_path_from_pid.return_value = '/org/freedesktop/systemd1/unit/foo'
+        self.bus.get_unit_property_from_pid.return_value = 'foo.service'
+
+        self.assertEqual(self.resolver.unit_path_from_pid(1), '/org/freedesktop/systemd1/unit/foo')
+        self.assertEqual(self.resolver.get_unit_property_from_pid(1, 'Id'), 'foo.service')
+
+    def test_unreadable_cgroup_falls_back(self):
+        self.bus.unit_path_from_pid.return_value = False
+
+        self.assertFalse(self.resolver.unit_path_from_pid(99))
+        self.bus.unit_path_from_pid.assert_called_with(99)
+
+    def test_bus_unavailable(self):
+        self.factory.side_effect = Exception('bus is restarting')
+        self.write_cgroup(1, UNIFIED)
+        self.write_cgroup(2, ["0::/user.slice/user-1000.slice/user@1000.service/init.scope\n"])
+        self.write_cgroup(3, ["0::/\n"])
+
+        self.assertEqual(self.resolver.get_unit_property_from_pid(1, 'Id'), 'sshd.service')
+        self.assertFalse(self.resolver.has_service_property_from_pid(1, 'PAMName'))
+        self.assertTrue(self.resolver.has_service_property_from_pid(2, 'PAMName'))
+        self.assertFalse(self.resolver.unit_path_from_pid(3))
+        self.factory.assert_called_once_with()
@@ -0,0 +1,99 @@
+import os
+import sys
+import unittest
+
+sys.path.append(os.path.join(os.path.dirname(__file__), '../../../src/'))
+try:
+    import psutil
+    from katello.tracer import dnf as dnf_tracer
+except ImportError:
+    pass
+
+from mock import patch, Mock
+
+
+class FakeProcess(object):
+    def __init__(self, bus, pid, table=None):
+        pid = int(pid)
+        if pid == 666:
+            raise psutil.NoSuchProcess(pid)
+        self.pid = pid
+        self.name = {1: 'systemd', 10: 'sshd', 11: 'sshd', 20: 'sudo'}.get(pid, 'bash')
+
+    def is_session(self):
+        return self.name == 'bash'
+
+    def is_reboot_required(self):
+        return self.name == 'systemd'
+
+
+@unittest.skipIf('katello.tracer.dnf' not in sys.modules, "DNF not present")
+@patch('katello.tracer.dnf.SystemdDbus', Mock())
+@patch('katello.tracer.dnf.Process', FakeProcess)
+class TestCollectServicesState(unittest.TestCase):
+    def test_deduplicated_in_pid_order(self):
+        apps = dnf_tracer.collect_services_state([10, 1, 11, 20, 666, 30])
+
+        self.assertEqual([app.name for app in apps], ['sshd', 'systemd', 'bash'])
+        self.assertEqual([app.type for app in apps], ['daemon', 'static', 'session'])
+        self.assertEqual(apps[0].helper, 'systemctl restart sshd')
+
+    @patch('katello.tracer.dnf.reboot_required', return_value=True)
+    @patch('katello.tracer.dnf.needs_restarting_pids', return_value=['10'])
+    def test_collect_apps(self, pids, reboot):
+        apps = dnf_tracer.collect_apps()
+
+        self.assertEqual([app.name for app in apps], ['sshd', 'kernel'])
+        pids.assert_called_once_with()
+        reboot.assert_called_once_with()
+
+
+def psutil_process(snapshots):
+    def process(pid):
+        proc = Mock()
+        proc.as_dict.return_value = dict(snapshots[pid])
+        proc.terminal.return_value = snapshots[pid]['terminal']
+        return proc
+    return Mock(side_effect=process)
+
+
+SNAPSHOTS = {
+    100: {'name': 'sshd', 'exe': '/usr/sbin/sshd', 'cmdline': ['sshd:', 'root@pts/0'], 'terminal': None, 'ppid': 1},
+    200: {'name': 'vim', 'exe': '/usr/bin/vim', 'cmdline': ['vim'], 'terminal': '/dev/pts/0', 'ppid': 300},
+    201: {'name': 'less', 'exe': '/usr/bin/less', 'cmdline': ['less'], 'terminal': '/dev/pts/0', 'ppid': 300},
+    300: {'name': 'bash', 'exe': '/usr/bin/bash', 'cmdline': ['bash'], 'terminal': '/dev/pts/1', 'ppid': 100},
+}
+
+
+@unittest.skipIf('katello.tracer.dnf' not in sys.modules, "DNF not present")
+class TestProcess(unittest.TestCase):
+    def setUp(self):
+        self.bus = Mock()
+        self.bus.unit_path_from_pid.return_value = False
+
+    @patch('katello.tracer.dnf.psutil.Process')
+    def test_ssh_session(self, process):
+        process.side_effect = psutil_process(SNAPSHOTS).side_effect
+        p = dnf_tracer.Process(self.bus, 100)
+
+        self.assertEqual(p.name, 'ssh-root-session')
+        self.assertTrue(p.is_session())
+
+    @patch('katello.tracer.dnf.psutil.Process')
+    def test_parent_terminal_read_once(self, process):
+        process.side_effect = psutil_process(SNAPSHOTS).side_effect
+        table = dnf_tracer.ProcessTable()
+
+        self.assertTrue(dnf_tracer.Process(self.bus, 200, table).is_session())
+        self.assertTrue(dnf_tracer.Process(self.bus, 201, table).is_session())
+        self.assertEqual([call[0][0] for call in process.call_args_list], [200, 300, 201])
+
+    @patch('katello.tracer.dnf.psutil.Process')
+    def test_snapshot_read_once(self, process):
+        process.side_effect = psutil_process(SNAPSHOTS).side_effect
+        table = dnf_tracer.ProcessTable()
+        table.snapshot(300)
+        table.snapshot(300)
+
+        self.assertEqual(table.terminal(300), '/dev/pts/1')
+        self.assertEqual(process.call_count, 1)
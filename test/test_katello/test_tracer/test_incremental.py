@@ -0,0 +1,55 @@
+import os
+import sys
+import unittest
+
+sys.path.append(os.path.join(os.path.dirname(__file__), '../../../src/'))
+from katello.tracer.incremental import Transaction, package_files, query_transaction_apps
+
+from mock import patch, Mock
+
+RPM_QL = """/usr/lib64/libfoo.so.1
+/usr/share/doc/libfoo
+package libbar is not installed
+"""
+
+
+class TestTransaction(unittest.TestCase):
+    def test_needs_full_scan(self):
+        self.assertTrue(Transaction(['vim', 'kernel-core'], []).needs_full_scan())
+        self.assertFalse(Transaction(['vim'], []).needs_full_scan())
+
+
+class TestPackageFiles(unittest.TestCase):
+    @patch('katello.tracer.incremental.subprocess.Popen')
+    def test_package_files(self, popen):
+        popen.return_value.communicate.return_value = (RPM_QL, '')
+
+        files = package_files(['libfoo', 'libbar'])
+
+        self.assertEqual(files, set(['/usr/lib64/libfoo.so.1', '/usr/share/doc/libfoo']))
+        self.assertEqual(popen.call_args[0][0], ['rpm', '-ql', '--', 'libbar', 'libfoo'])
+
+    @patch('katello.tracer.incremental.subprocess.Popen')
+    def test_no_packages(self, popen):
+        self.assertEqual(package_files([]), set())
+        popen.assert_not_called()
+
+
+class TestQueryTransactionApps(unittest.TestCase):
+    @patch('katello.tracer.incremental.scanner.deleted_files')
+    @patch('katello.tracer.incremental.scanner.scan')
+    def test_only_changed_files(self, scan, deleted_files):
+        deleted_files.side_effect = lambda pid: set(['/usr/lib64/libfoo.so.1', '/usr/lib64/libc.so.6'])
+        scan.side_effect = lambda check: dict((pid, check(pid)) for pid in (20, 10))
+        apps_for_pids = Mock(return_value=['app'])
+        transaction = Transaction(['libfoo'], ['/usr/lib64/libfoo.so.1'])
+
+        self.assertEqual(query_transaction_apps(transaction, apps_for_pids)(), ['app'])
+        apps_for_pids.assert_called_with([10, 20])
+
+    @patch('katello.tracer.incremental.scanner.scan')
+    def test_no_files(self, scan):
+        apps_for_pids = Mock()
+
+        self.assertEqual(query_transaction_apps(Transaction(['foo'], []), apps_for_pids)(), [])
+        scan.assert_not_called()
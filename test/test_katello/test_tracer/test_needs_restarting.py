@@ -0,0 +1,111 @@
+import os
+import shutil
+import sys
+import tempfile
+import threading
+import unittest
+
+sys.path.append(os.path.join(os.path.dirname(__file__), '../../../src/'))
+from katello.tracer import scanner
+from katello.tracer.needs_restarting import NeedsRestarting, process_start
+
+from mock import patch, Mock
+
+BTIME = 1700000000
+MAPS = """\
+55d0c4a00000-55d0c4a2c000 r--p 00000000 fd:00 1181 /usr/sbin/sshd
+7f1b2c000000-7f1b2c021000 rw-p 00000000 00:00 0
+7f1b2c600000-7f1b2c628000 r--p 00000000 fd:00 4421 /usr/lib64/libc.so.6 (deleted)
+7f1b2c800000-7f1b2c801000 r--p 00000000 00:05 1024 /dev/zero (deleted)
+7ffd4a1f1000-7ffd4a212000 rw-p 00000000 00:00 0 [stack]
+"""
+
+
+def stat_line(pid, comm, starttime):
+    fields = ['S'] + ['0'] * 18 + [str(starttime)] + ['0'] * 30
+    return '%d (%s) %s\n' % (pid, comm, ' '.join(fields))
+
+
+class FakePackage(object):
+    def __init__(self, name, installtime):
+        self.name = name
+        self.installtime = installtime
+
+
+class FakeQuery(object):
+    def __init__(self, files):
+        self.files = files
+        self.file_lookups = 0
+        self.threads = set()
+
+    def installed(self):
+        return self
+
+    def filter(self, file=None, name=None):
+        if file is not None:
+            self.file_lookups += 1
+            self.threads.add(threading.current_thread())
+            return [package for path, package in self.files.items() if path == file]
+        return [package for package in self.files.values() if package.name in name]
+
+
+class TestNeedsRestarting(unittest.TestCase):
+    def setUp(self):
+        self.proc = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.proc)
+        patcher = patch.object(scanner, 'PROC', self.proc)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+        with open(os.path.join(self.proc, 'stat'), 'w') as stat_file:
+            stat_file.write('cpu  1 2 3\nbtime %d\nprocesses 42\n' % BTIME)
+
+    def add_process(self, pid, starttime, maps=MAPS, comm='sshd'):
+        directory = os.path.join(self.proc, str(pid))
+        os.mkdir(directory)
+        with open(os.path.join(directory, 'stat'), 'w') as stat_file:
+            stat_file.write(stat_line(pid, comm, starttime))
+        with open(os.path.join(directory, 'maps'), 'w') as maps_file:
+            maps_file.write(maps)
+
+    def engine(self, files):
+        self.query = FakeQuery(files)
+        sack = Mock()
+        sack.query.return_value = self.query
+        return NeedsRestarting(sack)
+
+    def test_process_start(self):
+        self.add_process(10, 500, comm='my (odd) name')
+        self.assertEqual(process_start(10, BTIME, 100), BTIME + 5)
+
+    def test_stale_pids(self):
+        ticks = os.sysconf('SC_CLK_TCK')
+        self.add_process(10, 10 * ticks)
+        self.add_process(20, 1000 * ticks)
+        self.add_process(30, 10 * ticks, maps='')
+        engine = self.engine({'/usr/lib64/libc.so.6': FakePackage('glibc', BTIME + 100)})
+
+        self.assertEqual(engine.stale_pids(), [10])
+        self.assertEqual(self.query.file_lookups, 2)
+        # hawkey isn't thread-safe
+        self.assertEqual(self.query.threads, set([threading.current_thread()]))
+
+    def test_device_major_zero(self):
+        ticks = os.sysconf('SC_CLK_TCK')
+        self.add_process(10, 10 * ticks, maps='7f00-7f01 r--p 00000000 00:1f 4421 /usr/lib64/libc.so.6 (deleted)\n')
+        engine = self.engine({'/usr/lib64/libc.so.6': FakePackage('glibc', BTIME + 100)})
+
+        self.assertEqual(engine.stale_pids(), [10])
+
+    def test_reboot_required(self):
+        engine = self.engine({'/usr/lib64/libc.so.6': FakePackage('glibc', BTIME + 100)})
+        self.assertTrue(engine.reboot_required())
+
+    def test_reboot_not_required(self):
+        engine = self.engine({'/usr/lib64/libc.so.6': FakePackage('glibc', BTIME - 100),
+                              '/usr/bin/vim': FakePackage('vim-enhanced', BTIME + 100)})
+        self.assertFalse(engine.reboot_required())
+
+    def test_vanished_process(self):
+        engine = self.engine({})
+        self.assertEqual(engine.process_files(12345), None)
@@ -0,0 +1,143 @@
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+
+sys.path.append(os.path.join(os.path.dirname(__file__), '../../../src/'))
+from katello.tracer import scanner
+
+from mock import patch
+
+MAPS = """\
+55d0c4a00000-55d0c4a2c000 r--p 00000000 fd:00 1181 /usr/sbin/sshd
+7f1b2c000000-7f1b2c021000 rw-p 00000000 00:00 0
+7f1b2c600000-7f1b2c628000 r--p 00000000 fd:00 4421 /usr/lib64/libc.so.6 (deleted)
+7f1b2c700000-7f1b2c701000 rw-s 00000000 fd:00 77 /dev/shm/cache (deleted)
+7f1b2c800000-7f1b2c801000 r--p 00000000 00:05 1024 /dev/zero (deleted)
+7ffd4a1f1000-7ffd4a212000 rw-p 00000000 00:00 0 [stack]
+"""
+
+# btrfs and overlayfs files are on devices of major number 0
+BTRFS_MAPS = """\
+55d0c4a00000-55d0c4a2c000 r--p 00000000 00:1f 1181 /usr/sbin/sshd
+7f1b2c600000-7f1b2c628000 r--p 00000000 00:1f 4421 /usr/lib64/libc.so.6 (deleted)
+7f1b2c900000-7f1b2c901000 rw-p 00000000 00:00 0 /anonymous
+"""
+
+
+def stat_line(pid, comm, ppid=1, flags=0):
+    fields = ['S', str(ppid)] + ['0'] * 4 + [str(flags)] + ['0'] * 40
+    return '%d (%s) %s\n' % (pid, comm, ' '.join(fields))
+
+
+class ProcTestCase(unittest.TestCase):
+    def setUp(self):
+        self.proc = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.proc)
+        patcher = patch.object(scanner, 'PROC', self.proc)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        patcher = patch('katello.tracer.cgroup.PROC_CGROUP', os.path.join(self.proc, '%d', 'cgroup'))
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def add_process(self, pid, comm, maps='', cgroup='0::/\n', exe=None, ppid=1, flags=0):
+        directory = os.path.join(self.proc, str(pid))
+        os.mkdir(directory)
+        for name, content in (('stat', stat_line(pid, comm, ppid, flags)), ('maps', maps),
+                              ('cgroup', cgroup), ('comm', comm + '\n')):
+            with open(os.path.join(directory, name), 'w') as proc_file:
+                proc_file.write(content)
+        if exe:
+            os.symlink(exe, os.path.join(directory, 'exe'))
+
+
+class TestMappedFile(unittest.TestCase):
+    def test_parse(self):
+        lines = MAPS.splitlines(True)
+        self.assertEqual(scanner.mapped_file(lines[0]), ('/usr/sbin/sshd', 1181, False))
+        self.assertEqual(scanner.mapped_file(lines[1]), None)
+        self.assertEqual(scanner.mapped_file(lines[2]), ('/usr/lib64/libc.so.6', 4421, True))
+        self.assertEqual(scanner.mapped_file(lines[4]), None)
+        self.assertEqual(scanner.mapped_file(lines[5]), None)
+
+    def test_device_major_zero(self):
+        lines = BTRFS_MAPS.splitlines(True)
+        self.assertEqual(scanner.mapped_file(lines[0]), ('/usr/sbin/sshd', 1181, False))
+        self.assertEqual(scanner.mapped_file(lines[1]), ('/usr/lib64/libc.so.6', 4421, True))
+        self.assertEqual(scanner.mapped_file(lines[2]), None)
+
+
+class TestDeletedFiles(ProcTestCase):
+    def test_deleted_mappings(self):
+        self.add_process(10, 'sshd', MAPS)
+        self.assertEqual(scanner.deleted_files(10), set(['/usr/lib64/libc.so.6']))
+
+    def test_deleted_mappings_on_btrfs(self):
+        self.add_process(10, 'sshd', BTRFS_MAPS)
+        self.assertEqual(scanner.deleted_files(10), set(['/usr/lib64/libc.so.6']))
+
+    def test_deleted_exe(self):
+        self.add_process(10, 'crond', exe='/usr/sbin/crond (deleted)')
+        self.assertEqual(scanner.deleted_files(10), set(['/usr/sbin/crond']))
+
+    @patch.object(scanner, 'IGNORE_PREFIXES', ('/dev/',))
+    def test_replaced_file(self):
+        library = os.path.join(self.proc, 'libfoo.so')
+        open(library, 'w').close()
+        inode = os.stat(library).st_ino
+        self.add_process(10, 'foo', '7f00-7f01 r--p 00000000 fd:00 %d %s\n' % (inode + 1, library))
+        self.add_process(11, 'bar', '7f00-7f01 r--p 00000000 fd:00 %d %s\n' % (inode, library))
+
+        self.assertEqual(scanner.deleted_files(10), set([library]))
+        self.assertEqual(scanner.deleted_files(11), set())
+
+
+class TestScan(ProcTestCase):
+    def test_skips_kernel_threads(self):
+        self.add_process(2, 'kthreadd', MAPS, ppid=0)
+        self.add_process(30, 'kworker/0:1', MAPS, ppid=2)
+        self.add_process(40, 'oddthread', MAPS, flags=scanner.PF_KTHREAD)
+        self.add_process(50, 'sshd', MAPS)
+        checked = []
+
+        def check(pid):
+            checked.append(pid)
+            return True
+
+        self.assertEqual(sorted(scanner.scan(check, workers=4)), [50])
+        self.assertEqual(checked, [50])
+
+    def test_timeout(self):
+        self.add_process(50, 'sshd', MAPS)
+        self.assertEqual(scanner.scan(timeout=-1), {})
+
+    def test_vanished_process(self):
+        self.assertEqual(scanner.scan(pids=[12345]), {})
+
+
+class TestCollectServicesState(ProcTestCase):
+    def test_group_by_service(self):
+        self.add_process(1, 'systemd', MAPS, '0::/init.scope\n')
+        self.add_process(100, 'sshd', MAPS, '0::/system.slice/sshd.service\n')
+        self.add_process(101, 'sshd', MAPS, '0::/system.slice/sshd.service\n')
+        self.add_process(200, 'dbus-broker', MAPS, '0::/system.slice/dbus-broker.service\n')
+        self.add_process(300, 'bash', MAPS, '0::/user.slice/user-1000.slice/session-3.scope\n')
+        self.add_process(400, 'crond', '', '0::/system.slice/crond.service\n')
+
+        apps = dict((app.name, app) for app in scanner.collect_services_state(workers=2))
+
+        self.assertEqual(sorted(apps), ['bash', 'dbus-broker', 'sshd', 'systemd'])
+        self.assertEqual(apps['sshd'].type, 'daemon')
+        self.assertEqual(apps['sshd'].helper, 'systemctl restart sshd')
+        self.assertEqual(apps['dbus-broker'].type, 'static')
+        self.assertEqual(apps['systemd'].helper, scanner.REBOOT_HELPER)
+        self.assertEqual(apps['bash'].type, 'session')
+        self.assertEqual(apps['bash'].helper, scanner.SESSION_HELPER)
+
+    def test_native_scanner_enabled(self):
+        with patch.dict(os.environ, {scanner.NATIVE_SCANNER_VAR: '1'}):
+            self.assertTrue(scanner.native_scanner_enabled())
+        with patch.dict(os.environ, {scanner.NATIVE_SCANNER_VAR: ''}):
+            self.assertFalse(scanner.native_scanner_enabled())
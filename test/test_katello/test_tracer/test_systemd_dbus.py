@@ -0,0 +1,72 @@
+import os
+import sys
+import unittest
+
+sys.path.append(os.path.join(os.path.dirname(__file__), '../../../src/'))
+try:
+    import dbus
+    from katello.tracer.SystemdDbus import SystemdDbus
+except ImportError:
+    pass
+
+from mock import patch, Mock
+
+UNIT_PATH = '/org/freedesktop/systemd1/unit/sshd_2eservice'
+
+
+@unittest.skipIf('dbus' not in sys.modules, "dbus not present")
+class TestSystemdDbus(unittest.TestCase):
+    def setUp(self):
+        patcher = patch('katello.tracer.SystemdDbus.dbus.SystemBus')
+        self.system_bus = patcher.start()
+        self.addCleanup(patcher.stop)
+
+        self.manager = Mock()
+        self.manager.GetUnitByPID.return_value = UNIT_PATH
+        interface_patcher = patch('katello.tracer.SystemdDbus.dbus.Interface', return_value=self.manager)
+        interface_patcher.start()
+        self.addCleanup(interface_patcher.stop)
+
+        self.unit = Mock()
+        self.unit.GetAll.side_effect = self._get_all
+        self.system_bus.return_value.get_object.return_value = self.unit
+
+        self.bus = SystemdDbus()
+
+    def _get_all(self, interface, dbus_interface=None):
+        if interface == 'org.freedesktop.systemd1.Service':
+            return {'PAMName': ''}
+        return {'Id': 'sshd.service'}
+
+    def test_single_bus_connection(self):
+        self.bus.get_unit_property_from_pid(1, 'Id')
+        self.bus.has_service_property_from_pid(2, 'PAMName')
+
+        self.assertEqual(self.system_bus.call_count, 1)
+
+    def test_unit_path_memoized(self):
+        for _ in range(3):
+            self.assertEqual(self.bus.unit_path_from_pid(42), UNIT_PATH)
+
+        self.manager.GetUnitByPID.assert_called_once_with(42)
+
+    def test_properties_fetched_once_per_unit(self):
+        for pid in range(10):
+            self.assertEqual(self.bus.get_unit_property_from_pid(pid, 'Id'), 'sshd.service')
+            self.assertFalse(self.bus.has_service_property_from_pid(pid, 'PAMName'))
+
+        self.assertEqual(self.unit.GetAll.call_count, 2)
+
+    def test_unknown_pid(self):
+        self.manager.GetUnitByPID.side_effect = dbus.exceptions.DBusException()
+
+        self.assertFalse(self.bus.get_unit_property_from_pid(1, 'Id'))
+        self.assertFalse(self.bus.has_service_property_from_pid(1, 'PAMName'))
+        self.unit.GetAll.assert_not_called()
+
+    def test_clear_cache(self):
+        self.bus.unit_path_from_pid(42)
+        self.bus.clear_cache()
+        self.bus.unit_path_from_pid(42)
+
+        self.assertEqual(self.manager.GetUnitByPID.call_count, 2)
@@ -1,14 +1,42 @@
+import json
 import os
 import sys
+import time
 import unittest
 
 sys.path.append(os.path.join(os.path.dirname(__file__), '../../src/'))
-from katello.tracer import upload_tracer_profile, query_affected_apps
+from katello import tracer
+from katello.tracer import upload_tracer_profile, query_affected_apps, trigger_upload, TracerCache
+from katello.tracer.incremental import Transaction
 from katello.constants import YUM, ZYPPER
 
-from mock import patch
+from mock import ANY, patch, Mock
 
+CACHE_FILE = '/tmp/tracer_cache.json'  #Override default cache due to /var/cache perms
+FINGERPRINT_FILE = '/tmp/package_db_%s.json'
+
+
+def remove_caches():
+    for path in [CACHE_FILE, FINGERPRINT_FILE % 'tracer']:
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+
+class FakeApp(object):
+    def __init__(self, name, helper='systemctl restart', app_type='daemon'):
+        self.name = name
+        self.helper = helper + ' ' + name
+        self.type = app_type
+
+
+@patch('katello.tracer.TRACER_CACHE_FILE', CACHE_FILE)
+@patch('katello.fingerprint.PACKAGE_DB_FINGERPRINT_FILE', FINGERPRINT_FILE)
 class TestUploadTracerProfile(unittest.TestCase):
+    def setUp(self):
+        remove_caches()
+
     def _query_affected_apps(self, plugin=None):
         return []
 
@@ -30,6 +58,256 @@ class TestUploadTracerProfile(unittest.TestCase):
 
         mock_uep().conn.request_put.assert_not_called()
 
+    @patch('katello.tracer.get_uep')
+    @patch('katello.tracer.lookup_consumer_id', return_value='1234')
+    def test_tracer_upload_unchanged(self, mock_lookup, mock_uep):
+        queryfunc = lambda plugin: [FakeApp('sshd')]
+        upload_tracer_profile(queryfunc)
+        upload_tracer_profile(queryfunc)
+
+        self.assertEqual(mock_uep().conn.request_put.call_count, 1)
+
+    @patch('katello.tracer.get_uep')
+    @patch('katello.tracer.lookup_consumer_id', return_value='1234')
+    def test_tracer_upload_changed(self, mock_lookup, mock_uep):
+        upload_tracer_profile(lambda plugin: [FakeApp('sshd')])
+        upload_tracer_profile(lambda plugin: [FakeApp('sshd'), FakeApp('crond')])
+
+        self.assertEqual(mock_uep().conn.request_put.call_count, 2)
+
+    @patch('katello.tracer.get_uep')
+    @patch('katello.tracer.lookup_consumer_id', return_value='1234')
+    def test_tracer_upload_force(self, mock_lookup, mock_uep):
+        queryfunc = lambda plugin: [FakeApp('sshd')]
+        upload_tracer_profile(queryfunc)
+        upload_tracer_profile(queryfunc, force=True)
+
+        self.assertEqual(mock_uep().conn.request_put.call_count, 2)
+
+    @patch('katello.tracer.get_uep')
+    @patch('katello.tracer.lookup_consumer_id')
+    def test_tracer_upload_other_consumer(self, mock_lookup, mock_uep):
+        queryfunc = lambda plugin: [FakeApp('sshd')]
+        mock_lookup.return_value = '1234'
+        upload_tracer_profile(queryfunc)
+        mock_lookup.return_value = '5678'
+        upload_tracer_profile(queryfunc)
+
+        self.assertEqual(mock_uep().conn.request_put.call_count, 2)
+
+    @patch('katello.tracer.spool_and_drain')
+    @patch('katello.tracer.get_uep')
+    @patch('katello.tracer.lookup_consumer_id', return_value='1234')
+    def test_tracer_upload_background(self, mock_lookup, mock_uep, spool_and_drain):
+        upload_tracer_profile(lambda plugin: [FakeApp('sshd')], background=True)
+
+        mock_uep().conn.request_put.assert_not_called()
+        spool_and_drain.assert_called_once_with('tracer', '1234', {'traces': {'sshd': {
+            'helper': 'systemctl restart sshd', 'type': 'daemon'}}, 'full_scan': ANY}, taken=ANY)
+        # cached once the drainer uploaded them
+        self.assertEqual(TracerCache('1234').digest, None)
+
+    @patch('katello.tracer.drain_pending')
+    @patch('katello.tracer.is_pending', return_value=False)
+    @patch('katello.tracer.spool_and_drain')
+    @patch('katello.tracer.get_uep')
+    @patch('katello.tracer.lookup_consumer_id', return_value='1234')
+    def test_tracer_upload_background_unchanged(self, mock_lookup, mock_uep, spool_and_drain, is_pending,
+                                                drain_pending):
+        queryfunc = lambda plugin: [FakeApp('sshd')]
+        upload_tracer_profile(queryfunc)
+        upload_tracer_profile(queryfunc, background=True)
+
+        spool_and_drain.assert_not_called()
+        drain_pending.assert_called_once_with()
+
+    @patch('katello.fingerprint.unchanged', Mock(return_value=False))
+    @patch('katello.tracer.drain_pending')
+    @patch('katello.tracer.is_pending', return_value=True)
+    @patch('katello.tracer.spool_and_drain')
+    @patch('katello.tracer.get_uep')
+    @patch('katello.tracer.lookup_consumer_id', return_value='1234')
+    def test_tracer_upload_background_pending(self, mock_lookup, mock_uep, spool_and_drain, is_pending,
+                                              drain_pending):
+        queryfunc = lambda plugin: [FakeApp('sshd')]
+        upload_tracer_profile(queryfunc)
+        upload_tracer_profile(queryfunc, background=True)
+
+        # replaces the pending report, which differs from the cached traces
+        spool_and_drain.assert_called_once_with('tracer', '1234', ANY, taken=ANY)
+        is_pending.assert_called_with('tracer', '1234')
+
+    @patch('katello.tracer.drain_pending')
+    @patch('katello.fingerprint.unchanged', return_value=True)
+    @patch('katello.tracer.get_uep')
+    @patch('katello.tracer.lookup_consumer_id', return_value='1234')
+    def test_tracer_hook_unchanged_drains_pending(self, mock_lookup, mock_uep, unchanged, drain_pending):
+        queryfunc = Mock()
+        upload_tracer_profile(queryfunc, background=True)
+
+        queryfunc.assert_not_called()
+        drain_pending.assert_called_once_with()
+
+    @patch('katello.tracer.get_uep')
+    @patch('katello.tracer.lookup_consumer_id', return_value='1234')
+    def test_tracer_hook_unchanged_package_db(self, mock_lookup, mock_uep):
+        queryfunc = Mock(return_value=[FakeApp('sshd')])
+        upload_tracer_profile(queryfunc, Mock())
+        upload_tracer_profile(queryfunc, Mock())
+
+        self.assertEqual(queryfunc.call_count, 1)
+        self.assertEqual(mock_lookup.call_count, 1)
+
+        upload_tracer_profile(queryfunc)
+        self.assertEqual(queryfunc.call_count, 2)
+
+    @patch('katello.fingerprint.boot_id')
+    @patch('katello.tracer.get_uep')
+    @patch('katello.tracer.lookup_consumer_id', return_value='1234')
+    def test_tracer_hook_after_reboot(self, mock_lookup, mock_uep, boot_id):
+        queryfunc = Mock(return_value=[FakeApp('sshd')])
+        boot_id.return_value = 'first'
+        upload_tracer_profile(queryfunc, Mock())
+        boot_id.return_value = 'second'
+        upload_tracer_profile(queryfunc, Mock())
+
+        self.assertEqual(queryfunc.call_count, 2)
+
+
+@patch('katello.tracer.TRACER_CACHE_FILE', CACHE_FILE)
+@patch('katello.fingerprint.PACKAGE_DB_FINGERPRINT_FILE', FINGERPRINT_FILE)
+@patch('katello.fingerprint.unchanged', Mock(return_value=False))  # every transaction changes the package db
+@patch('katello.tracer.lookup_consumer_id', return_value='1234')
+@patch('katello.tracer.get_uep')
+class TestIncrementalUpload(unittest.TestCase):
+    def setUp(self):
+        remove_caches()
+
+    def write_cache(self, traces, full_scan):
+        with open(CACHE_FILE, 'w') as cache_file:
+            cache_file.write(json.dumps({'1234': {'traces': traces, 'full_scan': full_scan}}))
+
+    def uploaded(self, mock_uep):
+        return mock_uep().conn.request_put.call_args[0][1]['traces']
+
+    @patch('katello.tracer.transaction_changes')
+    def test_full_scan_without_cache(self, changes, mock_uep, mock_lookup):
+        upload_tracer_profile(lambda plugin: [FakeApp('sshd')], Mock(), incremental=True)
+
+        changes.assert_not_called()
+        self.assertEqual(list(self.uploaded(mock_uep)), ['sshd'])
+        self.assertEqual(list(TracerCache('1234').traces), ['sshd'])
+
+    @patch('katello.tracer.apps_for_pids', return_value=[FakeApp('crond')])
+    @patch('katello.tracer.scanner.scan', return_value={42: set(['/usr/lib64/libfoo.so'])})
+    @patch('katello.tracer.transaction_changes')
+    def test_incremental_merges(self, changes, scan, apps_for_pids, mock_uep, mock_lookup):
+        full_scan = time.time() - 60
+        self.write_cache({'sshd': {'helper': 'systemctl restart sshd', 'type': 'daemon'}}, full_scan)
+        changes.return_value = Transaction(['libfoo'], ['/usr/lib64/libfoo.so'])
+        queryfunc = Mock()
+
+        upload_tracer_profile(queryfunc, Mock(), incremental=True)
+
+        queryfunc.assert_not_called()
+        apps_for_pids.assert_called_with([42])
+        self.assertEqual(sorted(self.uploaded(mock_uep)), ['crond', 'sshd'])
+        self.assertEqual(TracerCache('1234').full_scan, full_scan)
+
+    @patch('katello.tracer.transaction_changes')
+    def test_stale_full_scan(self, changes, mock_uep, mock_lookup):
+        self.write_cache({'sshd': {'helper': 'systemctl restart sshd', 'type': 'daemon'}}, 0)
+
+        upload_tracer_profile(lambda plugin: [FakeApp('crond')], Mock(), incremental=True)
+
+        changes.assert_not_called()
+        self.assertEqual(list(self.uploaded(mock_uep)), ['crond'])
+
+    @patch('katello.tracer.transaction_changes')
+    def test_reboot_package_forces_full_scan(self, changes, mock_uep, mock_lookup):
+        self.write_cache({'sshd': {'helper': 'systemctl restart sshd', 'type': 'daemon'}}, time.time())
+        changes.return_value = Transaction(['glibc'], ['/usr/lib64/libc.so.6'])
+
+        upload_tracer_profile(lambda plugin: [FakeApp('crond')], Mock(), incremental=True)
+
+        self.assertEqual(list(self.uploaded(mock_uep)), ['crond'])
+
+    @patch('katello.tracer.transaction_changes', side_effect=AttributeError)
+    def test_unreadable_transaction(self, changes, mock_uep, mock_lookup):
+        self.write_cache({'sshd': {'helper': 'systemctl restart sshd', 'type': 'daemon'}}, time.time())
+
+        upload_tracer_profile(lambda plugin: [FakeApp('crond')], Mock(), incremental=True)
+
+        self.assertEqual(list(self.uploaded(mock_uep)), ['crond'])
+
+    @patch('katello.tracer.apps_for_pids', return_value=[FakeApp('crond')])
+    @patch('katello.tracer.scanner.scan', return_value={42: set(['/usr/lib64/libfoo.so'])})
+    @patch('katello.tracer.transaction_changes')
+    def test_given_transaction(self, changes, scan, apps_for_pids, mock_uep, mock_lookup):
+        self.write_cache({'sshd': {'helper': 'systemctl restart sshd', 'type': 'daemon'}}, time.time())
+        transaction = Transaction(['libfoo'], ['/usr/lib64/libfoo.so'])
+
+        upload_tracer_profile(Mock(), None, incremental=True, transaction=transaction)
+
+        changes.assert_not_called()
+        self.assertEqual(sorted(self.uploaded(mock_uep)), ['crond', 'sshd'])
+
+
+class TestTriggerUpload(unittest.TestCase):
+    @patch('katello.tracer.agent.running', return_value=False)
+    @patch('katello.tracer.transaction_changes')
+    def test_agent_not_running(self, changes, running):
+        self.assertFalse(trigger_upload(Mock()))
+        changes.assert_not_called()
+
+    @patch('katello.tracer.agent.trigger', return_value=True)
+    @patch('katello.tracer.agent.running', return_value=True)
+    @patch('katello.tracer.transaction_changes')
+    def test_agent_running(self, changes, running, trigger):
+        plugin = Mock()
+
+        self.assertTrue(trigger_upload(plugin, True))
+
+        changes.assert_called_once_with(plugin)
+        trigger.assert_called_once_with('tracer', True, changes.return_value)
+
+    @patch('katello.tracer.agent.trigger', return_value=True)
+    @patch('katello.tracer.agent.running', return_value=True)
+    @patch('katello.tracer.transaction_changes', side_effect=AttributeError)
+    def test_unreadable_transaction(self, changes, running, trigger):
+        self.assertTrue(trigger_upload(Mock()))
+        trigger.assert_called_once_with('tracer', False, None)
+
+
+@patch('katello.tracer._backend', None)
+class TestBackend(unittest.TestCase):
+    @patch('katello.tracer.importlib.import_module')
+    @patch('katello.tracer.module_available', side_effect=lambda name: name in ('dnf', 'yum'))
+    def test_preferred_backend(self, available, import_module):
+        self.assertEqual(tracer.backend(), import_module.return_value)
+        import_module.assert_called_once_with('katello.tracer.dnf')
+
+    @patch('katello.tracer.importlib.import_module')
+    @patch('katello.tracer.module_available', side_effect=lambda name: name in ('dnf', 'yum'))
+    def test_broken_backend(self, available, import_module):
+        import_module.side_effect = [ImportError, Mock()]
+        tracer.backend()
+        import_module.assert_called_with('katello.tracer.yum')
+
+    @patch('katello.tracer.module_available', return_value=False)
+    def test_unsupported(self, available):
+        self.assertFalse(tracer.supported())
+        self.assertRaises(NotImplementedError, tracer.collect_apps)
+        self.assertEqual(tracer.transaction_changes(Mock()), None)
+
+    @patch('katello.tracer.scanner.apps_for_pids')
+    @patch('katello.tracer.backend')
+    def test_apps_for_pids(self, backend, apps_for_pids):
+        backend.return_value = Mock(spec=['collect_apps'])
+        tracer.apps_for_pids([1])
+        apps_for_pids.assert_called_once_with([1])
+
+
 class TestQueryAffectedApps(unittest.TestCase):
     @unittest.skipIf(YUM == False, "Yum not present")
     def test_el_os(self):
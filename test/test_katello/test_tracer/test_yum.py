@@ -0,0 +1,51 @@
+import os
+import sys
+import unittest
+
+sys.path.append(os.path.join(os.path.dirname(__file__), '../../../src/'))
+try:
+    from katello.tracer import yum as yum_tracer
+except ImportError:
+    yum_tracer = None
+
+from mock import Mock
+
+
+class FakePackage(object):
+    def __init__(self, name, filelist=None):
+        self.name = name
+        self.epoch = '0'
+        self.version = '1.0'
+        self.release = '1.el7'
+        self.arch = 'x86_64'
+        self.filelist = filelist
+
+
+class FakeRepoPackage(FakePackage):
+    @property
+    def filelist(self):
+        raise AssertionError('the filelists metadata of the repositories must not be loaded')
+
+    @filelist.setter
+    def filelist(self, value):
+        pass
+
+
+@unittest.skipIf(yum_tracer is None, "yum not present")
+class TestTransactionChanges(unittest.TestCase):
+    def test_files_from_rpmdb(self):
+        conduit = Mock()
+        conduit.getTsInfo().getMembers.return_value = [
+            Mock(po=FakeRepoPackage('openssl-libs'), ts_state='u'),
+            Mock(po=FakePackage('openssl-libs', ['/usr/lib64/libssl.so.1.0.2k']), ts_state=None),
+            Mock(po=FakePackage('telnet', ['/usr/bin/telnet']), ts_state='e'),
+        ]
+        conduit.getRpmDB().searchNevra.return_value = [FakePackage('openssl-libs', ['/usr/lib64/libssl.so.1.0.2u'])]
+
+        transaction = yum_tracer.transaction_changes(conduit)
+
+        conduit.getRpmDB().searchNevra.assert_called_once_with(name='openssl-libs', epoch='0', ver='1.0',
+                                                               rel='1.el7', arch='x86_64')
+        self.assertEqual(sorted(transaction.packages), ['openssl-libs', 'telnet'])
+        self.assertEqual(sorted(transaction.files), ['/usr/bin/telnet', '/usr/lib64/libssl.so.1.0.2k',
+                                                     '/usr/lib64/libssl.so.1.0.2u'])
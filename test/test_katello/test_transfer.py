@@ -0,0 +1,241 @@
+import gzip
+import io
+import json
+import os
+import shutil
+import ssl
+import sys
+import tempfile
+import threading
+import unittest
+
+try:
+    from http.server import BaseHTTPRequestHandler, HTTPServer
+except ImportError:
+    from BaseHTTPServer import BaseHTTPRequestHandler, HTTPServer
+
+sys.path.append(os.path.join(os.path.dirname(__file__), '../../src/'))
+from katello import transfer
+
+from mock import Mock, patch
+
+TLS_DIR = os.path.join(os.path.dirname(__file__), 'data/tls')
+
+REPORT = {'packages': [{'name': 'package-%d' % index, 'version': '1.0', 'release': '1', 'epoch': 0,
+                        'arch': 'noarch', 'vendor': 'Acme'} for index in range(100)]}
+
+
+def decompress(body):
+    return json.loads(gzip.GzipFile(fileobj=io.BytesIO(body)).read().decode('utf-8'))
+
+
+class Response(object):
+    def __init__(self, status=200, content=b'{"result": "ok"}'):
+        self.status = status
+        self.content = content
+
+    def read(self):
+        return self.content
+
+    def getheaders(self):
+        return [('Content-Type', 'application/json')]
+
+
+class Connection(object):
+    def __init__(self, response=None):
+        self.response = response or Response()
+        self.requests = []
+        self.closed = False
+
+    def connect(self):
+        pass
+
+    def request(self, request_type, url, body, headers):
+        self.requests.append((request_type, url, body.read(), headers))
+
+    def getresponse(self):
+        return self.response
+
+    def close(self):
+        self.closed = True
+
+
+class TestJsonChunks(unittest.TestCase):
+    def test_same_as_dumps(self):
+        for data in (REPORT, {'traces': {'sshd': {'helper': 'systemctl restart sshd', 'type': 'daemon'}}},
+                     {'enabled_repos': {'repos': [{'repositoryid': 'rhel', 'baseurl': ['https://cdn/rhel']}]}},
+                     {1: [1, 2]}, [[1, 2], []], {}, [], None):
+            self.assertEqual(''.join(transfer.json_chunks(data)), json.dumps(data))
+
+    def test_large_list(self):
+        self.assertEqual(''.join(transfer.json_chunks({'packages': list(range(1000))})),
+                         json.dumps({'packages': list(range(1000))}))
+
+
+class TestCompressedBody(unittest.TestCase):
+    def test_small_body(self):
+        self.assertEqual(transfer.compressed_body(REPORT, 1024 * 1024), None)
+
+    def test_large_body(self):
+        body, length = transfer.compressed_body(REPORT, 1024)
+
+        content = body.read()
+        self.assertEqual(len(content), length)
+        self.assertTrue(length < len(json.dumps(REPORT)))
+        self.assertEqual(decompress(content), REPORT)
+
+
+class TestRequestPut(unittest.TestCase):
+    def setUp(self):
+        self.uep = Mock()
+        self.uep.conn.apihandler = '/rhsm'
+
+    def test_not_compressed(self):
+        transfer.request_put(self.uep, '/consumers/1234/tracer', REPORT)
+        transfer.request_put(self.uep, '/consumers/1234/tracer', REPORT, 1024 * 1024)
+
+        self.assertEqual(self.uep.conn.request_put.call_count, 2)
+        self.uep.conn.request_put.assert_called_with('/consumers/1234/tracer', REPORT)
+
+    def test_compressed(self):
+        connection = Connection()
+        with patch('katello.transfer.https_connection', return_value=connection):
+            response = transfer.request_put(self.uep, '/consumers/1234/tracer', REPORT, 1024)
+
+        self.assertEqual(response, {'result': 'ok'})
+        self.uep.conn.request_put.assert_not_called()
+        request_type, url, body, headers = connection.requests[0]
+        self.assertEqual((request_type, url), ('PUT', '/rhsm/consumers/1234/tracer'))
+        self.assertEqual(headers['Content-Encoding'], 'gzip')
+        self.assertEqual(headers['Content-Length'], str(len(body)))
+        self.assertEqual(decompress(body), REPORT)
+        self.assertTrue(connection.closed)
+        self.uep.conn.validateResponse.assert_called_with(
+            {'content': '{"result": "ok"}', 'status': 200, 'headers': {'Content-Type': 'application/json'}},
+            'PUT', '/consumers/1234/tracer')
+
+    def test_unsupported_media_type(self):
+        error = Exception('Unsupported Media Type')
+        error.code = 415
+        self.uep.conn.validateResponse.side_effect = error
+        with patch('katello.transfer.https_connection', return_value=Connection(Response(415, b''))):
+            transfer.request_put(self.uep, '/consumers/1234/tracer', REPORT, 1024)
+
+        self.uep.conn.request_put.assert_called_with('/consumers/1234/tracer', REPORT)
+
+    def test_bad_request(self):
+        # a server which doesn't decode the body fails to parse it
+        error = Exception('Bad Request')
+        error.code = 400
+        self.uep.conn.validateResponse.side_effect = error
+        with patch('katello.transfer.https_connection', return_value=Connection(Response(400, b''))):
+            transfer.request_put(self.uep, '/consumers/1234/tracer', REPORT, 1024)
+
+        self.uep.conn.request_put.assert_called_with('/consumers/1234/tracer', REPORT)
+
+    def test_server_error(self):
+        error = Exception('Internal Server Error')
+        error.code = 500
+        self.uep.conn.validateResponse.side_effect = error
+        with patch('katello.transfer.https_connection', return_value=Connection(Response(500, b''))):
+            self.assertRaises(Exception, transfer.request_put, self.uep, '/consumers/1234/tracer', REPORT, 1024)
+
+        self.uep.conn.request_put.assert_not_called()
+
+    def test_no_connection(self):
+        with patch('katello.transfer.https_connection', return_value=None):
+            transfer.request_put(self.uep, '/consumers/1234/tracer', REPORT, 1024)
+
+        self.uep.conn.request_put.assert_called_with('/consumers/1234/tracer', REPORT)
+
+
+class Handler(BaseHTTPRequestHandler):
+    def do_PUT(self):
+        body = self.rfile.read(int(self.headers['Content-Length']))
+        self.server.requests.append((self.path, self.headers['Content-Encoding'], body))
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.end_headers()
+        self.wfile.write(b'{"result": "ok"}')
+
+    def log_message(self, *args):
+        pass
+
+
+class TestTls(unittest.TestCase):
+    """
+    Uploads to a local HTTPS server whose cert is signed by the CA of the
+    CA directory, which holds unhashed *.pem files like /etc/rhsm/ca
+    """
+    def setUp(self):
+        self.ca_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.ca_dir)
+        open(os.path.join(self.ca_dir, 'README'), 'w').close()
+
+        self.server = HTTPServer(('127.0.0.1', 0), Handler)
+        self.server.requests = []
+        context = ssl.SSLContext(getattr(ssl, 'PROTOCOL_TLS_SERVER', ssl.PROTOCOL_SSLv23))
+        context.load_cert_chain(os.path.join(TLS_DIR, 'localhost.pem'), os.path.join(TLS_DIR, 'localhost-key.pem'))
+        self.server.socket = context.wrap_socket(self.server.socket, server_side=True)
+        thread = threading.Thread(target=self.server.serve_forever)
+        thread.daemon = True
+        thread.start()
+        self.addCleanup(self.server.server_close)
+        self.addCleanup(self.server.shutdown)
+
+        self.uep = Mock()
+        self.uep.conn = Mock(host='localhost', ssl_port=self.server.server_address[1], apihandler='/rhsm',
+                             ca_dir=self.ca_dir, insecure=False, cert_file=None, timeout=5, proxy_hostname=None)
+
+    def test_trusted_ca(self):
+        shutil.copy(os.path.join(TLS_DIR, 'katello-server-ca.pem'), self.ca_dir)
+
+        response = transfer.request_put(self.uep, '/consumers/1234/tracer', REPORT, 1024)
+
+        self.assertEqual(response, {'result': 'ok'})
+        self.uep.conn.request_put.assert_not_called()
+        path, encoding, body = self.server.requests[0]
+        self.assertEqual((path, encoding), ('/rhsm/consumers/1234/tracer', 'gzip'))
+        self.assertEqual(decompress(body), REPORT)
+
+    def test_untrusted_server(self):
+        transfer.request_put(self.uep, '/consumers/1234/tracer', REPORT, 1024)
+
+        self.assertEqual(self.server.requests, [])
+        self.uep.conn.request_put.assert_called_once_with('/consumers/1234/tracer', REPORT)
+
+
+class TestHttpsConnection(unittest.TestCase):
+    def restlib(self, no_proxy=None):
+        return Mock(host='katello.example.com', ssl_port=443, ca_dir=TLS_DIR, insecure=True,
+                    cert_file=None, timeout=None, proxy_hostname='proxy.example.com', proxy_port='3128',
+                    proxy_user='user', proxy_password='secret', no_proxy=no_proxy)
+
+    @patch.dict(os.environ, {'no_proxy': '', 'NO_PROXY': ''})
+    def test_proxy(self):
+        connection = transfer.https_connection(self.restlib())
+
+        self.assertEqual((connection.host, connection.port), ('proxy.example.com', 3128))
+        self.assertEqual(connection._tunnel_host, 'katello.example.com')
+        self.assertEqual(connection._tunnel_headers['Proxy-Authorization'], 'Basic dXNlcjpzZWNyZXQ=')
+
+    @patch.dict(os.environ, {'no_proxy': '', 'NO_PROXY': ''})
+    def test_no_proxy(self):
+        connection = transfer.https_connection(self.restlib('localhost, .example.com'))
+
+        self.assertEqual((connection.host, connection.port), ('katello.example.com', 443))
+        self.assertEqual(connection._tunnel_host, None)
+
+    @patch.dict(os.environ, {'no_proxy': 'katello.example.com', 'NO_PROXY': ''})
+    def test_no_proxy_environment(self):
+        connection = transfer.https_connection(self.restlib())
+
+        self.assertEqual((connection.host, connection.port), ('katello.example.com', 443))
+
+    def test_proxy_bypassed(self):
+        self.assertTrue(transfer.proxy_bypassed('Katello.Example.com', '*'))
+        self.assertTrue(transfer.proxy_bypassed('katello.example.com', 'example.com'))
+        self.assertFalse(transfer.proxy_bypassed('katello.example.com', 'ample.com, other.example.com'))
+
+    def test_unknown_connection(self):
+        self.assertEqual(transfer.https_connection(object()), None)
@@ -0,0 +1,112 @@
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+
+sys.path.append(os.path.join(os.path.dirname(__file__), '../../src/'))
+from katello import uep
+
+from mock import Mock, patch
+
+
+@patch('katello.uep.UEPConnection', side_effect=lambda **kwargs: object())
+class TestGetUep(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory)
+        self.key = self.write('key.pem', 'key')
+        self.cert = self.write('cert.pem', 'cert')
+        uep.clear_uep_cache()
+        self.addCleanup(uep.clear_uep_cache)
+
+        patcher = patch('katello.uep.ConsumerIdentity', Mock(keypath=Mock(return_value=self.key),
+                                                             certpath=Mock(return_value=self.cert)))
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def write(self, name, content):
+        path = os.path.join(self.directory, name)
+        with open(path, 'w') as pem:
+            pem.write(content)
+        return path
+
+    def test_shared(self, connection):
+        self.assertIs(uep.get_uep(), uep.get_uep())
+        connection.assert_called_once_with(key_file=self.key, cert_file=self.cert)
+
+    def test_cert_changed(self, connection):
+        first = uep.get_uep()
+        os.remove(self.cert)
+        self.write('cert.pem', 'renewed cert')
+
+        self.assertIsNot(uep.get_uep(), first)
+        self.assertEqual(connection.call_count, 2)
+
+    def test_cert_removed(self, connection):
+        first = uep.get_uep()
+        os.remove(self.cert)
+
+        self.assertIsNot(uep.get_uep(), first)
+
+
+class TestConsumerIdentity(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory)
+        self.cert = os.path.join(self.directory, 'cert.pem')
+        self.write('cert')
+        uep.clear_uep_cache()
+        self.addCleanup(uep.clear_uep_cache)
+
+        self.identity = Mock(keypath=Mock(return_value=os.path.join(self.directory, 'key.pem')),
+                             certpath=Mock(return_value=self.cert))
+        self.identity.read.return_value.getConsumerId.return_value = '1234'
+        patcher = patch('katello.uep.ConsumerIdentity', self.identity)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def write(self, content):
+        with open(self.cert, 'w') as pem:
+            pem.write(content)
+
+    def test_cached(self):
+        self.assertEqual(uep.lookup_consumer_id(), '1234')
+        self.assertEqual(uep.lookup_consumer_id(), '1234')
+        self.assertEqual(uep.consumer_identity().certpath, self.cert)
+        self.identity.read.assert_called_once_with()
+
+    def test_reregistered(self):
+        uep.lookup_consumer_id()
+        os.remove(self.cert)
+        self.write('new cert')
+        self.identity.read.return_value.getConsumerId.return_value = '5678'
+
+        self.assertEqual(uep.lookup_consumer_id(), '5678')
+
+    def test_not_registered(self):
+        os.remove(self.cert)
+        self.identity.read.side_effect = IOError
+
+        self.assertEqual(uep.lookup_consumer_id(), None)
+        self.identity.read.side_effect = None
+        self.write('cert')
+        self.assertEqual(uep.lookup_consumer_id(), '1234')
+
+
+class TestLazyClass(unittest.TestCase):
+    @patch('katello.uep.load_subscription_manager')
+    def test_loaded_on_first_use(self, load):
+        identity = Mock()
+        load.return_value = {'ConsumerIdentity': identity}
+        lazy = uep.LazyClass('ConsumerIdentity')
+        load.assert_not_called()
+
+        self.assertEqual(lazy.read(), identity.read.return_value)
+        self.assertEqual(lazy(1), identity.return_value)
+        identity.assert_called_once_with(1)
+
+    @patch('katello.uep.load_subscription_manager')
+    def test_patched_attribute(self, load):
+        with patch('katello.uep.ConsumerIdentity.read', return_value='cert'):
+            self.assertEqual(uep.ConsumerIdentity.read(), 'cert')
@@ -15,6 +15,10 @@ else:
 
 ENABLED_CONF = 'test/test_katello/data/plugin_conf/enabled.conf'
 DISABLED_CONF = 'test/test_katello/data/plugin_conf/disabled.conf'
+DEBOUNCE_CONF = 'test/test_katello/data/plugin_conf/debounce.conf'
+COMPRESS_CONF = 'test/test_katello/data/plugin_conf/compress.conf'
+DELTA_CONF = 'test/test_katello/data/plugin_conf/delta.conf'
+REPORT_DISABLED_CONF = 'test/test_katello/data/rhsm_conf/report_disabled.conf'
 
 
 class TestPluginEnabled(TestCase):
@@ -39,3 +43,67 @@ class TestPluginEnabled(TestCase):
     def test_env_disabled_force(self, mock_subman):
         os.environ['testa'] = 'true'
         self.assertTrue(utils.plugin_enabled(ENABLED_CONF, 'testa', True))
+
+
+class TestDebounceWindow(TestCase):
+    def test_configured(self):
+        self.assertEqual(utils.debounce_window(DEBOUNCE_CONF), 30)
+
+    def test_not_configured(self):
+        self.assertEqual(utils.debounce_window(ENABLED_CONF), 0)
+
+    def test_missing_conf(self):
+        self.assertEqual(utils.debounce_window('/nonexistent.conf'), 0)
+
+
+class TestCompressThreshold(TestCase):
+    def test_configured(self):
+        self.assertEqual(utils.compress_threshold(COMPRESS_CONF), 65536)
+
+    def test_not_configured(self):
+        self.assertEqual(utils.compress_threshold(ENABLED_CONF), 0)
+
+    def test_missing_conf(self):
+        self.assertEqual(utils.compress_threshold('/nonexistent.conf'), 0)
+
+
+class TestDeltaUploadEnabled(TestCase):
+    def test_enabled(self):
+        self.assertTrue(utils.delta_upload_enabled(DELTA_CONF))
+
+    def test_disabled_by_default(self):
+        self.assertFalse(utils.delta_upload_enabled(ENABLED_CONF))
+        self.assertFalse(utils.delta_upload_enabled('/nonexistent.conf'))
+
+
+class TestProfileReportingEnabled(TestCase):
+    def test_disabled(self):
+        self.assertFalse(utils.profile_reporting_enabled(REPORT_DISABLED_CONF))
+
+    def test_missing_conf(self):
+        self.assertTrue(utils.profile_reporting_enabled('/nonexistent.conf'))
+
+    @patch.dict('os.environ', {'SUBMAN_DISABLE_PROFILE_REPORTING': 'yes'})
+    def test_env_disabled(self):
+        self.assertFalse(utils.profile_reporting_enabled('/nonexistent.conf'))
+
+
+class TestCommittedPackages(TestCase):
+    def test_committed(self):
+        body = ('{"TransactionStepList": [{"type": "+", "stage": "ok", "solvable": {"n": "vim"}}, '
+                '{"type": "-", "stage": "error", "solvable": {"n": "emacs"}}, {"type": "M", "stage": "ok"}]}')
+        self.assertEqual(utils.committed_packages(body), ['vim'])
+
+    def test_malformed(self):
+        self.assertEqual(utils.committed_packages('not json'), None)
+        self.assertEqual(utils.committed_packages('{}'), None)
+
+
+class TestModuleAvailable(TestCase):
+    def test_available(self):
+        self.assertTrue(utils.module_available('json'))
+        self.assertFalse(utils.module_available('katello_missing_module'))
+
+    @patch.dict(sys.modules, {'katello_loaded_module': Mock()})
+    def test_loaded(self):
+        self.assertTrue(utils.module_available('katello_loaded_module'))
@@ -0,0 +1,85 @@
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+
+sys.path.append(os.path.join(os.path.dirname(__file__), '../../src/'))
+from katello import yumvars
+
+from mock import Mock, patch
+
+
+class TestResolve(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory)
+
+    def write(self, name, content):
+        path = os.path.join(self.directory, name)
+        with open(path, 'w') as out:
+            out.write(content)
+        return path
+
+    def test_basearch(self):
+        self.assertEqual(yumvars.basearch('i686'), 'i386')
+        self.assertEqual(yumvars.basearch('x86_64'), 'x86_64')
+
+    def test_read_vars(self):
+        self.write('contentdir', 'centos\n')
+        self.write('not-a-var', 'ignored\n')
+        self.assertEqual(yumvars.read_vars([self.directory, '/nonexistent']), {'contentdir': 'centos'})
+
+    def test_distroverpkg(self):
+        conf = self.write('yum.conf', '[main]\ndistroverpkg=centos-release, redhat-release\n')
+        self.assertEqual(yumvars.distroverpkg(conf), ['centos-release', 'redhat-release'])
+        self.assertEqual(yumvars.distroverpkg('/nonexistent'), yumvars.DISTROVERPKG)
+
+    def test_releasever(self):
+        header = {'providename': ['redhat-release', 'system-release(releasever)'],
+                  'provideversion': ['7.9', '7Server'], 'version': '7.9'}
+        rpm = Mock()
+        rpm.TransactionSet.return_value.dbMatch.side_effect = \
+            lambda tag, provide: [header] if provide == 'system-release(releasever)' else []
+        with patch.dict(sys.modules, {'rpm': rpm}):
+            self.assertEqual(yumvars.releasever(), '7Server')
+            self.assertEqual(yumvars.releasever(['redhat-release']), None)
+
+    def test_substitute(self):
+        variables = {'basearch': 'x86_64', 'base': 'wrong', 'releasever': '8'}
+        self.assertEqual(yumvars.substitute('https://cdn/$releasever/${basearch}/$basearch/$unknown', variables),
+                         'https://cdn/8/x86_64/x86_64/$unknown')
+
+
+@patch('katello.yumvars.resolve', return_value={'basearch': 'x86_64', 'releasever': '8'})
+class TestYumVariables(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory)
+        self.cache_file = os.path.join(self.directory, 'cache', 'yumvars.json')
+        self.rpmdb = os.path.join(self.directory, 'rpmdb.sqlite')
+        self.touch(self.rpmdb, 'db')
+        for name, value in [('RPMDB_PATHS', [self.rpmdb]), ('YUM_CONF', '/nonexistent'), ('YUM_VARS_DIRS', [])]:
+            patcher = patch('katello.yumvars.' + name, value)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def touch(self, path, content):
+        with open(path, 'w') as out:
+            out.write(content)
+
+    def test_cached(self, resolve):
+        self.assertEqual(yumvars.yum_variables(self.cache_file), {'basearch': 'x86_64', 'releasever': '8'})
+        self.assertEqual(yumvars.yum_variables(self.cache_file), {'basearch': 'x86_64', 'releasever': '8'})
+        resolve.assert_called_once_with()
+
+    def test_rpmdb_changed(self, resolve):
+        yumvars.yum_variables(self.cache_file)
+        os.remove(self.rpmdb)
+        self.touch(self.rpmdb, 'changed db')
+        yumvars.yum_variables(self.cache_file)
+        self.assertEqual(resolve.call_count, 2)
+
+    def test_unwritable_cache(self, resolve):
+        self.touch(os.path.join(self.directory, 'cache'), 'not a directory')
+        self.assertEqual(yumvars.yum_variables(self.cache_file)['releasever'], '8')
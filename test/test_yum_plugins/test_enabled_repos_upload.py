@@ -18,6 +18,8 @@ sys.path = orig_path
 
 FAKE_REPORT = {'foobar': 1}
 
+@patch('katello.fingerprint.PACKAGE_DB_FINGERPRINT_FILE', '/tmp/package_db_%s.json')
+@patch('katello.fingerprint.unchanged', Mock(return_value=False))
 class TestSendEnabledReport(unittest.TestCase):
     @patch('katello.repos.plugin_enabled', return_value=True)
     @patch('enabled_repos_upload.EnabledReport')
@@ -22,3 +22,17 @@ class TestTracerUpload(unittest.TestCase):
     def test_plugin_enabled(self, upload_tracer):
         self.plugin.PLUGINEND({}, {})
         assert upload_tracer.called
+
+    @unittest.skipIf('zypp_plugin' not in sys.modules, "zypper not present")
+    @patch('tracer_upload.TracerUploadPlugin.ack')
+    def test_commit_end(self, ack):
+        body = '{"TransactionStepList": [{"type": "+", "stage": "ok", "solvable": {"n": "vim", "v": "9.0", "r": "1", "a": "x86_64"}},' \
+               ' {"type": "-", "stage": "err", "solvable": {"n": "emacs"}}]}'
+        self.plugin.COMMITEND({}, body)
+        self.assertEqual(self.plugin.changed_packages, ['vim'])
+
+    @unittest.skipIf('zypp_plugin' not in sys.modules, "zypper not present")
+    @patch('tracer_upload.TracerUploadPlugin.ack')
+    def test_commit_end_malformed(self, ack):
+        self.plugin.COMMITEND({}, 'not json')
+        self.assertEqual(self.plugin.changed_packages, None)